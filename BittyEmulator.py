@@ -1,8 +1,14 @@
+from verbosity import TRACE
+
+
 class BittyEmulator:
     # Static class variable to track overall instruction count
     STATIC_PC_VALUE = 0
     
-    def __init__(self, memory):
+    def __init__(self, memory, verbosity=TRACE):
+        # QUIET skips all per-instruction output (see verbosity.py)
+        self.verbosity = verbosity
+        self.trace = verbosity >= TRACE
         # Initialize 16 registers with dummy 32-bit values.
         self.memory = memory
         self.d_out = 0
@@ -12,16 +18,41 @@ class BittyEmulator:
         print("BittyEmulator initialized with default 32-bit register values")
     
     def evaluate_instructions_array(self, instructions,  RISCV_PC):
+        trace = self.trace
         self.pc = 0
+        if not trace:
+            return self._run_decoded(instructions, RISCV_PC)
         while self.pc < len(instructions):
             instruction = instructions[self.pc]
-            print(f"Evaluating instruction: {instruction:04X}")
+            if trace:
+                print(f"Evaluating instruction: {instruction:04X}")
             next_pc = self.evaluate(instruction, RISCV_PC)
-            print(f"Next PC: {next_pc:04X}")
+            if trace:
+                print(f"Next PC: {next_pc:04X}")
             self.pc = next_pc
         return self.pc
 
+    def _run_decoded(self, instructions, RISCV_PC):
+        """evaluate_instructions_array() through the decode table, without tracing."""
+        table = decode_table()
+        pc = self.pc
+        end = len(instructions)
+        if pc < end:
+            while pc < end:
+                current_pc = pc
+                handler, a, b = table[instructions[pc] & 0xFFFF]
+                pc = handler(self, pc, a, b, RISCV_PC)
+            self.STATIC_PC_VALUE = current_pc + 1
+        self.pc = pc
+        return pc
+
     def evaluate(self, instruction, RISCV_PC):
+        trace = self.trace
+        if not trace:
+            current_pc = self.pc
+            self.STATIC_PC_VALUE = current_pc + 1
+            handler, a, b = decode_table()[instruction & 0xFFFF]
+            return handler(self, current_pc, a, b, RISCV_PC)
         # Note: STATIC_PC_VALUE is now incremented in the EmulatorComparison.py file
         # when RISC-V PC increments, not here
         
@@ -37,7 +68,8 @@ class BittyEmulator:
         if format_code == 0:  # Normal format (R-type)
             ry = (instruction >> 8) & 0xF
             in_b = self.registers[ry]
-            print(f"Normal format - rx: {rx}, ry: {ry}, in_b: {in_b}")
+            if trace:
+                print(f"Normal format - rx: {rx}, ry: {ry}, in_b: {in_b}")
         elif format_code == 1:  # Immediate format
             # Extract the 6-bit immediate from bits [11:6]
             in_b = (instruction & 0x0FC0) >> 6
@@ -47,7 +79,8 @@ class BittyEmulator:
             if in_b & (1 << 5):  # if bit 5 is 1
                 in_b = in_b - (1 << 6)
 
-            print(f"Immediate format - rx: {rx}, immediate value (sign-extended): {in_b}")
+            if trace:
+                print(f"Immediate format - rx: {rx}, immediate value (sign-extended): {in_b}")
 
         elif format_code == 2:  # Branch format (12‑bit signed offset)
             branch_cond = (instruction >> 2) & 0x3
@@ -62,10 +95,12 @@ class BittyEmulator:
                 # shift right by 1 to get the word‐aligned offset
                 offset = raw_imm >> 1
 
-                print(f"Branch format – cond: {branch_cond}, imm12 (sign‑ext): {raw_imm}, offset: {offset}")
+                if trace:
+                    print(f"Branch format – cond: {branch_cond}, imm12 (sign‑ext): {raw_imm}, offset: {offset}")
 
                 compare_value = self.d_out
-                print(f"Branch checks d_out = {compare_value}")
+                if trace:
+                    print(f"Branch checks d_out = {compare_value}")
                 
 
                 # if branch_cond == 0 and compare_value == 0:
@@ -95,8 +130,9 @@ class BittyEmulator:
             
             # Make sure address is within memory bounds
             if ry >= len(self.memory):
-                print(f"Memory access out of bounds: {ry}")
-                print(f"New address is: ", ry % len(self.memory))
+                if trace:
+                    print(f"Memory access out of bounds: {ry}")
+                    print(f"New address is: ", ry % len(self.memory))
                 ry = ry % len(self.memory)
             #---------------------------------
             #To CHeck LH instruction
@@ -104,15 +140,18 @@ class BittyEmulator:
 
             #---------------------------------
             if ry % 2 != 0:
-                print(f"Misaligned memory access for LH: {ry}")
+                if trace:
+                    print(f"Misaligned memory access for LH: {ry}")
                 ry = ry - 1
             
             if ls_code == 0:  # Load
-                print(f"Value form the ")
-                print(f"Load operation - would load from address in register {ry_bin} the value {self.memory[ry]:08x} to register {rx}")
+                if trace:
+                    print(f"Value form the ")
+                    print(f"Load operation - would load from address in register {ry_bin} the value {self.memory[ry]:08x} to register {rx}")
                 self.set_register_value(rx, self.memory[ry])  # Placeholder value.
             else:  # Store
-                print(f"Store operation - would store value {self.registers[rx]:08x} from register {rx} to address in register {ry_bin}")
+                if trace:
+                    print(f"Store operation - would store value {self.registers[rx]:08x} from register {rx} to address in register {ry_bin}")
                 self.memory[ry] = self.get_register_value(rx)  # Placeholder value.
             return current_pc + 1  # Next instruction.
 
@@ -122,62 +161,78 @@ class BittyEmulator:
             result = 0
             if alu_sel == 0x0:  # Addition
                 result = (self.registers[rx] + in_b) & 0xFFFFFFFF
-                print(f"Addition: {self.registers[rx]} + {in_b} = {result}")
+                if trace:
+                    print(f"Addition: {self.registers[rx]} + {in_b} = {result}")
             elif alu_sel == 0x1:  # Subtraction
                 result = (self.registers[rx] - in_b) & 0xFFFFFFFF
-                print(f"Subtraction: {self.registers[rx]} - {in_b} = {result}")
+                if trace:
+                    print(f"Subtraction: {self.registers[rx]} - {in_b} = {result}")
             elif alu_sel == 0x2:  # Bitwise AND
                 result = self.registers[rx] & in_b
-                print(f"Bitwise AND: {self.registers[rx]} & {in_b} = {result}")
+                if trace:
+                    print(f"Bitwise AND: {self.registers[rx]} & {in_b} = {result}")
             elif alu_sel == 0x3:  # Bitwise OR
                 result = self.registers[rx] | in_b
-                print(f"Bitwise OR: {self.registers[rx]} | {in_b} = {result}")
+                if trace:
+                    print(f"Bitwise OR: {self.registers[rx]} | {in_b} = {result}")
             elif alu_sel == 0x4:  # Bitwise XOR
                 result = self.registers[rx] ^ in_b
-                print(f"Bitwise XOR: {self.registers[rx]} ^ {in_b} = {result}")
+                if trace:
+                    print(f"Bitwise XOR: {self.registers[rx]} ^ {in_b} = {result}")
             elif alu_sel == 0x5:  # Shift left
                 result = (self.registers[rx] << (in_b % 32)) & 0xFFFFFFFF
-                print(f"Shift left: {self.registers[rx]} << {in_b} = {result}")
+                if trace:
+                    print(f"Shift left: {self.registers[rx]} << {in_b} = {result}")
             elif alu_sel == 0x6:  # Shift right (logical)
                 result = (self.registers[rx] >> (in_b % 32)) & 0xFFFFFFFF
-                print(f"Shift right: {self.registers[rx]} >> {in_b} = {result}")
+                if trace:
+                    print(f"Shift right: {self.registers[rx]} >> {in_b} = {result}")
             elif alu_sel == 0x7:  # Unsigned Compare
                 if self.registers[rx] == in_b:
                     result = 0
-                    print(f"Compare: {self.registers[rx]} == {in_b} -> Equal (0)")
+                    if trace:
+                        print(f"Compare: {self.registers[rx]} == {in_b} -> Equal (0)")
                 elif self.registers[rx] > in_b:
                     result = 1
-                    print(f"Compare: {self.registers[rx]} > {in_b} -> Greater (1)")
+                    if trace:
+                        print(f"Compare: {self.registers[rx]} > {in_b} -> Greater (1)")
                 else:
                     result = 2
-                    print(f"Compare: {self.registers[rx]} < {in_b} -> Less (2)")
+                    if trace:
+                        print(f"Compare: {self.registers[rx]} < {in_b} -> Less (2)")
             elif alu_sel == 0x8:  # Signed Shift right (Arithmetic Shift)
                 # Convert to 32-bit signed integer.
                 signed_rx = self.registers[rx] if self.registers[rx] < 0x80000000 else self.registers[rx] - 0x100000000
                 result = signed_rx >> (in_b % 32)
                 # Mask result to 32 bits.
                 result = result & 0xFFFFFFFF
-                print(f"Signed Shift right: {signed_rx} >> {in_b} = {result}")
+                if trace:
+                    print(f"Signed Shift right: {signed_rx} >> {in_b} = {result}")
             elif alu_sel == 0x9:  # Signed Compare
                 signed_rx = self.registers[rx] if self.registers[rx] < 0x80000000 else self.registers[rx] - 0x100000000
                 signed_in_b = in_b if in_b < 0x80000000 else in_b - 0x100000000
                 if signed_rx == signed_in_b:
                     result = 0
-                    print(f"Compare: {signed_rx} == {signed_in_b} -> Equal (0)")
+                    if trace:
+                        print(f"Compare: {signed_rx} == {signed_in_b} -> Equal (0)")
                 elif signed_rx > signed_in_b:
                     result = 1
-                    print(f"Compare: {signed_rx} > {signed_in_b} -> Greater (1)")
+                    if trace:
+                        print(f"Compare: {signed_rx} > {signed_in_b} -> Greater (1)")
                 else:
                     result = 2
-                    print(f"Compare: {signed_rx} < {signed_in_b} -> Less (2)")
+                    if trace:
+                        print(f"Compare: {signed_rx} < {signed_in_b} -> Less (2)")
             else:
-                print(f"Unknown ALU operation: {alu_sel}")
+                if trace:
+                    print(f"Unknown ALU operation: {alu_sel}")
                 result = 0
 
             # Update register rx with the result (except for compare operations if needed).
             if alu_sel not in (0x7, 0x9):  # For compare, you might not want to update rx.
                 self.set_register_value(rx, result)
-                print(f"Register {rx} updated with result: {result:08X}")
+                if trace:
+                    print(f"Register {rx} updated with result: {result:08X}")
             self.d_out = result
 
         return current_pc + 1  # Return next instruction address.
@@ -187,4 +242,209 @@ class BittyEmulator:
 
     def set_register_value(self, reg_num, value):
         self.registers[reg_num] = value & 0xFFFFFFFF  # Ensure value is 32-bit.
-        print(f"Register {reg_num} set to {self.registers[reg_num]:08X}")
\ No newline at end of file
+        if self.trace:
+            print(f"Register {reg_num} set to {self.registers[reg_num]:08X}")
+
+# ---------------------------------------------------------------------------
+# Decode table
+#
+# Every 16-bit encoding is decoded once into (handler, a, b); executing it is
+# handler(emulator, pc, a, b, RISCV_PC), which returns the next PC. The
+# handlers have the same semantics as evaluate() with tracing off.
+# ---------------------------------------------------------------------------
+
+def _exec_nop(emu, pc, a, b, riscv_pc):
+    return pc + 1
+
+
+# --- ALU, register operand: (rx, ry) ---
+def _exec_add_r(emu, pc, rx, ry, riscv_pc):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] + regs[ry]) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_sub_r(emu, pc, rx, ry, riscv_pc):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] - regs[ry]) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_and_r(emu, pc, rx, ry, riscv_pc):
+    regs = emu.registers
+    result = regs[rx] & regs[ry]
+    regs[rx] = result & 0xFFFFFFFF
+    emu.d_out = result
+    return pc + 1
+
+def _exec_or_r(emu, pc, rx, ry, riscv_pc):
+    regs = emu.registers
+    result = regs[rx] | regs[ry]
+    regs[rx] = result & 0xFFFFFFFF
+    emu.d_out = result
+    return pc + 1
+
+def _exec_xor_r(emu, pc, rx, ry, riscv_pc):
+    regs = emu.registers
+    result = regs[rx] ^ regs[ry]
+    regs[rx] = result & 0xFFFFFFFF
+    emu.d_out = result
+    return pc + 1
+
+def _exec_shl_r(emu, pc, rx, ry, riscv_pc):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] << (regs[ry] % 32)) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_shr_r(emu, pc, rx, ry, riscv_pc):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] >> (regs[ry] % 32)) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_ucmp_r(emu, pc, rx, ry, riscv_pc):
+    return _exec_ucmp_i(emu, pc, rx, emu.registers[ry], riscv_pc)
+
+def _exec_sra_r(emu, pc, rx, ry, riscv_pc):
+    return _exec_sra_i(emu, pc, rx, emu.registers[ry], riscv_pc)
+
+def _exec_scmp_r(emu, pc, rx, ry, riscv_pc):
+    return _exec_scmp_i(emu, pc, rx, emu.registers[ry], riscv_pc)
+
+
+# --- ALU, immediate operand: (rx, sign-extended imm) ---
+def _exec_add_i(emu, pc, rx, imm, riscv_pc):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] + imm) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_sub_i(emu, pc, rx, imm, riscv_pc):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] - imm) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_and_i(emu, pc, rx, imm, riscv_pc):
+    regs = emu.registers
+    result = regs[rx] & imm
+    regs[rx] = result & 0xFFFFFFFF
+    emu.d_out = result
+    return pc + 1
+
+def _exec_or_i(emu, pc, rx, imm, riscv_pc):
+    regs = emu.registers
+    result = regs[rx] | imm
+    regs[rx] = result & 0xFFFFFFFF
+    emu.d_out = result
+    return pc + 1
+
+def _exec_xor_i(emu, pc, rx, imm, riscv_pc):
+    regs = emu.registers
+    result = regs[rx] ^ imm
+    regs[rx] = result & 0xFFFFFFFF
+    emu.d_out = result
+    return pc + 1
+
+def _exec_shl_i(emu, pc, rx, imm, riscv_pc):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] << (imm % 32)) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_shr_i(emu, pc, rx, imm, riscv_pc):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] >> (imm % 32)) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_ucmp_i(emu, pc, rx, in_b, riscv_pc):
+    val = emu.registers[rx]
+    emu.d_out = 0 if val == in_b else (1 if val > in_b else 2)
+    return pc + 1
+
+def _exec_sra_i(emu, pc, rx, in_b, riscv_pc):
+    regs = emu.registers
+    val = regs[rx]
+    signed_rx = val if val < 0x80000000 else val - 0x100000000
+    emu.d_out = regs[rx] = (signed_rx >> (in_b % 32)) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_scmp_i(emu, pc, rx, in_b, riscv_pc):
+    val = emu.registers[rx]
+    signed_rx = val if val < 0x80000000 else val - 0x100000000
+    signed_in_b = in_b if in_b < 0x80000000 else in_b - 0x100000000
+    emu.d_out = 0 if signed_rx == signed_in_b else (1 if signed_rx > signed_in_b else 2)
+    return pc + 1
+
+def _exec_alu_unknown(emu, pc, rx, b, riscv_pc):
+    emu.registers[rx] = 0
+    emu.d_out = 0
+    return pc + 1
+
+
+# --- PC get/set: (rx, unused) ---
+def _exec_get_riscv_pc(emu, pc, rx, b, riscv_pc):
+    emu.registers[rx] = riscv_pc & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_set_pc(emu, pc, rx, b, riscv_pc):
+    emu.pc = emu.registers[rx]
+    return pc + 1
+
+
+# --- load/store: (rx, ry) ---
+def _mem_address(emu, ry):
+    address = emu.registers[ry]
+    if address >= len(emu.memory):
+        address = address % len(emu.memory)
+    if address % 2 != 0:
+        address = address - 1
+    return address
+
+def _exec_load(emu, pc, rx, ry, riscv_pc):
+    emu.registers[rx] = emu.memory[_mem_address(emu, ry)] & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_store(emu, pc, rx, ry, riscv_pc):
+    emu.memory[_mem_address(emu, ry)] = emu.registers[rx]
+    return pc + 1
+
+
+_ALU_REG = (_exec_add_r, _exec_sub_r, _exec_and_r, _exec_or_r, _exec_xor_r,
+            _exec_shl_r, _exec_shr_r, _exec_ucmp_r, _exec_sra_r, _exec_scmp_r)
+_ALU_IMM = (_exec_add_i, _exec_sub_i, _exec_and_i, _exec_or_i, _exec_xor_i,
+            _exec_shl_i, _exec_shr_i, _exec_ucmp_i, _exec_sra_i, _exec_scmp_i)
+
+
+def decode_instruction(instruction):
+    """Decode one 16-bit Bitty instruction into a (handler, a, b) table entry."""
+    format_code = instruction & 0x0003
+    rx = (instruction >> 12) & 0xF
+    alu_sel = (instruction >> 2) & 0xF
+
+    if format_code == 0:
+        ry = (instruction >> 8) & 0xF
+        if alu_sel < len(_ALU_REG):
+            return (_ALU_REG[alu_sel], rx, ry)
+        return (_exec_alu_unknown, rx, 0)
+    if format_code == 1:
+        imm = (instruction & 0x0FC0) >> 6
+        if imm & (1 << 5):
+            imm = imm - (1 << 6)
+        if alu_sel < len(_ALU_IMM):
+            return (_ALU_IMM[alu_sel], rx, imm)
+        return (_exec_alu_unknown, rx, 0)
+    if format_code == 2:
+        if (instruction >> 2) & 0x3 < 3:
+            # conditional branches are not taken (see evaluate())
+            return (_exec_nop, 0, 0)
+        if (instruction >> 4) & 0x1 == 0:
+            return (_exec_get_riscv_pc, rx, 0)
+        return (_exec_set_pc, rx, 0)
+    ry = (instruction >> 8) & 0xF
+    return (_exec_store if instruction & 0x0004 else _exec_load, rx, ry)
+
+
+_DECODE_TABLE = None
+
+
+def decode_table():
+    """Return the 65,536-entry decode table, building it on first use."""
+    global _DECODE_TABLE
+    if _DECODE_TABLE is None:
+        _DECODE_TABLE = [decode_instruction(i) for i in range(0x10000)]
+    return _DECODE_TABLE
@@ -1,13 +1,29 @@
+from bitty_blocks import compile_block
+from byte_memory import ByteMemory, memory_fingerprint, restore_memory, snapshot_memory
+from verbosity import TRACE
+
+# Executions of a block start before run_program() compiles the block
+BLOCK_COMPILE_THRESHOLD = 2
+
+# Stop reasons returned by run_until()
+STOP_BREAKPOINT = "breakpoint"
+STOP_END = "end"
+STOP_LIMIT = "limit"
+
+
 class BittyEmulator:
     # Static class variable to track overall instruction count
     STATIC_PC_VALUE = 0 # This seems unused within this class, consider if needed
 
-    def __init__(self, data_memory_size=1024, memory=None): # Added data_memory_size
+    def __init__(self, data_memory_size=1024, memory=None, verbosity=TRACE): # Added data_memory_size
+        # QUIET skips all per-instruction output (see verbosity.py)
+        self.verbosity = verbosity
+        self.trace = verbosity >= TRACE
         # self.memory is now for DATA only
         if memory is not None:
             self.data_memory = memory
         else:
-            self.data_memory = [0] * data_memory_size # Initialize data memory with zeros
+            self.data_memory = ByteMemory(data_memory_size) # Initialize data memory with zeros
 
         self.instruction_array = [] # For Bitty's program instructions
 
@@ -77,13 +93,16 @@ class BittyEmulator:
         instruction_count = 0
 
         print("\nBittyEmulator Execution Trace:")
-        while 0 <= self.pc < len(self.instruction_array) and instruction_count < max_instructions:
-            instruction = self.instruction_array[self.pc]
-            # print(f"Bitty PC={self.pc}: Evaluating instruction: 0x{instruction:04X}") # Verbose
-            next_pc = self.evaluate(instruction)
-            # print(f"Bitty Next PC: {next_pc}") # Verbose
-            self.pc = next_pc
-            instruction_count += 1
+        if not self.trace:
+            instruction_count = self._run_blocks(max_instructions)
+        else:
+            while 0 <= self.pc < len(self.instruction_array) and instruction_count < max_instructions:
+                instruction = self.instruction_array[self.pc]
+                # print(f"Bitty PC={self.pc}: Evaluating instruction: 0x{instruction:04X}") # Verbose
+                next_pc = self.evaluate(instruction)
+                # print(f"Bitty Next PC: {next_pc}") # Verbose
+                self.pc = next_pc
+                instruction_count += 1
 
         if instruction_count >= max_instructions:
             print("BittyEmulator: Reached maximum instruction limit - possible infinite loop")
@@ -95,6 +114,137 @@ class BittyEmulator:
         # print(f"BittyEmulator executed {instruction_count} instructions.")
         return instruction_count # Return count for comparison script
 
+    @property
+    def instruction_array(self):
+        return self._instruction_array
+
+    @instruction_array.setter
+    def instruction_array(self, instructions):
+        self._instruction_array = instructions
+        self._blocks = {}
+        self._block_visits = {}
+
+    def invalidate_blocks(self):
+        """Drop the compiled blocks; call after editing instruction_array in place."""
+        self._blocks = {}
+        self._block_visits = {}
+
+    def _run_blocks(self, max_instructions):
+        """
+        The run_program() loop through compiled blocks, without tracing.
+
+        A block is compiled the BLOCK_COMPILE_THRESHOLD-th time execution
+        reaches its start; until then it is interpreted through the decode
+        table, so straight-line code that runs once never pays for compilation.
+        """
+        table = decode_table()
+        program = self._instruction_array
+        blocks = self._blocks
+        visits = self._block_visits
+        end = len(program)
+        pc = self.pc
+        instruction_count = 0
+        while 0 <= pc < end and instruction_count < max_instructions:
+            block = blocks.get(pc)
+            if block is None:
+                seen = visits.get(pc, 0) + 1
+                if seen >= BLOCK_COMPILE_THRESHOLD:
+                    block = blocks[pc] = compile_block(program, pc)
+                else:
+                    visits[pc] = seen
+                    # interpret up to and including the next branch or stpc
+                    while True:
+                        handler, a, b = table[program[pc] & 0xFFFF]
+                        pc = handler(self, pc, a, b)
+                        instruction_count += 1
+                        if handler in _BLOCK_EXITS or not 0 <= pc < end or instruction_count >= max_instructions:
+                            break
+                    continue
+            function, length = block
+            if instruction_count + length <= max_instructions:
+                pc = function(self)
+                instruction_count += length
+            else:
+                # not enough budget left for the whole block
+                handler, a, b = table[program[pc] & 0xFFFF]
+                pc = handler(self, pc, a, b)
+                instruction_count += 1
+        self.pc = pc
+        return instruction_count
+
+    def run_until(self, breakpoints=(), max_steps=10000):
+        """
+        Run from self.pc until execution arrives at a breakpoint, leaves the
+        program or has executed max_steps instructions.
+
+        The PC at entry is not checked, so calling run_until() again resumes
+        from a breakpoint. Each arrival is one set lookup; with tracing off,
+        compiled blocks (see _run_blocks()) are used wherever no breakpoint
+        falls inside the block.
+
+        Args:
+            breakpoints: Set of Bitty PCs (a frozenset is used as is), or a
+                         bytes/bytearray bitmap with a nonzero byte at every
+                         breakpoint PC
+            max_steps: Maximum number of instructions to execute
+
+        Returns:
+            Tuple of (stop reason, instructions executed); the reason is
+            STOP_BREAKPOINT, STOP_END or STOP_LIMIT
+        """
+        program = self._instruction_array
+        end = len(program)
+        if isinstance(breakpoints, (bytes, bytearray)):
+            breakpoints = [pc for pc, flag in enumerate(breakpoints) if flag]
+        stops = breakpoints if isinstance(breakpoints, frozenset) else frozenset(breakpoints)
+        clear = {}  # block start -> no breakpoint inside the block, for this call
+
+        pc = self.pc
+        steps = 0
+        if self.trace:
+            while 0 <= pc < end and steps < max_steps:
+                pc = self.pc = self.evaluate(program[pc])
+                steps += 1
+                if pc in stops and 0 <= pc < end:
+                    return STOP_BREAKPOINT, steps
+            return (STOP_LIMIT if 0 <= pc < end else STOP_END), steps
+
+        table = decode_table()
+        blocks = self._blocks
+        visits = self._block_visits
+        while 0 <= pc < end and steps < max_steps:
+            block = blocks.get(pc)
+            if block is None:
+                seen = visits.get(pc, 0) + 1
+                if seen >= BLOCK_COMPILE_THRESHOLD:
+                    block = blocks[pc] = compile_block(program, pc)
+                else:
+                    visits[pc] = seen
+            if block is not None:
+                function, length = block
+                inside = clear.get(pc)
+                if inside is None:
+                    inside = clear[pc] = not any(pc < stop < pc + length for stop in stops)
+                if inside and steps + length <= max_steps:
+                    pc = function(self)
+                    steps += length
+                    if pc in stops:
+                        break
+                    continue
+            # interpret one instruction at a time up to the next branch or stpc
+            while True:
+                handler, a, b = table[program[pc] & 0xFFFF]
+                pc = handler(self, pc, a, b)
+                steps += 1
+                if handler in _BLOCK_EXITS or not 0 <= pc < end or steps >= max_steps or pc in stops:
+                    break
+            if pc in stops:
+                break
+        self.pc = pc
+        if not 0 <= pc < end:
+            return STOP_END, steps
+        return (STOP_BREAKPOINT if steps and pc in stops else STOP_LIMIT), steps
+
     # Kept for potential direct use or backward compatibility if structure was different
     def evaluate_instructions_directly(self, instructions_list, max_instructions=1000):
         """Runs a given list of instructions directly."""
@@ -102,6 +252,10 @@ class BittyEmulator:
         return self.run_program(max_instructions)
 
     def evaluate(self, instruction):
+        trace = self.trace
+        if not trace:
+            handler, a, b = decode_table()[instruction & 0xFFFF]
+            return handler(self, self.pc, a, b)
         current_pc = self.pc # PC is an index into self.instruction_array
         format_code = instruction & 0x0003
         rx = (instruction >> 12) & 0xF
@@ -109,13 +263,15 @@ class BittyEmulator:
 
         # Ensure rx is within RV32E bounds (0-15 for Bitty's 16 registers)
         if not (0 <= rx <= 15):
-            print(f"Error: rx register index {rx} out of bounds (0-15). Instruction: 0x{instruction:04X}")
+            if trace:
+                print(f"Error: rx register index {rx} out of bounds (0-15). Instruction: 0x{instruction:04X}")
             return current_pc + 1 # Skip instruction
 
         if format_code == 0:  # Normal format (R-type)
             ry_reg_idx = (instruction >> 8) & 0xF
             if not (0 <= ry_reg_idx <= 15):
-                print(f"Error: ry register index {ry_reg_idx} out of bounds (0-15). Instruction: 0x{instruction:04X}")
+                if trace:
+                    print(f"Error: ry register index {ry_reg_idx} out of bounds (0-15). Instruction: 0x{instruction:04X}")
                 return current_pc + 1 # Skip instruction
             in_b = self.registers[ry_reg_idx]
             # print(f"Normal format - rx: {rx}, ry_reg_idx: {ry_reg_idx}, in_b: {in_b}")
@@ -156,7 +312,8 @@ class BittyEmulator:
         elif format_code == 3:  # Load/Store format
             ry_reg_idx = (instruction >> 8) & 0xF # Register holding the base address/index
             if not (0 <= ry_reg_idx <= 15):
-                print(f"Error: L/S address register index {ry_reg_idx} out of bounds. Instruction: 0x{instruction:04X}")
+                if trace:
+                    print(f"Error: L/S address register index {ry_reg_idx} out of bounds. Instruction: 0x{instruction:04X}")
                 return current_pc + 1
 
             # 'address_index' is the INDEX into self.data_memory (data memory)
@@ -176,7 +333,8 @@ class BittyEmulator:
             ls_code = (instruction & 0x0004) >> 2 # Shifted to get 0 for Load, 1 for Store
 
             if not (0 <= address_index < len(self.data_memory)):
-                print(f"Data Memory access out of bounds: index {address_index}, memory size {len(self.data_memory)}. Instr: 0x{instruction:04X}")
+                if trace:
+                    print(f"Data Memory access out of bounds: index {address_index}, memory size {len(self.data_memory)}. Instr: 0x{instruction:04X}")
                 # Handle error: skip, trap, or wrap (wrapping not typical for general memory)
                 # For now, let's make it a no-op and continue.
                 return current_pc + 1
@@ -188,7 +346,8 @@ class BittyEmulator:
             else:  # Store to self.data_memory (data memory)
                 value_to_store = self.get_register_value(rx)
                 self.data_memory[address_index] = value_to_store & 0xFFFFFFFF # Bitty memory stores 32-bit words
-                print(f"Store: M_data[{address_index}] <- R{rx} (0x{value_to_store:04X})")
+                if trace:
+                    print(f"Store: M_data[{address_index}] <- R{rx} (0x{value_to_store:04X})")
 
             return current_pc + 1
 
@@ -197,7 +356,8 @@ class BittyEmulator:
         if format_code == 0 or format_code == 1: # R-type or Immediate
             # Ensure in_b is defined (it would be if format_code was 0 or 1)
             if in_b is None: # Should not happen if logic above is correct
-                print(f"Error: in_b not defined for ALU op. Instruction: 0x{instruction:04X}")
+                if trace:
+                    print(f"Error: in_b not defined for ALU op. Instruction: 0x{instruction:04X}")
                 return current_pc + 1
 
             result = 0
@@ -237,7 +397,8 @@ class BittyEmulator:
                 # print(f"SCompare: R{rx}({s_val_rx}) vs {s_in_b} -> d_out={self.d_out}")
                 return current_pc + 1 # Compare doesn't write to rx
             else:
-                print(f"Unknown ALU operation: {alu_sel}. Instruction: 0x{instruction:04X}")
+                if trace:
+                    print(f"Unknown ALU operation: {alu_sel}. Instruction: 0x{instruction:04X}")
                 # Default to no-op or result 0.
                 self.d_out = 0 # Or some error flag
                 return current_pc + 1
@@ -250,22 +411,53 @@ class BittyEmulator:
             return current_pc + 1
 
         # Fallthrough if no other format matched (should not happen with masked format_code)
-        print(f"Warning: Instruction 0x{instruction:04X} did not match any format logic.")
+        if trace:
+            print(f"Warning: Instruction 0x{instruction:04X} did not match any format logic.")
         return current_pc + 1
 
     def get_register_value(self, reg_num):
         if not (0 <= reg_num <= 15):
-            print(f"Error: Attempt to get invalid register r{reg_num}")
+            if self.trace:
+                print(f"Error: Attempt to get invalid register r{reg_num}")
             return 0 # Or raise error
         return self.registers[reg_num]
 
     def set_register_value(self, reg_num, value):
         if not (0 <= reg_num <= 15):
-            print(f"Error: Attempt to set invalid register r{reg_num}")
+            if self.trace:
+                print(f"Error: Attempt to set invalid register r{reg_num}")
             return
         self.registers[reg_num] = value & 0xFFFFFFFF
         # print(f"Register R{reg_num} set to 0x{self.registers[reg_num]:08X}")
 
+    def fingerprint(self):
+        """
+        Hash of the architectural state compared between emulators.
+
+        Covers the 16 registers and all of memory; O(1) in the memory size
+        when it is a PagedMemory (see byte_memory.mix_word()).
+        """
+        return hash((tuple(r & 0xFFFFFFFF for r in self.registers[:16]),
+                     memory_fingerprint(self.data_memory)))
+
+    def snapshot(self):
+        """
+        Capture registers, PC, d_out and data memory for restore().
+
+        PagedMemory is captured copy-on-write, other memories are copied.
+        """
+        return {"registers": list(self.registers),
+                "pc": self.pc,
+                "d_out": self.d_out,
+                "memory": snapshot_memory(self.data_memory)}
+
+    def restore(self, snapshot):
+        """Rewind to a snapshot() taken on this emulator; memory is restored in place."""
+        self.registers = list(snapshot["registers"])
+        self.pc = snapshot["pc"]
+        self.d_out = snapshot["d_out"]
+        restore_memory(self.data_memory, snapshot["memory"])
+
     def print_registers(self):
         """Write the current state of all registers to bitty_registers_output.txt."""
         try:
@@ -288,6 +480,203 @@ class BittyEmulator:
     def memory(self, value):
         self.data_memory = value
     
+# ---------------------------------------------------------------------------
+# Decode table
+#
+# Every 16-bit encoding is decoded once into (handler, a, b); executing it is
+# handler(emulator, pc, a, b), which returns the next PC. The handlers have
+# the same semantics as evaluate() with tracing off.
+# ---------------------------------------------------------------------------
+
+def _exec_nop(emu, pc, a, b):
+    return pc + 1
+
+
+# --- ALU, register operand: (rx, ry) ---
+def _exec_add_r(emu, pc, rx, ry):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] + regs[ry]) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_sub_r(emu, pc, rx, ry):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] - regs[ry]) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_and_r(emu, pc, rx, ry):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] & regs[ry]) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_or_r(emu, pc, rx, ry):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] | regs[ry]) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_xor_r(emu, pc, rx, ry):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] ^ regs[ry]) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_shl_r(emu, pc, rx, ry):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] << (regs[ry] & 0x1F)) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_shr_r(emu, pc, rx, ry):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] >> (regs[ry] & 0x1F)) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_ucmp_r(emu, pc, rx, ry):
+    return _exec_ucmp_i(emu, pc, rx, emu.registers[ry])
+
+def _exec_sra_r(emu, pc, rx, ry):
+    return _exec_sra_i(emu, pc, rx, emu.registers[ry])
+
+def _exec_scmp_r(emu, pc, rx, ry):
+    # a register operand is compared as a signed 32-bit value
+    in_b = emu.registers[ry]
+    return _exec_scmp_i(emu, pc, rx, in_b if in_b < 0x80000000 else in_b - 0x100000000)
+
+
+# --- ALU, immediate operand: (rx, sign-extended imm) ---
+def _exec_add_i(emu, pc, rx, imm):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] + imm) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_sub_i(emu, pc, rx, imm):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] - imm) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_and_i(emu, pc, rx, imm):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] & imm) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_or_i(emu, pc, rx, imm):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] | imm) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_xor_i(emu, pc, rx, imm):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] ^ imm) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_shl_i(emu, pc, rx, imm):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] << (imm & 0x1F)) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_shr_i(emu, pc, rx, imm):
+    regs = emu.registers
+    emu.d_out = regs[rx] = (regs[rx] >> (imm & 0x1F)) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_ucmp_i(emu, pc, rx, in_b):
+    val_rx = emu.registers[rx]
+    emu.d_out = 0 if val_rx == in_b else (1 if val_rx > in_b else 2)
+    return pc + 1
+
+def _exec_sra_i(emu, pc, rx, in_b):
+    regs = emu.registers
+    val_rx = regs[rx]
+    signed_val_rx = val_rx if val_rx < 0x80000000 else val_rx - 0x100000000
+    emu.d_out = regs[rx] = (signed_val_rx >> (in_b & 0x1F)) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_scmp_i(emu, pc, rx, s_in_b):
+    val_rx = emu.registers[rx]
+    s_val_rx = val_rx if val_rx < 0x80000000 else val_rx - 0x100000000
+    emu.d_out = 0 if s_val_rx == s_in_b else (1 if s_val_rx > s_in_b else 2)
+    return pc + 1
+
+def _exec_alu_unknown(emu, pc, rx, b):
+    emu.d_out = 0
+    return pc + 1
+
+
+# --- branches: (condition, offset in instructions) and PC get/set: (rx, unused) ---
+def _exec_branch(emu, pc, branch_cond, offset):
+    return pc + offset if emu.d_out == branch_cond else pc + 1
+
+def _exec_get_pc(emu, pc, rx, b):
+    emu.registers[rx] = (pc + 1) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_set_pc(emu, pc, rx, b):
+    return emu.registers[rx]
+
+
+# --- load/store: (rx, ry) ---
+def _exec_load(emu, pc, rx, ry):
+    address_index = emu.registers[ry]
+    if 0 <= address_index < len(emu.data_memory):
+        emu.registers[rx] = emu.data_memory[address_index] & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_store(emu, pc, rx, ry):
+    address_index = emu.registers[ry]
+    if 0 <= address_index < len(emu.data_memory):
+        emu.data_memory[address_index] = emu.registers[rx] & 0xFFFFFFFF
+    return pc + 1
+
+
+_ALU_REG = (_exec_add_r, _exec_sub_r, _exec_and_r, _exec_or_r, _exec_xor_r,
+            _exec_shl_r, _exec_shr_r, _exec_ucmp_r, _exec_sra_r, _exec_scmp_r)
+_ALU_IMM = (_exec_add_i, _exec_sub_i, _exec_and_i, _exec_or_i, _exec_xor_i,
+            _exec_shl_i, _exec_shr_i, _exec_ucmp_i, _exec_sra_i, _exec_scmp_i)
+
+
+def decode_instruction(instruction):
+    """Decode one 16-bit Bitty instruction into a (handler, a, b) table entry."""
+    format_code = instruction & 0x0003
+    rx = (instruction >> 12) & 0xF
+    alu_sel = (instruction >> 2) & 0xF
+
+    if format_code == 0:
+        ry_reg_idx = (instruction >> 8) & 0xF
+        if alu_sel < len(_ALU_REG):
+            return (_ALU_REG[alu_sel], rx, ry_reg_idx)
+        return (_exec_alu_unknown, rx, 0)
+    if format_code == 1:
+        in_b = (instruction & 0x0FC0) >> 6
+        if in_b & (1 << 5):
+            in_b = in_b - (1 << 6)
+        if alu_sel < len(_ALU_IMM):
+            return (_ALU_IMM[alu_sel], rx, in_b)
+        return (_exec_alu_unknown, rx, 0)
+    if format_code == 2:
+        branch_cond = (instruction >> 2) & 0x3
+        if branch_cond < 3:
+            raw_imm = (instruction >> 4) & 0xFFF
+            if raw_imm & 0x800:
+                raw_imm -= 0x1000
+            return (_exec_branch, branch_cond, raw_imm >> 1)
+        if (instruction >> 4) & 0x1 == 1:
+            return (_exec_get_pc, rx, 0)
+        return (_exec_set_pc, rx, 0)
+    ry_reg_idx = (instruction >> 8) & 0xF
+    return (_exec_store if instruction & 0x0004 else _exec_load, rx, ry_reg_idx)
+
+
+# Handlers that end a basic block (see bitty_blocks.py)
+_BLOCK_EXITS = (_exec_branch, _exec_set_pc)
+
+_DECODE_TABLE = None
+
+
+def decode_table():
+    """Return the 65,536-entry decode table, building it on first use."""
+    global _DECODE_TABLE
+    if _DECODE_TABLE is None:
+        _DECODE_TABLE = [decode_instruction(i) for i in range(0x10000)]
+    return _DECODE_TABLE
+
+
 # Example usage (if run directly)
 if __name__ == "__main__":
     # Initialize BittyEmulator with a data memory size
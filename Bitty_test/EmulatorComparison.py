@@ -2,9 +2,24 @@
 EmulatorComparison.py - Compare RISCV32EMEmulator and BittyEmulator execution
 """
 from RISCV32EMEmulator import RISCV32EMEmulator
-from BittyEmulator import BittyEmulator
+from BittyEmulator import STOP_BREAKPOINT, BittyEmulator
 from shared_memory import generate_shared_memory
-import copy  # Import copy to make a deep copy of initial memory
+from byte_memory import differing_addresses, snapshot_memory
+from log_writer import close_logs, write_log
+from binary_trace import TraceWriter
+
+# Report file used by write_to_file(); a .gz/.bz2/.xz name gives compressed output
+OUTPUT_FILE = "comparison_output.txt"
+# When set, main() writes the per-step trace to this binary file (binary_trace.py)
+# instead of the text report
+TRACE_FILE = None
+# When main() compares the two emulators (see run_riscv()): "instruction"
+# (after every RISC-V instruction), an integer K (every K instructions),
+# "block" (after every branch or jump) or "end" (only at the end of the run)
+SYNC_POLICY = "instruction"
+
+# RISC-V opcodes that end a basic block: branches, JAL, JALR
+_CONTROL_TRANSFER_OPCODES = (0b1100011, 0b1101111, 0b1100111)
 
 def read_ints_from_file(filename = "pc_map_output.txt"):
     with open(filename, 'r') as f:
@@ -39,17 +54,19 @@ def load_instructions_from_file(filename):
     return instructions
 
 
-def write_to_file(message, filename="comparison_output.txt", mode="a"):
+def write_to_file(message, filename=None, mode="a"):
     """
     Write a message to the output file.
+
+    The file stays open between calls and is written from a background thread
+    (see log_writer.py).
     
     Args:
         message: Text to write
-        filename: Output file path
+        filename: Output file path, OUTPUT_FILE by default
         mode: File open mode ('w' for write, 'a' for append)
     """
-    with open(filename, mode) as file:
-        file.write(message + "\n")
+    write_log(message, filename or OUTPUT_FILE, mode)
     # Also print to console for real-time feedback
     #print(message)
 
@@ -105,27 +122,28 @@ def compare_memory(mem_riscv, mem_bitty, check_range=500):
     write_to_file(f"{'Addr':<6}{'RISC-V':^12}{'Bitty':^12}{'Match':^8}")
     write_to_file("-" * 40)
     
-    # Check specified range of memory locations
+    # Check specified range of memory locations; only locations written by
+    # either emulator can differ (see differing_addresses())
     memory_check_range = min(check_range, len(mem_riscv), len(mem_bitty))
-    memory_matches = 0
-    
-    for addr in range(memory_check_range):
+    mismatches = differing_addresses(mem_riscv, mem_bitty, memory_check_range)
+    memory_matches = memory_check_range - len(mismatches)
+    
+    # Only show mismatches or first/last few elements
+    shown = set(mismatches)
+    shown.update(range(min(5, memory_check_range)))
+    shown.update(range(max(memory_check_range - 4, 0), memory_check_range))
+    for addr in sorted(shown):
         rv_word = mem_riscv[addr] & 0xFFFFFFFF
         bt_word = mem_bitty[addr] & 0xFFFFFFFF
-        
         match = "✓" if rv_word == bt_word else "✗"
-        if rv_word == bt_word:
-            memory_matches += 1
-            
-        # Only show mismatches or first/last few elements
-        if match == "✗" or addr < 5 or addr > memory_check_range - 5:
-            write_to_file(f"{addr:<6} 0x{rv_word:08X}  0x{bt_word:08X}   {match}")
+        write_to_file(f"{addr:<6} 0x{rv_word:08X}  0x{bt_word:08X}   {match}")
     
     write_to_file(f"\nMemory matches between emulators: {memory_matches}/{memory_check_range} ({memory_matches/memory_check_range*100:.1f}%)")
     return memory_matches, memory_check_range
 
 
-def run_riscv(riscv, instructions, map_pc, bitty, mem_riscv, mem_bitty_data, max_instructions=1000):
+def run_riscv(riscv, instructions, map_pc, bitty, mem_riscv, mem_bitty_data, max_instructions=1000, trace=None,
+              sync="instruction"):
     """
     Run the RISCV emulator on the given instructions and coordinate with Bitty execution.
     
@@ -137,6 +155,10 @@ def run_riscv(riscv, instructions, map_pc, bitty, mem_riscv, mem_bitty_data, max
         mem_riscv: RISC-V memory array
         mem_bitty_data: Bitty data memory array (not instruction memory)
         max_instructions: Maximum number of instructions to execute (prevents infinite loops)
+        trace: Optional binary_trace.TraceWriter that records every step in
+               place of the per-step text lines
+        sync: Sync policy (see SYNC_POLICY); anything but "instruction" runs
+              through run_synchronized()
     
     Returns:
         Number of instructions executed
@@ -152,37 +174,52 @@ def run_riscv(riscv, instructions, map_pc, bitty, mem_riscv, mem_bitty_data, max
     write_to_file("\nCoordinated Execution Trace:")
     write_to_file("---------------------------")
     
+    if sync != "instruction":
+        count, bitty_total_count = run_synchronized(riscv, map_pc, bitty, mem_riscv, mem_bitty_data, sync,
+                                                    max_instructions, trace)
+        riscv.print_registers()
+        return count, bitty_total_count
+    
     # Run until max count or end of instructions
     while count < max_instructions and 0 <= riscv.pc < len(riscv.instruction_array):
         old_pc = riscv.pc
         instr = riscv.fetch_instruction()
-        write_to_file(f"\nRISC-V Step {count}: PC={old_pc}, Instr=0x{instr:08X}")
-        
-        # Execute instruction and get next PC
-        next_pc = riscv.decode_and_execute(instr)
-        
-        # Update PC
-        riscv.pc = next_pc
-        count += 1
-        
-        # Print register state after execution
-        reg_str = " ".join([f"x{i}={riscv.registers[i]:08X}" for i in range(4)])
-        write_to_file(f"RISC-V Registers after step: {reg_str}...")
+        if trace is not None:
+            riscv.pc = trace.riscv_step(riscv, instr)
+            count += 1
+        else:
+            write_to_file(f"\nRISC-V Step {count}: PC={old_pc}, Instr=0x{instr:08X}")
+            
+            # Execute instruction and get next PC
+            next_pc = riscv.decode_and_execute(instr)
+            
+            # Update PC
+            riscv.pc = next_pc
+            count += 1
+            
+            # Print register state after execution
+            reg_str = " ".join([f"x{i}={riscv.registers[i]:08X}" for i in range(4)])
+            write_to_file(f"RISC-V Registers after step: {reg_str}...")
         
         # Now run Bitty until it reaches the PC corresponding to the next RISC-V PC
         # Look up the mapped PC for this RISC-V PC
         if riscv.pc < len(map_pc):
             target_bitty_pc = map_pc[riscv.pc]
             
-            write_to_file(f"Running Bitty until PC={target_bitty_pc} (mapped from RISC-V PC={riscv.pc})")
-            bitty_steps = run_bitty_to_pc(bitty, target_bitty_pc, max_instructions=1000)
+            if trace is None:
+                write_to_file(f"Running Bitty until PC={target_bitty_pc} (mapped from RISC-V PC={riscv.pc})")
+            bitty_steps = run_bitty_to_pc(bitty, target_bitty_pc, max_instructions=1000, trace=trace)
             bitty_total_count += bitty_steps
             
-            # Compare state at corresponding points
-            write_to_file(f"\n=== State comparison at RISC-V PC={riscv.pc}, Bitty PC={bitty.pc} ===")
-            reg_matches, total_regs = compare_registers(riscv, bitty)
-            # FIXED: Compare RISC-V memory with Bitty's data_memory
-            mem_matches, mem_check_range = compare_memory(mem_riscv, mem_bitty_data, check_range=500)
+            # Compare state at corresponding points; the full diff is only
+            # written when the state fingerprints differ
+            if riscv.fingerprint() == bitty.fingerprint():
+                write_to_file(f"\n=== State fingerprints match at RISC-V PC={riscv.pc}, Bitty PC={bitty.pc} ===")
+            else:
+                write_to_file(f"\n=== State comparison at RISC-V PC={riscv.pc}, Bitty PC={bitty.pc} ===")
+                reg_matches, total_regs = compare_registers(riscv, bitty)
+                # FIXED: Compare RISC-V memory with Bitty's data_memory
+                mem_matches, mem_check_range = compare_memory(mem_riscv, mem_bitty_data, check_range=500)
         else:
             write_to_file(f"Warning: RISC-V PC={riscv.pc} is outside the PC mapping range!")
     
@@ -192,7 +229,119 @@ def run_riscv(riscv, instructions, map_pc, bitty, mem_riscv, mem_bitty_data, max
     return count, bitty_total_count
 
 
-def run_bitty_to_pc(bitty, target_pc, max_instructions=1000):
+def run_synchronized(riscv, map_pc, bitty, mem_riscv, mem_bitty_data, sync, max_instructions=1000, trace=None):
+    """
+    Coordinated execution that compares the emulators only at sync points.
+
+    Between two sync points RISC-V runs uninterrupted from its pre-decoded
+    program, then Bitty runs to the mapped PC of where RISC-V stopped (see
+    run_bitty_to_breakpoint()); neither writes per-step text. At the end of
+    the program Bitty runs until it leaves its own program, so the last
+    comparison covers the whole run.
+
+    Args:
+        sync: "block", "end" or the number of RISC-V instructions between
+              sync points (see SYNC_POLICY)
+
+    Returns:
+        Tuple of (RISC-V instructions executed, Bitty instructions executed)
+    """
+    instructions = riscv.instruction_array
+    block_ends = set()
+    if sync == "end":
+        interval = max_instructions
+    elif sync == "block":
+        interval = max_instructions
+        block_ends = {pc for pc, word in enumerate(instructions) if word & 0x7F in _CONTROL_TRANSFER_OPCODES}
+    else:
+        try:
+            interval = int(sync)
+        except ValueError:
+            raise ValueError(f"Unknown sync policy {sync!r}") from None
+        if interval < 1:
+            raise ValueError(f"Unknown sync policy {sync!r}")
+
+    decoded = riscv.predecode()
+    end = len(decoded)
+    count = 0
+    bitty_total_count = 0
+    sync_points = 0
+    while count < max_instructions and 0 <= riscv.pc < end:
+        # RISC-V to the next sync point, counting how often it arrives at
+        # each PC so that Bitty can stop at the same visit of the mapped PC
+        visits = {}
+        steps = 0
+        pc = riscv.pc
+        while steps < interval and count + steps < max_instructions and 0 <= pc < end:
+            executed = pc
+            if trace is not None:
+                riscv.pc = pc
+                pc = trace.riscv_step(riscv, instructions[pc])
+            else:
+                handler, a, b, c = decoded[pc]
+                pc = handler(riscv, pc, a, b, c)
+            steps += 1
+            visits[pc] = visits.get(pc, 0) + 1
+            if executed in block_ends:
+                break
+        riscv.pc = pc
+        count += steps
+
+        target_bitty_pc = map_pc[pc] if 0 <= pc < len(map_pc) else None
+        bitty_steps = run_bitty_to_breakpoint(bitty, target_bitty_pc, visits.get(pc, 1),
+                                              max_instructions=1000 * steps, trace=trace)
+        bitty_total_count += bitty_steps
+        sync_points += 1
+        write_to_file(f"\nSync point {sync_points}: RISC-V ran {steps} instructions to PC={pc}, "
+                      f"Bitty ran {bitty_steps} instructions to PC={bitty.pc}")
+
+        if riscv.fingerprint() == bitty.fingerprint():
+            write_to_file(f"\n=== State fingerprints match at RISC-V PC={riscv.pc}, Bitty PC={bitty.pc} ===")
+        else:
+            write_to_file(f"\n=== State comparison at RISC-V PC={riscv.pc}, Bitty PC={bitty.pc} ===")
+            compare_registers(riscv, bitty)
+            compare_memory(mem_riscv, mem_bitty_data, check_range=500)
+
+    return count, bitty_total_count
+
+
+def run_bitty_to_breakpoint(bitty, target_pc, visits=1, max_instructions=1000, trace=None):
+    """
+    Run Bitty without per-step output until it arrives at target_pc for the
+    visits-th time, or until it leaves its program when target_pc is None.
+
+    Returns:
+        Number of instructions executed
+    """
+    count = 0
+    if trace is None:
+        breakpoints = () if target_pc is None else (target_pc,)
+        # silence the emulator's own per-step output for the duration
+        tracing, bitty.trace = bitty.trace, False
+        try:
+            while visits:
+                reason, steps = bitty.run_until(breakpoints, max_instructions - count)
+                count += steps
+                if reason != STOP_BREAKPOINT:
+                    break
+                visits -= 1
+        finally:
+            bitty.trace = tracing
+    else:
+        program = bitty.instruction_array
+        while count < max_instructions and 0 <= bitty.pc < len(program):
+            bitty.pc = trace.bitty_step(bitty, program[bitty.pc])
+            count += 1
+            if bitty.pc == target_pc:
+                visits -= 1
+                if not visits:
+                    break
+    if count >= max_instructions:
+        write_to_file(f"Warning: Reached max instructions ({max_instructions}) before reaching target PC")
+    return count
+
+
+def run_bitty_to_pc(bitty, target_pc, max_instructions=1000, trace=None):
     """
     Run the BittyEmulator until it reaches the target PC.
     
@@ -200,6 +349,8 @@ def run_bitty_to_pc(bitty, target_pc, max_instructions=1000):
         bitty: BittyEmulator instance
         target_pc: Target PC to run to
         max_instructions: Maximum number of instructions to execute (prevents infinite loops)
+        trace: Optional binary_trace.TraceWriter that records every step in
+               place of the per-step text lines
     
     Returns:
         Number of instructions executed
@@ -210,11 +361,16 @@ def run_bitty_to_pc(bitty, target_pc, max_instructions=1000):
     while count < max_instructions and 0 <= bitty.pc < len(bitty.instruction_array):  # FIXED: Use instruction_array
         # If we've reached the target PC, stop
         if bitty.pc == target_pc:
-            write_to_file(f"Bitty reached target PC={target_pc} after {count} steps")
+            if trace is None:
+                write_to_file(f"Bitty reached target PC={target_pc} after {count} steps")
             break
             
         # FIXED: Get instruction from instruction_array, not memory
         instr = bitty.instruction_array[bitty.pc]
+        if trace is not None:
+            bitty.pc = trace.bitty_step(bitty, instr)
+            count += 1
+            continue
         write_to_file(f"Bitty Step {count}: PC={bitty.pc}, Instr=0x{instr:04X}")
         
         # Execute instruction and update PC internally
@@ -245,13 +401,13 @@ def main():
     mem_seed = 42
     write_to_file(f"\nGenerating shared memory (size={memory_size}, seed={mem_seed})")
     
-    mem_riscv = generate_shared_memory(size=memory_size, seed=mem_seed)
+    mem_riscv = generate_shared_memory(size=memory_size, seed=mem_seed, paged=True)
     # FIXED: For Bitty, we need to properly set up data memory
-    mem_bitty_data = generate_shared_memory(size=memory_size, seed=mem_seed)
+    mem_bitty_data = generate_shared_memory(size=memory_size, seed=mem_seed, paged=True)
 
-    # Make deep copies of initial memory state for later comparison
-    mem_riscv_initial = copy.deepcopy(mem_riscv)
-    mem_bitty_data_initial = copy.deepcopy(mem_bitty_data)
+    # Snapshot the initial memory state for later comparison
+    mem_riscv_initial = snapshot_memory(mem_riscv)
+    mem_bitty_data_initial = snapshot_memory(mem_bitty_data)
 
     # Verify the memory arrays are identical
     if mem_riscv[:10] == mem_bitty_data[:10]:
@@ -282,7 +438,14 @@ def main():
     # Run coordinated execution
     write_to_file(f"\n-- Starting coordinated execution --")
     # FIXED: Pass the correct Bitty data memory reference
-    rv_count, bitty_count = run_riscv(riscv, rv_insts, map_pc, bitty, mem_riscv, bitty.data_memory)
+    if TRACE_FILE is None:
+        rv_count, bitty_count = run_riscv(riscv, rv_insts, map_pc, bitty, mem_riscv, bitty.data_memory,
+                                          sync=SYNC_POLICY)
+    else:
+        with TraceWriter(TRACE_FILE) as trace:
+            rv_count, bitty_count = run_riscv(riscv, rv_insts, map_pc, bitty, mem_riscv, bitty.data_memory,
+                                              trace=trace, sync=SYNC_POLICY)
+        write_to_file(f"Per-step trace: {trace.count} records in {TRACE_FILE}")
     
     write_to_file(f"\nRISC-V executed {rv_count} instructions")
     write_to_file(f"Bitty executed {bitty_count} instructions")
@@ -303,11 +466,11 @@ def main():
     locations_changed_by_both = 0
     
     # FIXED: Compare RISC-V memory with Bitty's data memory
-    for addr in range(min(len(mem_riscv), len(bitty.data_memory))):
-        riscv_changed = (mem_riscv_initial[addr] != mem_riscv[addr])
-        bitty_changed = (mem_bitty_data_initial[addr] != bitty.data_memory[addr])
-        
-        if riscv_changed and bitty_changed:
+    common_size = min(len(mem_riscv), len(bitty.data_memory))
+    riscv_changed = differing_addresses(mem_riscv_initial, mem_riscv, common_size)
+    bitty_changed = set(differing_addresses(mem_bitty_data_initial, bitty.data_memory, common_size))
+    for addr in riscv_changed:
+        if addr in bitty_changed:
             locations_changed_by_both += 1
             if mem_riscv[addr] == bitty.data_memory[addr]:
                 changed_same_locations += 1
@@ -326,6 +489,7 @@ def main():
     write_to_file("\nDetailed register dumps can be found in:")
     write_to_file("- riscv_registers_output.txt")
     write_to_file("- bitty_registers_output.txt")
+    close_logs()
 
 
 def compare_memory_changes(initial_memory, current_memory, name="Memory"):
@@ -347,14 +511,12 @@ def compare_memory_changes(initial_memory, current_memory, name="Memory"):
     
     memory_size = min(len(initial_memory), len(current_memory))
     
-    # Check each memory location
-    for addr in range(memory_size):
+    # Check the memory locations that were written since the initial state
+    for addr in differing_addresses(initial_memory, current_memory, memory_size):
         initial_val = initial_memory[addr] & 0xFFFFFFFF
         current_val = current_memory[addr] & 0xFFFFFFFF
-        
-        if initial_val != current_val:
-            changes += 1
-            write_to_file(f"{addr:<6} 0x{initial_val:08X}  0x{current_val:08X}   ✗")
+        changes += 1
+        write_to_file(f"{addr:<6} 0x{initial_val:08X}  0x{current_val:08X}   ✗")
     
     # If no changes, note that as well
     if changes == 0:
@@ -1,9 +1,21 @@
+import functools
+
+from byte_memory import memory_fingerprint, restore_memory, snapshot_memory
+from verbosity import TRACE
+
+# Executions of a superblock start before run(jit=True) compiles it
+SUPERBLOCK_COMPILE_THRESHOLD = 2
+
 class RISCV32EMEmulator:
-    def __init__(self, memory_array):
+    def __init__(self, memory_array, verbosity=TRACE):
+        # QUIET skips all per-instruction output (see verbosity.py)
+        self.verbosity = verbosity
+        self.trace = verbosity >= TRACE
         # RISC-V has 32 registers (x0–x31), but RV32E uses only x0–x15
         self.registers = [i * 10 for i in range(16)]
         self.registers[0] = 0          # x0 is always zero
         self.pc = 0                    # program counter
+        self._decoded = None           # pre-decoded records, built on first run()
         self.instruction_array = []
         self.memory_array = memory_array
 
@@ -12,21 +24,134 @@ class RISCV32EMEmulator:
             with open("riscv_instructions.txt", "r") as infile:
                 for line in infile:
                     instr = int(line.strip(), 16)
-                    print(f"Instruction read and stored: {instr:08x}")
+                    if self.trace:
+                        print(f"Instruction read and stored: {instr:08x}")
                     self.instruction_array.append(instr)
         except FileNotFoundError:
             print("Error opening file: riscv_instructions.txt")
 
+    @property
+    def instruction_array(self):
+        return self._instruction_array
+
+    @instruction_array.setter
+    def instruction_array(self, instructions):
+        self._instruction_array = instructions
+        self._decoded = None
+
+    def invalidate_decoded(self):
+        """Drop the pre-decoded program; call after editing instruction_array in place."""
+        self._decoded = None
+
+    def predecode(self):
+        """Decode instruction_array into (handler, a, b, c) records, one per PC."""
+        if self._decoded is None or len(self._decoded) != len(self._instruction_array):
+            self._decoded = [predecode_instruction(instr) for instr in self._instruction_array]
+            self._superblocks = {}
+            self._superblock_visits = {}
+        return self._decoded
+
+    def step(self):
+        """Execute the instruction at self.pc from the pre-decoded program."""
+        decoded = self.predecode()
+        pc = self.pc
+        if 0 <= pc < len(decoded):
+            handler, a, b, c = decoded[pc]
+            self.pc = handler(self, pc, a, b, c)
+        else:
+            self.pc = pc + 1
+        return self.pc
+
+    def run(self, max_instructions=1000, jit=False):
+        """
+        Run from self.pc until it leaves the program or max_instructions have executed.
+
+        Uses the pre-decoded records when tracing is off; with TRACE each step
+        goes through decode_and_execute() so the output is unchanged. jit=True
+        additionally compiles hot superblocks (see riscv_superblocks.py).
+
+        Returns:
+            Number of instructions executed
+        """
+        count = 0
+        if self.trace:
+            while count < max_instructions and 0 <= self.pc < len(self._instruction_array):
+                self.pc = self.decode_and_execute(self.fetch_instruction())
+                count += 1
+            return count
+
+        if jit:
+            return self._run_superblocks(max_instructions)
+
+        decoded = self.predecode()
+        end = len(decoded)
+        pc = self.pc
+        while count < max_instructions and 0 <= pc < end:
+            handler, a, b, c = decoded[pc]
+            pc = handler(self, pc, a, b, c)
+            count += 1
+        self.pc = pc
+        return count
+
+    def _run_superblocks(self, max_instructions):
+        """
+        run() through compiled superblocks, without tracing.
+
+        A superblock is compiled the SUPERBLOCK_COMPILE_THRESHOLD-th time
+        execution reaches its start; until then it is interpreted from the
+        pre-decoded records up to the next branch or jump.
+        """
+        from riscv_superblocks import compile_superblock
+
+        decoded = self.predecode()
+        superblocks = self._superblocks
+        visits = self._superblock_visits
+        end = len(decoded)
+        pc = self.pc
+        count = 0
+        while count < max_instructions and 0 <= pc < end:
+            superblock = superblocks.get(pc)
+            if superblock is None:
+                seen = visits.get(pc, 0) + 1
+                if seen >= SUPERBLOCK_COMPILE_THRESHOLD:
+                    superblock = superblocks[pc] = compile_superblock(self._instruction_array, pc)
+                else:
+                    visits[pc] = seen
+                    while True:
+                        handler, a, b, c = decoded[pc]
+                        pc = handler(self, pc, a, b, c)
+                        count += 1
+                        if handler in _CONTROL_HANDLERS or not 0 <= pc < end or count >= max_instructions:
+                            break
+                    continue
+            function, length = superblock
+            if count + length <= max_instructions:
+                pc, executed = function(self)
+                count += executed
+            else:
+                # not enough budget left for the whole superblock
+                handler, a, b, c = decoded[pc]
+                pc = handler(self, pc, a, b, c)
+                count += 1
+        self.pc = pc
+        return count
+
     def fetch_instruction(self):
         if 0 <= self.pc < len(self.instruction_array):
             return self.instruction_array[self.pc]
         else:
-            print(f"PC out of range: {self.pc}")
+            if self.trace:
+                print(f"PC out of range: {self.pc}")
             return 0  # treat as NOP
 
     def decode_and_execute(self, instruction):
+        trace = self.trace
+        if not trace:
+            handler, a, b, c = predecode_instruction(instruction)
+            return handler(self, self.pc, a, b, c)
         opcode = instruction & 0x7F
-        print(f"Instruction @ PC={self.pc}: {instruction:08X}")
+        if trace:
+            print(f"Instruction @ PC={self.pc}: {instruction:08X}")
 
         # --- 1) M‑extension instructions (mul/div/rem) ---
         # opcode == 0110011 and funct7 == 0000001
@@ -38,7 +163,8 @@ class RISCV32EMEmulator:
 
             # RV32E register bounds
             if rd > 15 or rs1 > 15 or rs2 > 15:
-                print("Error: Register number exceeds 15 in RV32E mode")
+                if trace:
+                    print("Error: Register number exceeds 15 in RV32E mode")
                 return self.pc + 1
             if rd == 0:
                 return self.pc + 1
@@ -52,19 +178,23 @@ class RISCV32EMEmulator:
 
             if   funct3 == 0x0:  # MUL
                 result = (s1 * s2) & 0xFFFFFFFF
-                print(f"MUL x{rd}, x{rs1}, x{rs2}: {s1} * {s2} = {result:08X}")
+                if trace:
+                    print(f"MUL x{rd}, x{rs1}, x{rs2}: {s1} * {s2} = {result:08X}")
             elif funct3 == 0x1:  # MULH (high signed × signed)
                 full = s1 * s2
                 result = (full >> 32) & 0xFFFFFFFF
-                print(f"MULH x{rd}, x{rs1}, x{rs2}: high({s1}*{s2}) = {result:08X}")
+                if trace:
+                    print(f"MULH x{rd}, x{rs1}, x{rs2}: high({s1}*{s2}) = {result:08X}")
             elif funct3 == 0x2:  # MULHSU (high signed × unsigned)
                 full = s1 * v2
                 result = (full >> 32) & 0xFFFFFFFF
-                print(f"MULHSU x{rd}, x{rs1}, x{rs2}: high({s1}*{v2}) = {result:08X}")
+                if trace:
+                    print(f"MULHSU x{rd}, x{rs1}, x{rs2}: high({s1}*{v2}) = {result:08X}")
             elif funct3 == 0x3:  # MULHU (high unsigned × unsigned)
                 full = v1 * v2
                 result = (full >> 32) & 0xFFFFFFFF
-                print(f"MULHU x{rd}, x{rs1}, x{rs2}: high({v1}*{v2}) = {result:08X}")
+                if trace:
+                    print(f"MULHU x{rd}, x{rs1}, x{rs2}: high({v1}*{v2}) = {result:08X}")
             elif funct3 == 0x4:  # DIV (signed)
                 if s2 == 0:
                     result = 0xFFFFFFFF  # per spec: -1
@@ -72,13 +202,15 @@ class RISCV32EMEmulator:
                     result = s1 & 0xFFFFFFFF
                 else:
                     result = int(s1 // s2) & 0xFFFFFFFF
-                print(f"DIV x{rd}, x{rs1}, x{rs2}: {s1}//{s2} = {result:08X}")
+                if trace:
+                    print(f"DIV x{rd}, x{rs1}, x{rs2}: {s1}//{s2} = {result:08X}")
             elif funct3 == 0x5:  # DIVU (unsigned)
                 if v2 == 0:
                     result = 0xFFFFFFFF
                 else:
                     result = (v1 // v2) & 0xFFFFFFFF
-                print(f"DIVU x{rd}, x{rs1}, x{rs2}: {v1}//{v2} = {result:08X}")
+                if trace:
+                    print(f"DIVU x{rd}, x{rs1}, x{rs2}: {v1}//{v2} = {result:08X}")
             elif funct3 == 0x6:  # REM (signed remainder)
                 if s2 == 0:
                     result = s1 & 0xFFFFFFFF
@@ -86,15 +218,18 @@ class RISCV32EMEmulator:
                     result = 0
                 else:
                     result = int(s1 % s2) & 0xFFFFFFFF
-                print(f"REM x{rd}, x{rs1}, x{rs2}: {s1}%{s2} = {result:08X}")
+                if trace:
+                    print(f"REM x{rd}, x{rs1}, x{rs2}: {s1}%{s2} = {result:08X}")
             elif funct3 == 0x7:  # REMU (unsigned remainder)
                 if v2 == 0:
                     result = v1 & 0xFFFFFFFF
                 else:
                     result = (v1 % v2) & 0xFFFFFFFF
-                print(f"REMU x{rd}, x{rs1}, x{rs2}: {v1}%{v2} = {result:08X}")
+                if trace:
+                    print(f"REMU x{rd}, x{rs1}, x{rs2}: {v1}%{v2} = {result:08X}")
             else:
-                print(f"Unknown M‑extension funct3: {funct3}")
+                if trace:
+                    print(f"Unknown M‑extension funct3: {funct3}")
                 return self.pc + 1
 
             self.registers[rd] = result
@@ -109,7 +244,8 @@ class RISCV32EMEmulator:
             funct7 = (instruction >> 25) & 0x7F
 
             if rd > 15 or rs1 > 15 or rs2 > 15:
-                print("Error: Register number exceeds 15 in RV32E mode")
+                if trace:
+                    print("Error: Register number exceeds 15 in RV32E mode")
                 return self.pc + 1
 
             # x0 stays zero
@@ -119,17 +255,21 @@ class RISCV32EMEmulator:
             if funct3 == 0x0:
                 if funct7 == 0x00:  # ADD
                     result = (self.registers[rs1] + self.registers[rs2]) & 0xFFFFFFFF
-                    print(f"ADD x{rd}, x{rs1}, x{rs2}: {result}")
+                    if trace:
+                        print(f"ADD x{rd}, x{rs1}, x{rs2}: {result}")
                 elif funct7 == 0x20:  # SUB
                     result = (self.registers[rs1] - self.registers[rs2]) & 0xFFFFFFFF
-                    print(f"SUB x{rd}, x{rs1}, x{rs2}: {result}")
+                    if trace:
+                        print(f"SUB x{rd}, x{rs1}, x{rs2}: {result}")
                 else:
-                    print(f"Unknown funct7 for ADD/SUB: {funct7}")
+                    if trace:
+                        print(f"Unknown funct7 for ADD/SUB: {funct7}")
                     return self.pc + 1
             elif funct3 == 0x1:  # SLL
                 sh = self.registers[rs2] & 0x1F
                 result = (self.registers[rs1] << sh) & 0xFFFFFFFF
-                print(f"SLL x{rd}, x{rs1}, x{rs2}: <<{sh} = {result}")
+                if trace:
+                    print(f"SLL x{rd}, x{rs1}, x{rs2}: <<{sh} = {result}")
             elif funct3 == 0x2:  # SLT
                 # signed compare
                 a = self.registers[rs1]
@@ -137,18 +277,22 @@ class RISCV32EMEmulator:
                 sa = a if a < 0x80000000 else a - 0x100000000
                 sb = b if b < 0x80000000 else b - 0x100000000
                 result = 1 if sa < sb else 0
-                print(f"SLT x{rd}, x{rs1}, x{rs2}: {sa}<{sb} = {result}")
+                if trace:
+                    print(f"SLT x{rd}, x{rs1}, x{rs2}: {sa}<{sb} = {result}")
             elif funct3 == 0x3:  # SLTU
                 result = 1 if (self.registers[rs1] & 0xFFFFFFFF) < (self.registers[rs2] & 0xFFFFFFFF) else 0
-                print(f"SLTU x{rd}, x{rs1}, x{rs2}: = {result}")
+                if trace:
+                    print(f"SLTU x{rd}, x{rs1}, x{rs2}: = {result}")
             elif funct3 == 0x4:  # XOR
                 result = self.registers[rs1] ^ self.registers[rs2]
-                print(f"XOR x{rd}, x{rs1}, x{rs2}: = {result}")
+                if trace:
+                    print(f"XOR x{rd}, x{rs1}, x{rs2}: = {result}")
             elif funct3 == 0x5:
                 if funct7 == 0x00:  # SRL
                     sh = self.registers[rs2] & 0x1F
                     result = (self.registers[rs1] >> sh) & 0xFFFFFFFF
-                    print(f"SRL x{rd}, x{rs1}, x{rs2}: >>{sh} = {result}")
+                    if trace:
+                        print(f"SRL x{rd}, x{rs1}, x{rs2}: >>{sh} = {result}")
                 elif funct7 == 0x20:  # SRA
                     sh = self.registers[rs2] & 0x1F
                     val = self.registers[rs1]
@@ -157,18 +301,23 @@ class RISCV32EMEmulator:
                         result = ((val >> sh) | mask) & 0xFFFFFFFF
                     else:
                         result = (val >> sh) & 0xFFFFFFFF
-                    print(f"SRA x{rd}, x{rs1}, x{rs2}: >>a{sh} = {result}")
+                    if trace:
+                        print(f"SRA x{rd}, x{rs1}, x{rs2}: >>a{sh} = {result}")
                 else:
-                    print(f"Unknown funct7 for SRL/SRA: {funct7}")
+                    if trace:
+                        print(f"Unknown funct7 for SRL/SRA: {funct7}")
                     return self.pc + 1
             elif funct3 == 0x6:  # OR
                 result = self.registers[rs1] | self.registers[rs2]
-                print(f"OR x{rd}, x{rs1}, x{rs2}: = {result}")
+                if trace:
+                    print(f"OR x{rd}, x{rs1}, x{rs2}: = {result}")
             elif funct3 == 0x7:  # AND
                 result = self.registers[rs1] & self.registers[rs2]
-                print(f"AND x{rd}, x{rs1}, x{rs2}: = {result}")
+                if trace:
+                    print(f"AND x{rd}, x{rs1}, x{rs2}: = {result}")
             else:
-                print(f"Unknown funct3 for R‑type: {funct3}")
+                if trace:
+                    print(f"Unknown funct3 for R‑type: {funct3}")
                 return self.pc + 1
 
             self.registers[rd] = result
@@ -185,7 +334,8 @@ class RISCV32EMEmulator:
                 imm |= 0xFFFFF000
 
             if rd > 15 or rs1 > 15:
-                print("Error: Register number exceeds 15 in RV32E mode")
+                if trace:
+                    print("Error: Register number exceeds 15 in RV32E mode")
                 return self.pc + 1
 
             # --- arithmetic immediates ---
@@ -194,30 +344,36 @@ class RISCV32EMEmulator:
                     return self.pc + 1
                 if   funct3 == 0x0:  # ADDI
                     result = (self.registers[rs1] + imm) & 0xFFFFFFFF
-                    print(f"ADDI x{rd}, x{rs1}, {imm} = {result}")
+                    if trace:
+                        print(f"ADDI x{rd}, x{rs1}, {imm} = {result}")
                 elif funct3 == 0x1:  # SLLI
                     sh = imm & 0x1F
                     result = (self.registers[rs1] << sh) & 0xFFFFFFFF
-                    print(f"SLLI x{rd}, x{rs1}, {sh} = {result}")
+                    if trace:
+                        print(f"SLLI x{rd}, x{rs1}, {sh} = {result}")
                 elif funct3 == 0x2:  # SLTI
                     # similar signed logic...
                     sa = self.registers[rs1]
                     sa = sa if sa < 0x80000000 else sa - 0x100000000
                     imm_s = imm if imm < 0x800 else imm - 0x1000
                     result = 1 if sa < imm_s else 0
-                    print(f"SLTI x{rd}, x{rs1}, {imm_s} = {result}")
+                    if trace:
+                        print(f"SLTI x{rd}, x{rs1}, {imm_s} = {result}")
                 elif funct3 == 0x3:  # SLTIU
                     result = 1 if (self.registers[rs1] & 0xFFFFFFFF) < (imm & 0xFFFFFFFF) else 0
-                    print(f"SLTIU x{rd}, x{rs1}, {imm} = {result}")
+                    if trace:
+                        print(f"SLTIU x{rd}, x{rs1}, {imm} = {result}")
                 elif funct3 == 0x4:  # XORI
                     result = self.registers[rs1] ^ imm
-                    print(f"XORI x{rd}, x{rs1}, {imm} = {result}")
+                    if trace:
+                        print(f"XORI x{rd}, x{rs1}, {imm} = {result}")
                 elif funct3 == 0x5:  # SRLI/SRAI
                     sh = imm & 0x1F
                     t = (imm >> 5) & 0x7F
                     if t == 0x00:
                         result = (self.registers[rs1] >> sh) & 0xFFFFFFFF
-                        print(f"SRLI x{rd}, x{rs1}, {sh} = {result}")
+                        if trace:
+                            print(f"SRLI x{rd}, x{rs1}, {sh} = {result}")
                     elif t == 0x20:
                         val = self.registers[rs1]
                         if val & 0x80000000:
@@ -225,18 +381,23 @@ class RISCV32EMEmulator:
                             result = ((val >> sh) | mask) & 0xFFFFFFFF
                         else:
                             result = (val >> sh) & 0xFFFFFFFF
-                        print(f"SRAI x{rd}, x{rs1}, {sh} = {result}")
+                        if trace:
+                            print(f"SRAI x{rd}, x{rs1}, {sh} = {result}")
                     else:
-                        print(f"Unknown shift type: {t}")
+                        if trace:
+                            print(f"Unknown shift type: {t}")
                         return self.pc + 1
                 elif funct3 == 0x6:  # ORI
                     result = self.registers[rs1] | imm
-                    print(f"ORI x{rd}, x{rs1}, {imm} = {result}")
+                    if trace:
+                        print(f"ORI x{rd}, x{rs1}, {imm} = {result}")
                 elif funct3 == 0x7:  # ANDI
                     result = self.registers[rs1] & imm
-                    print(f"ANDI x{rd}, x{rs1}, {imm} = {result}")
+                    if trace:
+                        print(f"ANDI x{rd}, x{rs1}, {imm} = {result}")
                 else:
-                    print(f"Unknown funct3 for I‑type: {funct3}")
+                    if trace:
+                        print(f"Unknown funct3 for I‑type: {funct3}")
                     return self.pc + 1
 
                 if rd != 0:
@@ -246,7 +407,8 @@ class RISCV32EMEmulator:
             else:  # opcode == 0000011
                 address = (self.registers[rs1] + imm) & 0xFFFFFFFF
                 if address >= len(self.memory_array):
-                    print(f"Memory access out of bounds: {address}")
+                    if trace:
+                        print(f"Memory access out of bounds: {address}")
                     address %= len(self.memory_array)
 
                 if rd == 0:
@@ -256,28 +418,34 @@ class RISCV32EMEmulator:
                     val = self.memory_array[address] & 0xFF
                     if val & 0x80: val |= 0xFFFFFF00
                     self.registers[rd] = val
-                    print(f"LB x{rd}, {imm}(x{rs1}) = {val:08X}")
+                    if trace:
+                        print(f"LB x{rd}, {imm}(x{rs1}) = {val:08X}")
                 elif funct3 == 0x1: # LH
                     if address % 2 != 0: address -= 1
                     val = self.memory_array[address] & 0xFFFF
                     if val & 0x8000: val |= 0xFFFF0000
                     self.registers[rd] = val
-                    print(f"LH x{rd}, {imm}(x{rs1}) = {val:08X}")
+                    if trace:
+                        print(f"LH x{rd}, {imm}(x{rs1}) = {val:08X}")
                 elif funct3 == 0x2: # LW
                     val = self.memory_array[address]
                     self.registers[rd] = val
-                    print(f"LW x{rd}, {imm}(x{rs1}) = {val:08X}")
+                    if trace:
+                        print(f"LW x{rd}, {imm}(x{rs1}) = {val:08X}")
                 elif funct3 == 0x4: # LBU
                     val = self.memory_array[address] & 0xFF
                     self.registers[rd] = val
-                    print(f"LBU x{rd}, {imm}(x{rs1}) = {val:08X}")
+                    if trace:
+                        print(f"LBU x{rd}, {imm}(x{rs1}) = {val:08X}")
                 elif funct3 == 0x5: # LHU
                     if address % 2 != 0: address -= 1
                     val = self.memory_array[address] & 0xFFFF
                     self.registers[rd] = val
-                    print(f"LHU x{rd}, {imm}(x{rs1}) = {val:08X}")
+                    if trace:
+                        print(f"LHU x{rd}, {imm}(x{rs1}) = {val:08X}")
                 else:
-                    print(f"Unknown funct3 for load: {funct3}")
+                    if trace:
+                        print(f"Unknown funct3 for load: {funct3}")
                     return self.pc + 1
 
             return self.pc + 1
@@ -293,35 +461,43 @@ class RISCV32EMEmulator:
             if imm & 0x800: imm |= 0xFFFFF000
 
             if rs1 > 15 or rs2 > 15:
-                print("Error: Register number exceeds 15 in RV32E mode")
+                if trace:
+                    print("Error: Register number exceeds 15 in RV32E mode")
                 return self.pc + 1
 
             addr = (self.registers[rs1] + imm) & 0xFFFFFFFF
             if addr >= len(self.memory_array):
-                print(f"Memory access out of bounds: {addr}")
+                if trace:
+                    print(f"Memory access out of bounds: {addr}")
                 return self.pc + 1
 
             if funct3 == 0x0:   # SB
                 b = self.registers[rs2] & 0xFF
                 self.memory_array[addr] = (self.memory_array[addr] & 0xFFFFFF00) | b
-                print(f"SB x{rs2}, {imm}(x{rs1})")
+                if trace:
+                    print(f"SB x{rs2}, {imm}(x{rs1})")
             elif funct3 == 0x1: # SH
                 if addr % 2 != 0:
-                    print(f"Misaligned SH at {addr}")
+                    if trace:
+                        print(f"Misaligned SH at {addr}")
                     return self.pc + 1
                 h = self.registers[rs2] & 0xFFFF
                 self.memory_array[addr] = (self.memory_array[addr] & 0xFFFF0000) | h
-                print(f"SH x{rs2}, {imm}(x{rs1})")
+                if trace:
+                    print(f"SH x{rs2}, {imm}(x{rs1})")
             elif funct3 == 0x2: # SW
                 if addr % 4 != 0:
-                    print(f"Misaligned SW at {addr}")
+                    if trace:
+                        print(f"Misaligned SW at {addr}")
                     return self.pc + 1
                 w = self.registers[rs2]
                 self.memory_array[addr] = w
-                print(f"SW x{rs2}, {imm}(x{rs1})")
-                print(f"Stored {w:08X} at address {addr:08X}")
+                if trace:
+                    print(f"SW x{rs2}, {imm}(x{rs1})")
+                    print(f"Stored {w:08X} at address {addr:08X}")
             else:
-                print(f"Unknown funct3 for store: {funct3}")
+                if trace:
+                    print(f"Unknown funct3 for store: {funct3}")
                 return self.pc + 1
 
             return self.pc + 1
@@ -354,7 +530,8 @@ class RISCV32EMEmulator:
 
             # --- Register Access and RV32E Check ---
             if rs1 > 15 or rs2 > 15: # RV32E has only x0-x15
-                print("Error: Register number exceeds 15 in RV32E mode")
+                if trace:
+                    print("Error: Register number exceeds 15 in RV32E mode")
                 # Assuming self.pc is the address of the current instruction.
                 # For an error, you might want to halt or raise an exception.
                 # Incrementing PC by 1 here seems unusual if instructions are 4 bytes.
@@ -379,14 +556,16 @@ class RISCV32EMEmulator:
                 sa = a if a < 0x80000000 else a - 0x100000000
                 sb = b if b < 0x80000000 else b - 0x100000000
                 take = (sa >= sb)
-                print("BGE", sa, sb)
+                if trace:
+                    print("BGE", sa, sb)
 
             elif funct3 == 0x6: # BLTU
                 take = (a & 0xFFFFFFFF) < (b & 0xFFFFFFFF)
             elif funct3 == 0x7: # BGEU
                 take = (a & 0xFFFFFFFF) >= (b & 0xFFFFFFFF)
             else:
-                print(f"Unknown branch funct3: {funct3}")
+                if trace:
+                    print(f"Unknown branch funct3: {funct3}")
                 return self.pc + 1
             
             # Calculate branch target directly using imm instead of dividing by 4
@@ -396,7 +575,8 @@ class RISCV32EMEmulator:
                 target = abs(target) % len(self.instruction_array)
                 target = len(self.instruction_array) - target
 
-            print(f"{'TAKE' if take else 'NO'} BRANCH {funct3} imm={signed_imm} target={target}")
+            if trace:
+                print(f"{'TAKE' if take else 'NO'} BRANCH {funct3} imm={signed_imm} target={target}")
             return target if take else self.pc + 1
 
         # --- 6) U‑type (LUI/AUIPC) ---
@@ -404,17 +584,20 @@ class RISCV32EMEmulator:
             rd  = (instruction >> 7) & 0x1F
             imm = instruction & 0xFFFFF000
             if rd > 15:
-                print("Error: Register number exceeds 15 in RV32E mode")
+                if trace:
+                    print("Error: Register number exceeds 15 in RV32E mode")
                 return self.pc + 1
             if rd == 0:
                 return self.pc + 1
 
             if opcode == 0b0110111:  # LUI
                 self.registers[rd] = imm
-                print(f"LUI x{rd}, 0x{imm>>12:X}")
+                if trace:
+                    print(f"LUI x{rd}, 0x{imm>>12:X}")
             else:                    # AUIPC
                 self.registers[rd] = (self.pc + imm) & 0xFFFFFFFF
-                print(f"AUIPC x{rd}, 0x{imm>>12:X}")
+                if trace:
+                    print(f"AUIPC x{rd}, 0x{imm>>12:X}")
 
             return self.pc + 1
 
@@ -439,7 +622,8 @@ class RISCV32EMEmulator:
                 target = abs(target) % len(self.instruction_array)
                 target = len(self.instruction_array) - target
                 
-            print(f"JAL x{rd}, imm={imm} -> PC={target}")
+            if trace:
+                print(f"JAL x{rd}, imm={imm} -> PC={target}")
             return target
 
         # --- 8) I‑type JALR ---
@@ -451,7 +635,8 @@ class RISCV32EMEmulator:
             if imm & 0x800: imm |= 0xFFFFF000
 
             if funct3 != 0x0 or rd > 15 or rs1 > 15:
-                print(f"Unknown or out‑of‑range JALR")
+                if trace:
+                    print(f"Unknown or out‑of‑range JALR")
                 return self.pc + 1
 
             ret = (self.pc + 1) & 0xFFFFFFFF
@@ -463,13 +648,41 @@ class RISCV32EMEmulator:
             
             if rd != 0:
                 self.registers[rd] = ret
-            print(f"JALR x{rd}, x{rs1}, {imm}: -> PC={target}")
+            if trace:
+                print(f"JALR x{rd}, x{rs1}, {imm}: -> PC={target}")
             return target
 
         else:
-            print(f"Unknown opcode: {opcode:02b}")
+            if trace:
+                print(f"Unknown opcode: {opcode:02b}")
             return self.pc + 1
     
+    def fingerprint(self):
+        """
+        Hash of the architectural state compared between emulators.
+
+        Covers the 16 registers and all of memory; O(1) in the memory size
+        when it is a PagedMemory (see byte_memory.mix_word()).
+        """
+        return hash((tuple(r & 0xFFFFFFFF for r in self.registers[:16]),
+                     memory_fingerprint(self.memory_array)))
+
+    def snapshot(self):
+        """
+        Capture registers, PC and memory for restore().
+
+        PagedMemory is captured copy-on-write, other memories are copied.
+        """
+        return {"registers": list(self.registers),
+                "pc": self.pc,
+                "memory": snapshot_memory(self.memory_array)}
+
+    def restore(self, snapshot):
+        """Rewind to a snapshot() taken on this emulator; memory is restored in place."""
+        self.registers = list(snapshot["registers"])
+        self.pc = snapshot["pc"]
+        restore_memory(self.memory_array, snapshot["memory"])
+
     def print_registers(self):
         """Write the current state of all registers to a file."""
         with open("riscv_registers_output.txt", "w") as f:
@@ -482,3 +695,419 @@ class RISCV32EMEmulator:
             # write PC and data output
             f.write(f"PC: {self.pc}\n")
             #f.write(f"D_OUT: {self.d_out:08X}\n\n")
+
+
+# ---------------------------------------------------------------------------
+# Pre-decoded execution
+#
+# predecode_instruction() turns a 32-bit word into a record
+# (handler, a, b, c). Running it is handler(emulator, pc, a, b, c), which
+# returns the next PC. The handlers have the same semantics as
+# decode_and_execute() with tracing off. Register bound checks, x0 writes and
+# unknown encodings are resolved at decode time (they become _exec_nop).
+# ---------------------------------------------------------------------------
+
+def _signed(v):
+    return v if v < 0x80000000 else v - 0x100000000
+
+
+def _exec_nop(emu, pc, a, b, c):
+    return pc + 1
+
+
+# --- R-type: (rd, rs1, rs2) ---
+def _exec_add(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = (regs[rs1] + regs[rs2]) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_sub(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = (regs[rs1] - regs[rs2]) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_sll(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = (regs[rs1] << (regs[rs2] & 0x1F)) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_slt(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = 1 if _signed(regs[rs1]) < _signed(regs[rs2]) else 0
+    return pc + 1
+
+def _exec_sltu(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = 1 if (regs[rs1] & 0xFFFFFFFF) < (regs[rs2] & 0xFFFFFFFF) else 0
+    return pc + 1
+
+def _exec_xor(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = regs[rs1] ^ regs[rs2]
+    return pc + 1
+
+def _exec_srl(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = (regs[rs1] >> (regs[rs2] & 0x1F)) & 0xFFFFFFFF
+    return pc + 1
+
+def _shift_right_arith(val, sh):
+    if val & 0x80000000:
+        return ((val >> sh) | (((1 << sh) - 1) << (32 - sh))) & 0xFFFFFFFF
+    return (val >> sh) & 0xFFFFFFFF
+
+def _exec_sra(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = _shift_right_arith(regs[rs1], regs[rs2] & 0x1F)
+    return pc + 1
+
+def _exec_or(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = regs[rs1] | regs[rs2]
+    return pc + 1
+
+def _exec_and(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = regs[rs1] & regs[rs2]
+    return pc + 1
+
+
+# --- M extension: (rd, rs1, rs2) ---
+def _exec_mul(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = (_signed(regs[rs1]) * _signed(regs[rs2])) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_mulh(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = ((_signed(regs[rs1]) * _signed(regs[rs2])) >> 32) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_mulhsu(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = ((_signed(regs[rs1]) * regs[rs2]) >> 32) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_mulhu(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    regs[rd] = ((regs[rs1] * regs[rs2]) >> 32) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_div(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    s1 = _signed(regs[rs1])
+    s2 = _signed(regs[rs2])
+    if s2 == 0:
+        regs[rd] = 0xFFFFFFFF
+    elif s1 == -0x80000000 and s2 == -1:
+        regs[rd] = s1 & 0xFFFFFFFF
+    else:
+        regs[rd] = (s1 // s2) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_divu(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    v2 = regs[rs2]
+    regs[rd] = 0xFFFFFFFF if v2 == 0 else (regs[rs1] // v2) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_rem(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    s1 = _signed(regs[rs1])
+    s2 = _signed(regs[rs2])
+    if s2 == 0:
+        regs[rd] = s1 & 0xFFFFFFFF
+    elif s1 == -0x80000000 and s2 == -1:
+        regs[rd] = 0
+    else:
+        regs[rd] = (s1 % s2) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_remu(emu, pc, rd, rs1, rs2):
+    regs = emu.registers
+    v1 = regs[rs1]
+    v2 = regs[rs2]
+    regs[rd] = v1 & 0xFFFFFFFF if v2 == 0 else (v1 % v2) & 0xFFFFFFFF
+    return pc + 1
+
+
+# --- I-type arithmetic: (rd, rs1, imm) with imm already sign-extended to 32 bits ---
+def _exec_addi(emu, pc, rd, rs1, imm):
+    regs = emu.registers
+    regs[rd] = (regs[rs1] + imm) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_slli(emu, pc, rd, rs1, sh):
+    regs = emu.registers
+    regs[rd] = (regs[rs1] << sh) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_slti(emu, pc, rd, rs1, imm_s):
+    regs = emu.registers
+    regs[rd] = 1 if _signed(regs[rs1]) < imm_s else 0
+    return pc + 1
+
+def _exec_sltiu(emu, pc, rd, rs1, imm):
+    regs = emu.registers
+    regs[rd] = 1 if (regs[rs1] & 0xFFFFFFFF) < imm else 0
+    return pc + 1
+
+def _exec_xori(emu, pc, rd, rs1, imm):
+    regs = emu.registers
+    regs[rd] = regs[rs1] ^ imm
+    return pc + 1
+
+def _exec_srli(emu, pc, rd, rs1, sh):
+    regs = emu.registers
+    regs[rd] = (regs[rs1] >> sh) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_srai(emu, pc, rd, rs1, sh):
+    regs = emu.registers
+    regs[rd] = _shift_right_arith(regs[rs1], sh)
+    return pc + 1
+
+def _exec_ori(emu, pc, rd, rs1, imm):
+    regs = emu.registers
+    regs[rd] = regs[rs1] | imm
+    return pc + 1
+
+def _exec_andi(emu, pc, rd, rs1, imm):
+    regs = emu.registers
+    regs[rd] = regs[rs1] & imm
+    return pc + 1
+
+
+# --- loads: (rd, rs1, imm) ---
+def _load_address(emu, rs1, imm):
+    address = (emu.registers[rs1] + imm) & 0xFFFFFFFF
+    size = len(emu.memory_array)
+    if address >= size:
+        address %= size
+    return address
+
+def _exec_lb(emu, pc, rd, rs1, imm):
+    val = emu.memory_array[_load_address(emu, rs1, imm)] & 0xFF
+    if val & 0x80: val |= 0xFFFFFF00
+    emu.registers[rd] = val
+    return pc + 1
+
+def _exec_lh(emu, pc, rd, rs1, imm):
+    address = _load_address(emu, rs1, imm)
+    if address % 2 != 0: address -= 1
+    val = emu.memory_array[address] & 0xFFFF
+    if val & 0x8000: val |= 0xFFFF0000
+    emu.registers[rd] = val
+    return pc + 1
+
+def _exec_lw(emu, pc, rd, rs1, imm):
+    emu.registers[rd] = emu.memory_array[_load_address(emu, rs1, imm)]
+    return pc + 1
+
+def _exec_lbu(emu, pc, rd, rs1, imm):
+    emu.registers[rd] = emu.memory_array[_load_address(emu, rs1, imm)] & 0xFF
+    return pc + 1
+
+def _exec_lhu(emu, pc, rd, rs1, imm):
+    address = _load_address(emu, rs1, imm)
+    if address % 2 != 0: address -= 1
+    emu.registers[rd] = emu.memory_array[address] & 0xFFFF
+    return pc + 1
+
+
+# --- stores: (rs1, rs2, imm) ---
+def _exec_sb(emu, pc, rs1, rs2, imm):
+    mem = emu.memory_array
+    addr = (emu.registers[rs1] + imm) & 0xFFFFFFFF
+    if addr < len(mem):
+        mem[addr] = (mem[addr] & 0xFFFFFF00) | (emu.registers[rs2] & 0xFF)
+    return pc + 1
+
+def _exec_sh(emu, pc, rs1, rs2, imm):
+    mem = emu.memory_array
+    addr = (emu.registers[rs1] + imm) & 0xFFFFFFFF
+    if addr < len(mem) and addr % 2 == 0:
+        mem[addr] = (mem[addr] & 0xFFFF0000) | (emu.registers[rs2] & 0xFFFF)
+    return pc + 1
+
+def _exec_sw(emu, pc, rs1, rs2, imm):
+    mem = emu.memory_array
+    addr = (emu.registers[rs1] + imm) & 0xFFFFFFFF
+    if addr < len(mem) and addr % 4 == 0:
+        mem[addr] = emu.registers[rs2]
+    return pc + 1
+
+
+# --- branches: (rs1, rs2, offset in instructions) ---
+def _branch_target(emu, target):
+    if target < 0:
+        target = abs(target) % len(emu.instruction_array)
+        target = len(emu.instruction_array) - target
+    return target
+
+def _exec_beq(emu, pc, rs1, rs2, offset):
+    regs = emu.registers
+    return _branch_target(emu, pc + offset) if regs[rs1] == regs[rs2] else pc + 1
+
+def _exec_bne(emu, pc, rs1, rs2, offset):
+    regs = emu.registers
+    return _branch_target(emu, pc + offset) if regs[rs1] != regs[rs2] else pc + 1
+
+def _exec_blt(emu, pc, rs1, rs2, offset):
+    regs = emu.registers
+    return _branch_target(emu, pc + offset) if _signed(regs[rs1]) < _signed(regs[rs2]) else pc + 1
+
+def _exec_bge(emu, pc, rs1, rs2, offset):
+    regs = emu.registers
+    return _branch_target(emu, pc + offset) if _signed(regs[rs1]) >= _signed(regs[rs2]) else pc + 1
+
+def _exec_bltu(emu, pc, rs1, rs2, offset):
+    regs = emu.registers
+    return _branch_target(emu, pc + offset) if (regs[rs1] & 0xFFFFFFFF) < (regs[rs2] & 0xFFFFFFFF) else pc + 1
+
+def _exec_bgeu(emu, pc, rs1, rs2, offset):
+    regs = emu.registers
+    return _branch_target(emu, pc + offset) if (regs[rs1] & 0xFFFFFFFF) >= (regs[rs2] & 0xFFFFFFFF) else pc + 1
+
+
+# --- U-type, jumps ---
+def _exec_lui(emu, pc, rd, imm, _):
+    emu.registers[rd] = imm
+    return pc + 1
+
+def _exec_auipc(emu, pc, rd, imm, _):
+    emu.registers[rd] = (pc + imm) & 0xFFFFFFFF
+    return pc + 1
+
+def _exec_jal(emu, pc, rd, target, _):
+    if rd:
+        emu.registers[rd] = (pc + 1) & 0xFFFFFFFF
+    return target
+
+def _exec_jalr(emu, pc, rd, rs1, imm):
+    regs = emu.registers
+    target = ((regs[rs1] + imm) & 0xFFFFFFFE) % len(emu.instruction_array)
+    if rd:
+        regs[rd] = (pc + 1) & 0xFFFFFFFF
+    return target
+
+
+_NOP = (_exec_nop, 0, 0, 0)
+
+_R_HANDLERS = {
+    (0x00, 0x0): _exec_add,  (0x20, 0x0): _exec_sub,
+    (0x00, 0x1): _exec_sll,  (0x00, 0x2): _exec_slt,
+    (0x00, 0x3): _exec_sltu, (0x00, 0x4): _exec_xor,
+    (0x00, 0x5): _exec_srl,  (0x20, 0x5): _exec_sra,
+    (0x00, 0x6): _exec_or,   (0x00, 0x7): _exec_and,
+}
+# decode_and_execute() only checks funct7 where ADD/SUB and SRL/SRA differ
+for _funct3 in (0x1, 0x2, 0x3, 0x4, 0x6, 0x7):
+    for _funct7 in range(0x80):
+        if _funct7 != 0x01:
+            _R_HANDLERS.setdefault((_funct7, _funct3), _R_HANDLERS[(0x00, _funct3)])
+
+_M_HANDLERS = (_exec_mul, _exec_mulh, _exec_mulhsu, _exec_mulhu,
+               _exec_div, _exec_divu, _exec_rem, _exec_remu)
+
+_I_HANDLERS = {0x0: _exec_addi, 0x3: _exec_sltiu, 0x4: _exec_xori,
+               0x6: _exec_ori, 0x7: _exec_andi}
+
+_LOAD_HANDLERS = {0x0: _exec_lb, 0x1: _exec_lh, 0x2: _exec_lw,
+                  0x4: _exec_lbu, 0x5: _exec_lhu}
+
+_STORE_HANDLERS = {0x0: _exec_sb, 0x1: _exec_sh, 0x2: _exec_sw}
+
+_BRANCH_HANDLERS = {0x0: _exec_beq, 0x1: _exec_bne, 0x4: _exec_blt,
+                    0x5: _exec_bge, 0x6: _exec_bltu, 0x7: _exec_bgeu}
+
+
+# Handlers that can leave straight-line code
+_CONTROL_HANDLERS = frozenset(_BRANCH_HANDLERS.values()) | {_exec_jal, _exec_jalr}
+
+
+@functools.lru_cache(maxsize=65536)
+def predecode_instruction(instruction):
+    """
+    Decode one RV32EM instruction word into an executable record.
+
+    Returns:
+        Tuple of (handler, a, b, c); handler(emulator, pc, a, b, c) executes
+        the instruction and returns the next PC.
+    """
+    opcode = instruction & 0x7F
+    rd     = (instruction >> 7)  & 0x1F
+    funct3 = (instruction >> 12) & 0x7
+    rs1    = (instruction >> 15) & 0x1F
+    rs2    = (instruction >> 20) & 0x1F
+    funct7 = (instruction >> 25) & 0x7F
+
+    if opcode == 0b0110011:
+        if rd > 15 or rs1 > 15 or rs2 > 15 or rd == 0:
+            return _NOP
+        if funct7 == 0x01:
+            return (_M_HANDLERS[funct3], rd, rs1, rs2)
+        handler = _R_HANDLERS.get((funct7, funct3))
+        return (handler, rd, rs1, rs2) if handler else _NOP
+
+    if opcode in (0b0010011, 0b0000011):
+        imm = (instruction >> 20) & 0xFFF
+        if imm & 0x800:
+            imm |= 0xFFFFF000
+        if rd > 15 or rs1 > 15 or rd == 0:
+            return _NOP
+        if opcode == 0b0000011:
+            handler = _LOAD_HANDLERS.get(funct3)
+            return (handler, rd, rs1, imm) if handler else _NOP
+        if funct3 == 0x1:
+            return (_exec_slli, rd, rs1, imm & 0x1F)
+        if funct3 == 0x2:
+            return (_exec_slti, rd, rs1, imm if imm < 0x800 else imm - 0x1000)
+        if funct3 == 0x5:
+            t = (imm >> 5) & 0x7F
+            if t == 0x00:
+                return (_exec_srli, rd, rs1, imm & 0x1F)
+            if t == 0x20:
+                return (_exec_srai, rd, rs1, imm & 0x1F)
+            return _NOP
+        return (_I_HANDLERS[funct3], rd, rs1, imm)
+
+    if opcode == 0b0100011:
+        imm = (funct7 << 5) | rd
+        if imm & 0x800: imm |= 0xFFFFF000
+        if rs1 > 15 or rs2 > 15:
+            return _NOP
+        handler = _STORE_HANDLERS.get(funct3)
+        return (handler, rs1, rs2, imm) if handler else _NOP
+
+    if opcode == 0b1100011:
+        imm = (((instruction >> 31) & 0x1) << 12) | (((instruction >> 7) & 0x1) << 11) \
+            | (((instruction >> 25) & 0x3F) << 5) | (((instruction >> 8) & 0xF) << 1)
+        if imm & (1 << 12):
+            imm -= 1 << 13
+        if rs1 > 15 or rs2 > 15:
+            return _NOP
+        handler = _BRANCH_HANDLERS.get(funct3)
+        return (handler, rs1, rs2, imm // 4) if handler else _NOP
+
+    if opcode in (0b0110111, 0b0010111):
+        if rd > 15 or rd == 0:
+            return _NOP
+        handler = _exec_lui if opcode == 0b0110111 else _exec_auipc
+        return (handler, rd, instruction & 0xFFFFF000, 0)
+
+    if opcode == 0b1101111:
+        # the target is the (never negative) immediate itself
+        imm = (((instruction >> 31) & 0x1) << 20) | (((instruction >> 12) & 0xFF) << 12) \
+            | (((instruction >> 20) & 0x1) << 11) | (((instruction >> 21) & 0x3FF) << 1)
+        if imm & 0x100000: imm |= 0xFFE00000
+        return (_exec_jal, rd if rd <= 15 else 0, imm, 0)
+
+    if opcode == 0b1100111:
+        imm = (instruction >> 20) & 0xFFF
+        if imm & 0x800: imm |= 0xFFFFF000
+        if funct3 != 0x0 or rd > 15 or rs1 > 15:
+            return _NOP
+        return (_exec_jalr, rd, rs1, imm)
+
+    return _NOP
@@ -0,0 +1,187 @@
+"""
+batch_comparison.py - Compare the emulators over a corpus of RISC-V programs
+
+EmulatorComparison.main() compares one hard-coded program pair. This runner
+takes a directory of RISC-V programs (every *.txt file in it) or a manifest
+file listing program paths, one per line, relative to the manifest. It
+shards the programs across a ProcessPoolExecutor. Each worker translates its
+program with translator.translate_program(), runs both emulators in
+lockstep on fresh paged memories (coordinated_step() from
+divergence_bisect.py) and compares the state fingerprints after every
+RISC-V instruction. The verdicts, step counts and timings of all programs
+are collected into one summary file.
+
+Verdicts: match, diverged (with the first diverging RISC-V step and PC),
+limit (max_instructions reached without a divergence) and error (the
+program is empty, has a line that does not parse, or could not be
+translated).
+
+Usage: python batch_comparison.py <directory|manifest> [workers] [summary_file]
+"""
+import contextlib
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# translator.py and bitty_encoder.py live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BittyEmulator import BittyEmulator
+from RISCV32EMEmulator import RISCV32EMEmulator
+from divergence_bisect import coordinated_step
+from log_writer import close_logs, write_log
+from shared_memory import generate_shared_memory
+from translator import translate_program
+from verbosity import QUIET
+
+MEMORY_SIZE = 1024
+MEMORY_SEED = 42
+
+
+def find_programs(source):
+    """Program paths from a directory (*.txt, sorted) or a manifest file."""
+    if os.path.isdir(source):
+        return [os.path.join(source, name) for name in sorted(os.listdir(source)) if name.endswith(".txt")]
+    base = os.path.dirname(source)
+    programs = []
+    with open(source, "r") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                programs.append(os.path.join(base, line))
+    return programs
+
+
+def read_program(path):
+    """
+    Read RISC-V words like EmulatorComparison.load_instructions_from_file(),
+    but raise ValueError on a line that does not parse instead of skipping
+    it (which would shift every later PC) and on an empty program.
+    """
+    words = []
+    with open(path, "r") as f:
+        for number, line in enumerate(f, 1):
+            s = line.strip()
+            if not s or s.startswith("#"):
+                continue
+            try:
+                words.append(int(s.replace("_", ""), 0) & 0xFFFFFFFF)
+            except ValueError:
+                raise ValueError(f"line {number} does not parse: {s!r}") from None
+    if not words:
+        raise ValueError("no instructions")
+    return words
+
+
+def compare_program(path, max_instructions=1000, memory_size=MEMORY_SIZE, seed=MEMORY_SEED):
+    """
+    Translate one RISC-V program, run both emulators on it and compare them.
+
+    Runs in a worker process; everything it needs is created here and the
+    result is a plain dict.
+    """
+    result = {"program": path, "verdict": "error", "riscv_steps": 0, "bitty_steps": 0,
+              "divergence_step": None, "divergence_pc": None,
+              "translate_seconds": 0.0, "run_seconds": 0.0, "error": None}
+    start = time.perf_counter()
+    try:
+        words = read_program(path)
+        binary, _, pc_map = translate_program(words)
+        result["translate_seconds"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        # the emulators print while they are constructed
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            riscv = RISCV32EMEmulator(memory_array=generate_shared_memory(memory_size, seed, paged=True),
+                                      verbosity=QUIET)
+            bitty = BittyEmulator(data_memory_size=memory_size,
+                                  memory=generate_shared_memory(memory_size, seed, paged=True), verbosity=QUIET)
+    except Exception as e:     # one bad program must not stop the batch
+        result["error"] = repr(e)
+        return result
+
+    map_pc = [pc_map[riscv_pc] for riscv_pc in range(len(words))]
+    riscv.instruction_array = words
+    riscv.pc = 0
+    bitty.instruction_array = list(binary)
+
+    verdict = "match"
+    steps = bitty_steps = 0
+    while 0 <= riscv.pc < len(words):
+        if steps >= max_instructions:
+            verdict = "limit"
+            break
+        riscv_pc = riscv.pc
+        bitty_steps += coordinated_step(riscv, bitty, map_pc)
+        steps += 1
+        if riscv.fingerprint() != bitty.fingerprint():
+            verdict = "diverged"
+            result["divergence_step"] = steps
+            result["divergence_pc"] = riscv_pc
+            break
+
+    result.update(verdict=verdict, riscv_steps=steps, bitty_steps=bitty_steps,
+                  run_seconds=time.perf_counter() - start)
+    return result
+
+
+def run_batch(programs, workers=None, max_instructions=1000):
+    """
+    Compare every program on a process pool.
+
+    Returns:
+        List of compare_program() results, in the order of `programs`
+    """
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(programs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(compare_program, programs, [max_instructions] * len(programs),
+                                 chunksize=chunksize))
+
+
+def write_summary(results, filename, workers, elapsed):
+    write_log("=== Batch Emulator Comparison ===", filename, mode="w")
+    write_log(f"Programs: {len(results)}, workers: {workers}, wall time: {elapsed:.2f}s", filename)
+    write_log("", filename)
+    write_log(f"{'Program':<40}{'Verdict':<10}{'RV steps':>10}{'Bitty steps':>13}{'Diverged at':>13}"
+              f"{'Translate ms':>14}{'Run ms':>10}", filename)
+    write_log("-" * 110, filename)
+    counts = {}
+    for result in results:
+        counts[result["verdict"]] = counts.get(result["verdict"], 0) + 1
+        diverged = ""
+        if result["verdict"] == "diverged":
+            diverged = f"{result['divergence_step']}@{result['divergence_pc']}"
+        write_log(f"{result['program']:<40}{result['verdict']:<10}{result['riscv_steps']:>10}"
+                  f"{result['bitty_steps']:>13}{diverged:>13}{result['translate_seconds'] * 1000:>14.2f}"
+                  f"{result['run_seconds'] * 1000:>10.2f}", filename)
+        if result["error"]:
+            write_log(f"    error: {result['error']}", filename)
+    write_log("", filename)
+    write_log("Verdicts: " + ", ".join(f"{verdict} {count}" for verdict, count in sorted(counts.items())), filename)
+    write_log(f"RISC-V steps: {sum(r['riscv_steps'] for r in results)}, "
+              f"Bitty steps: {sum(r['bitty_steps'] for r in results)}", filename)
+    write_log(f"Worker time: {sum(r['translate_seconds'] + r['run_seconds'] for r in results):.2f}s", filename)
+    close_logs()
+    return counts
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__.strip().splitlines()[-1])
+        return 1
+    programs = find_programs(sys.argv[1])
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    summary_file = sys.argv[3] if len(sys.argv) > 3 else "batch_summary.txt"
+
+    start = time.perf_counter()
+    results = run_batch(programs, workers)
+    counts = write_summary(results, summary_file, workers, time.perf_counter() - start)
+    print(f"{len(results)} programs: " + ", ".join(f"{verdict} {count}" for verdict, count in sorted(counts.items())))
+    print(f"Summary saved to '{summary_file}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+binary_trace.py - Fixed-width binary execution trace for the emulator comparison
+
+The text trace of EmulatorComparison.run_riscv() and run_bitty_to_pc() is
+large and slow to write and parse. A binary trace file is a 32-byte header
+followed by one 32-byte little-endian record per executed instruction:
+
+    step         uint32   per-ISA step number
+    pc           uint32   PC of the instruction
+    instruction  uint32   instruction word
+    reg_value    uint32   new value of the changed register
+    mem_address  uint32   word address written by a store
+    mem_value    uint32   word stored there
+    isa          uint8    ISA_RISCV or ISA_BITTY
+    reg          uint8    index of the changed register, NO_REGISTER if none
+    mem_written  uint8    1 if the instruction stored to memory
+    (5 bytes padding)
+
+The records form a NumPy structured array (record_dtype()), so TraceReader can
+memory-map a trace of millions of steps and query it column by column
+without reading it into memory.
+"""
+import mmap
+import struct
+from collections import namedtuple
+
+from BittyEmulator import _exec_store, decode_instruction
+from RISCV32EMEmulator import _exec_sb, _exec_sh, _exec_sw, predecode_instruction
+
+ISA_RISCV = 0
+ISA_BITTY = 1
+NO_REGISTER = 0xFF
+
+MAGIC = b"BTTRACE1"
+HEADER = struct.Struct("<8sI20x")
+RECORD = struct.Struct("<IIIIIIBBB5x")
+
+# NumPy description of RECORD, for numpy.memmap / numpy.frombuffer
+RECORD_FIELDS = (("step", "<u4"), ("pc", "<u4"), ("instruction", "<u4"), ("reg_value", "<u4"),
+                 ("mem_address", "<u4"), ("mem_value", "<u4"),
+                 ("isa", "u1"), ("reg", "u1"), ("mem_written", "u1"), ("_pad", "V5"))
+
+TraceRecord = namedtuple("TraceRecord", "step pc instruction reg_value mem_address mem_value isa reg mem_written")
+
+BUFFER_RECORDS = 1 << 15        # records buffered before a write
+
+# RISC-V stores write only when the address is in range and aligned
+_RISCV_STORE_ALIGNMENT = {_exec_sb: 1, _exec_sh: 2, _exec_sw: 4}
+
+
+def record_dtype():
+    """The numpy.dtype of one record (imports NumPy)."""
+    import numpy as np
+    return np.dtype(list(RECORD_FIELDS))
+
+
+def _changed_register(before, after):
+    for index, value in enumerate(after):
+        if value != before[index]:
+            return index, value & 0xFFFFFFFF
+    return NO_REGISTER, 0
+
+
+class TraceWriter:
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, "wb")
+        self._file.write(HEADER.pack(MAGIC, RECORD.size))
+        self._buffer = bytearray()
+        self.steps = [0, 0]     # next step number per ISA
+        self.count = 0
+
+    def record(self, isa, pc, instruction, reg=NO_REGISTER, reg_value=0, mem_address=None, mem_value=0):
+        """Append one record; the step number is assigned per ISA."""
+        step = self.steps[isa]
+        self.steps[isa] = step + 1
+        written = mem_address is not None
+        self._buffer += RECORD.pack(step, pc & 0xFFFFFFFF, instruction & 0xFFFFFFFF, reg_value,
+                                    mem_address & 0xFFFFFFFF if written else 0, mem_value & 0xFFFFFFFF,
+                                    isa, reg, written)
+        self.count += 1
+        if len(self._buffer) >= BUFFER_RECORDS * RECORD.size:
+            self.flush()
+
+    def riscv_step(self, riscv, instruction):
+        """Execute one instruction on `riscv` (at riscv.pc), record it and return the next PC."""
+        pc = riscv.pc
+        before = riscv.registers[:]
+        handler, rs1, _, imm = predecode_instruction(instruction)
+        alignment = _RISCV_STORE_ALIGNMENT.get(handler)
+        address = None
+        if alignment:
+            address = (riscv.registers[rs1] + imm) & 0xFFFFFFFF
+            if address >= len(riscv.memory_array) or address % alignment:
+                address = None
+        next_pc = riscv.decode_and_execute(instruction)
+        reg, reg_value = _changed_register(before, riscv.registers)
+        self.record(ISA_RISCV, pc, instruction, reg, reg_value,
+                    address, riscv.memory_array[address] if address is not None else 0)
+        return next_pc
+
+    def bitty_step(self, bitty, instruction):
+        """Execute one instruction on `bitty` (at bitty.pc), record it and return the next PC."""
+        pc = bitty.pc
+        before = bitty.registers[:]
+        handler, _, ry = decode_instruction(instruction & 0xFFFF)
+        address = None
+        if handler is _exec_store and 0 <= bitty.registers[ry] < len(bitty.data_memory):
+            address = bitty.registers[ry]
+        next_pc = bitty.evaluate(instruction)
+        reg, reg_value = _changed_register(before, bitty.registers)
+        self.record(ISA_BITTY, pc, instruction, reg, reg_value,
+                    address, bitty.data_memory[address] if address is not None else 0)
+        return next_pc
+
+    def flush(self):
+        self._file.write(self._buffer)
+        self._buffer = bytearray()
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class TraceReader:
+    """
+    Memory-mapped view of a trace file.
+
+    Records are read on demand: indexing returns a TraceRecord, columns()
+    returns a numpy.memmap structured array and where() the indices of the
+    records matching some column values.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, record_size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"{filename} is not a binary trace file")
+        self._length = (len(self._map) - HEADER.size) // RECORD.size
+        self._columns = None
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("trace record index out of range")
+        return TraceRecord(*RECORD.unpack_from(self._map, HEADER.size + index * RECORD.size))
+
+    def __iter__(self):
+        for offset in range(HEADER.size, HEADER.size + self._length * RECORD.size, RECORD.size):
+            yield TraceRecord(*RECORD.unpack_from(self._map, offset))
+
+    def columns(self):
+        """All records as a read-only numpy.memmap with RECORD_FIELDS columns."""
+        if self._columns is None:
+            import numpy as np
+            if not self._length:    # numpy.memmap cannot map an empty range
+                return np.empty(0, dtype=record_dtype())
+            self._columns = np.memmap(self.filename, dtype=record_dtype(), mode="r",
+                                      offset=HEADER.size, shape=(self._length,))
+        return self._columns
+
+    def where(self, **conditions):
+        """
+        Indices of the records whose columns equal the given values.
+
+        Example: reader.where(isa=ISA_BITTY, mem_written=1, mem_address=0x40)
+        """
+        import numpy as np
+        columns = self.columns()
+        mask = np.ones(self._length, dtype=bool)
+        for name, value in conditions.items():
+            mask &= columns[name] == value
+        return np.flatnonzero(mask)
+
+    def close(self):
+        self._columns = None
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
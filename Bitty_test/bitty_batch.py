@@ -0,0 +1,246 @@
+"""
+bitty_batch.py - Lockstep execution of many Bitty machines with NumPy
+
+BittyBatch runs one Bitty program on N machines at once, for differential
+fuzzing from many initial register and memory states. The machine state is
+held in arrays:
+
+    registers   (N, 16) uint32
+    d_out       (N,)    uint32
+    pc          (N,)    int64
+    memory      (N, M)  uint32
+
+Every step executes one instruction on every running machine (0 <= pc <
+len(program)). Machines are grouped by PC and each group executes its
+instruction as one vector operation, so machines that stay in lockstep cost
+one NumPy call per instruction however many there are. `registers` is a view
+of a register-major (16, N) array, so that each register is one contiguous
+vector.
+
+The program is decoded with BittyEmulator.decode_instruction() and every
+decode-table handler has a vector counterpart here with the same semantics
+as BittyEmulator.evaluate() with tracing off.
+"""
+import numpy as np
+
+from BittyEmulator import (_ALU_IMM, _ALU_REG, _exec_alu_unknown, _exec_branch, _exec_get_pc,
+                           _exec_load, _exec_nop, _exec_set_pc, _exec_store, decode_instruction)
+
+
+def _signed(values):
+    return values.view(np.int32)
+
+
+def _compare(a, b):
+    """d_out of a compare: 0 if equal, 1 if a > b, 2 if a < b."""
+    return np.where(a == b, 0, np.where(a > b, 1, 2)).astype(np.uint32)
+
+
+# ---------------------------------------------------------------------------
+# Vector handlers: handler(batch, rows, pc, a, b) executes the instruction at
+# `pc` on the machines `rows` (an index array, or slice(None) for all of them)
+# and sets their next PC.
+# ---------------------------------------------------------------------------
+
+def _vec_nop(batch, rows, pc, a, b):
+    batch.pc[rows] = pc + 1
+
+
+def _alu(operation):
+    def handler(batch, rows, pc, rx, ry):
+        regs = batch._registers
+        result = operation(regs[rx][rows], regs[ry][rows])
+        regs[rx][rows] = result
+        batch.d_out[rows] = result
+        batch.pc[rows] = pc + 1
+    return handler
+
+
+def _alu_imm(operation):
+    def handler(batch, rows, pc, rx, imm):
+        regs = batch._registers
+        result = operation(regs[rx][rows], np.uint32(imm & 0xFFFFFFFF))
+        regs[rx][rows] = result
+        batch.d_out[rows] = result
+        batch.pc[rows] = pc + 1
+    return handler
+
+
+def _shift_right_arith(value, shift):
+    return (_signed(value) >> (shift & np.uint32(0x1F)).astype(np.int32)).view(np.uint32)
+
+
+_VEC_ALU = (
+    lambda a, b: a + b,
+    lambda a, b: a - b,
+    lambda a, b: a & b,
+    lambda a, b: a | b,
+    lambda a, b: a ^ b,
+    lambda a, b: a << (b & np.uint32(0x1F)),
+    lambda a, b: a >> (b & np.uint32(0x1F)),
+    None,   # ucmp
+    _shift_right_arith,
+    None,   # scmp
+)
+
+
+def _vec_ucmp_r(batch, rows, pc, rx, ry):
+    regs = batch._registers
+    batch.d_out[rows] = _compare(regs[rx][rows], regs[ry][rows])
+    batch.pc[rows] = pc + 1
+
+
+def _vec_scmp_r(batch, rows, pc, rx, ry):
+    regs = batch._registers
+    batch.d_out[rows] = _compare(_signed(regs[rx][rows]), _signed(regs[ry][rows]))
+    batch.pc[rows] = pc + 1
+
+
+def _vec_ucmp_i(batch, rows, pc, rx, imm):
+    # the register is unsigned and the immediate sign-extended, as in _exec_ucmp_i
+    batch.d_out[rows] = _compare(batch._registers[rx][rows].astype(np.int64), imm)
+    batch.pc[rows] = pc + 1
+
+
+def _vec_scmp_i(batch, rows, pc, rx, imm):
+    batch.d_out[rows] = _compare(_signed(batch._registers[rx][rows]), imm)
+    batch.pc[rows] = pc + 1
+
+
+def _vec_alu_unknown(batch, rows, pc, rx, b):
+    batch.d_out[rows] = 0
+    batch.pc[rows] = pc + 1
+
+
+def _vec_branch(batch, rows, pc, branch_cond, offset):
+    batch.pc[rows] = np.where(batch.d_out[rows] == branch_cond, pc + offset, pc + 1)
+
+
+def _vec_get_pc(batch, rows, pc, rx, b):
+    batch._registers[rx][rows] = (pc + 1) & 0xFFFFFFFF
+    batch.pc[rows] = pc + 1
+
+
+def _vec_set_pc(batch, rows, pc, rx, b):
+    batch.pc[rows] = batch._registers[rx][rows]
+
+
+def _vec_load(batch, rows, pc, rx, ry):
+    regs = batch._registers
+    batch.pc[rows] = pc + 1
+    if isinstance(rows, slice):
+        rows = batch._machines
+    addresses = regs[ry][rows]
+    valid = addresses < batch.memory.shape[1]
+    rows_in_range = rows[valid]
+    regs[rx][rows_in_range] = batch.memory[rows_in_range, addresses[valid]]
+
+
+def _vec_store(batch, rows, pc, rx, ry):
+    regs = batch._registers
+    batch.pc[rows] = pc + 1
+    if isinstance(rows, slice):
+        rows = batch._machines
+    addresses = regs[ry][rows]
+    valid = addresses < batch.memory.shape[1]
+    rows_in_range = rows[valid]
+    batch.memory[rows_in_range, addresses[valid]] = regs[rx][rows_in_range]
+
+
+_VECTOR_HANDLERS = {
+    _exec_nop: _vec_nop,
+    _exec_alu_unknown: _vec_alu_unknown,
+    _exec_branch: _vec_branch,
+    _exec_get_pc: _vec_get_pc,
+    _exec_set_pc: _vec_set_pc,
+    _exec_load: _vec_load,
+    _exec_store: _vec_store,
+}
+for _alu_sel, (_reg_handler, _imm_handler) in enumerate(zip(_ALU_REG, _ALU_IMM)):
+    if _alu_sel == 0x7:
+        _VECTOR_HANDLERS[_reg_handler], _VECTOR_HANDLERS[_imm_handler] = _vec_ucmp_r, _vec_ucmp_i
+    elif _alu_sel == 0x9:
+        _VECTOR_HANDLERS[_reg_handler], _VECTOR_HANDLERS[_imm_handler] = _vec_scmp_r, _vec_scmp_i
+    else:
+        _VECTOR_HANDLERS[_reg_handler] = _alu(_VEC_ALU[_alu_sel])
+        _VECTOR_HANDLERS[_imm_handler] = _alu_imm(_VEC_ALU[_alu_sel])
+
+
+class BittyBatch:
+    def __init__(self, program, registers, memory, pc=0, d_out=0):
+        """
+        Args:
+            program: List of 16-bit Bitty instructions, shared by all machines
+            registers: (N, 16) initial register values
+            memory: (N, M) initial data memory words
+            pc: Initial PC, a scalar or one per machine
+            d_out: Initial d_out, a scalar or one per machine
+        """
+        registers = np.asarray(registers, dtype=np.uint32)
+        self.memory = np.array(memory, dtype=np.uint32)
+        if registers.ndim != 2 or registers.shape[1] != 16:
+            raise ValueError("registers must have shape (N, 16)")
+        machines = registers.shape[0]
+        if self.memory.ndim != 2 or self.memory.shape[0] != machines:
+            raise ValueError("memory must have shape (N, M)")
+        self._registers = np.ascontiguousarray(registers.T)
+        self.registers = self._registers.T
+        self._machines = np.arange(machines)
+        self.pc = np.zeros(machines, dtype=np.int64) + np.asarray(pc, dtype=np.int64)
+        self.d_out = np.zeros(machines, dtype=np.uint32) + np.asarray(d_out, dtype=np.uint32)
+        self.executed = np.zeros(machines, dtype=np.int64)
+        self.program = list(program)
+        self._decoded = []
+        for instruction in self.program:
+            handler, a, b = decode_instruction(instruction & 0xFFFF)
+            self._decoded.append((_VECTOR_HANDLERS[handler], a, b))
+
+    def __len__(self):
+        return self.registers.shape[0]
+
+    def running(self):
+        """Indices of the machines whose PC is inside the program."""
+        return np.flatnonzero((self.pc >= 0) & (self.pc < len(self.program)))
+
+    def step(self):
+        """Execute one instruction on every running machine; return how many ran."""
+        inside = (self.pc >= 0) & (self.pc < len(self.program))
+        if inside.all():
+            rows = slice(None)
+            ran = len(self)
+        else:
+            rows = np.flatnonzero(inside)
+            ran = rows.size
+            if not ran:
+                return 0
+        pcs = self.pc[rows]
+        first = pcs[0]
+        if (pcs == first).all():
+            handler, a, b = self._decoded[first]
+            handler(self, rows, int(first), a, b)
+        else:
+            order = np.argsort(pcs, kind="stable")
+            pcs = pcs[order]
+            starts = np.flatnonzero(pcs[1:] != pcs[:-1]) + 1
+            machines = self._machines[rows][order]
+            for pc, group in zip(pcs[np.r_[0, starts]].tolist(), np.split(machines, starts)):
+                handler, a, b = self._decoded[pc]
+                handler(self, group, pc, a, b)
+        self.executed[rows] += 1
+        return ran
+
+    def run(self, max_instructions=10000):
+        """
+        Step until every machine has left the program or executed
+        max_instructions instructions, like BittyEmulator.run_program().
+
+        Returns:
+            Total number of machine-instructions executed
+        """
+        total = 0
+        for _ in range(max_instructions):
+            ran = self.step()
+            if not ran:
+                break
+            total += ran
+        return total
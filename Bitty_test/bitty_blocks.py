@@ -0,0 +1,137 @@
+"""
+bitty_blocks.py - Basic-block compiler for the Bitty emulator
+
+A block is a straight-line run of instructions starting at some PC and ending
+at the first conditional branch or stpc (inclusive), at the end of the
+program, or after MAX_BLOCK_LENGTH instructions. Each block is compiled into
+one Python function that keeps the registers it touches in local variables:
+
+    next_pc = block(emulator)
+
+The generated code has the same semantics as BittyEmulator.evaluate() with
+tracing off.
+"""
+
+MAX_BLOCK_LENGTH = 256
+
+MASK = "0xFFFFFFFF"
+
+
+def _signed(operand):
+    """Expression for the signed 32-bit view of a register local."""
+    return f"({operand} if {operand} < 0x80000000 else {operand} - 0x100000000)"
+
+
+def _alu_lines(alu_sel, rx, in_b, from_register):
+    """Statements for one ALU instruction; in_b is a register local or a constant."""
+    r = f"r{rx}"
+    if alu_sel == 0x0:
+        return [f"{r} = d = ({r} + {in_b}) & {MASK}"]
+    if alu_sel == 0x1:
+        return [f"{r} = d = ({r} - {in_b}) & {MASK}"]
+    if alu_sel == 0x2:
+        return [f"{r} = d = ({r} & {in_b}) & {MASK}"]
+    if alu_sel == 0x3:
+        return [f"{r} = d = ({r} | {in_b}) & {MASK}"]
+    if alu_sel == 0x4:
+        return [f"{r} = d = ({r} ^ {in_b}) & {MASK}"]
+    if alu_sel in (0x5, 0x6, 0x8):
+        shift = f"({in_b} & 0x1F)" if from_register else str(in_b & 0x1F)
+        if alu_sel == 0x5:
+            return [f"{r} = d = ({r} << {shift}) & {MASK}"]
+        if alu_sel == 0x6:
+            return [f"{r} = d = ({r} >> {shift}) & {MASK}"]
+        return [f"{r} = d = ({_signed(r)} >> {shift}) & {MASK}"]
+    if alu_sel == 0x7:
+        return [f"d = 0 if {r} == {in_b} else (1 if {r} > {in_b} else 2)"]
+    if alu_sel == 0x9:
+        # a register operand is compared as signed, an immediate as-is
+        b = _signed(in_b) if from_register else in_b
+        return [f"a = {_signed(r)}",
+                f"b = {b}",
+                "d = 0 if a == b else (1 if a > b else 2)"]
+    return ["d = 0"]
+
+
+def compile_block(program, start):
+    """
+    Compile the block of `program` that starts at `start`.
+
+    Args:
+        program: List of 16-bit Bitty instructions (instruction_array)
+        start: PC of the first instruction of the block
+
+    Returns:
+        Tuple of (function, number of instructions in the block)
+    """
+    body = []
+    used = set()
+    written = set()
+    end = min(len(program), start + MAX_BLOCK_LENGTH)
+    pc = start
+    exit_line = None
+
+    while pc < end:
+        instruction = program[pc] & 0xFFFF
+        format_code = instruction & 0x0003
+        rx = (instruction >> 12) & 0xF
+        ry = (instruction >> 8) & 0xF
+        alu_sel = (instruction >> 2) & 0xF
+
+        if format_code == 0 or format_code == 1:
+            if format_code == 0:
+                used.add(ry)
+                in_b = f"r{ry}"
+            else:
+                in_b = (instruction & 0x0FC0) >> 6
+                if in_b & (1 << 5):
+                    in_b = in_b - (1 << 6)
+            used.add(rx)
+            if alu_sel <= 0x9 and alu_sel not in (0x7, 0x9):
+                written.add(rx)
+            body.extend(_alu_lines(alu_sel, rx, in_b, format_code == 0))
+        elif format_code == 2:
+            branch_cond = (instruction >> 2) & 0x3
+            if branch_cond < 3:
+                raw_imm = (instruction >> 4) & 0xFFF
+                if raw_imm & 0x800:
+                    raw_imm -= 0x1000
+                target = pc + (raw_imm >> 1)
+                exit_line = f"return {target} if d == {branch_cond} else {pc + 1}"
+                pc += 1
+                break
+            if (instruction >> 4) & 0x1 == 1:  # gtpc
+                used.add(rx)
+                written.add(rx)
+                body.append(f"r{rx} = {(pc + 1) & 0xFFFFFFFF}")
+            else:  # stpc
+                used.add(rx)
+                exit_line = f"return r{rx}"
+                pc += 1
+                break
+        else:
+            used.update((rx, ry))
+            if instruction & 0x0004:  # store
+                body.append(f"if 0 <= r{ry} < mem_len: mem[r{ry}] = r{rx} & {MASK}")
+            else:  # load
+                written.add(rx)
+                body.append(f"if 0 <= r{ry} < mem_len: r{rx} = mem[r{ry}] & {MASK}")
+        pc += 1
+
+    if exit_line is None:
+        exit_line = f"return {pc}"
+
+    lines = ["def block(emu):",
+             "    regs = emu.registers",
+             "    mem = emu.data_memory",
+             "    mem_len = len(mem)",
+             "    d = emu.d_out"]
+    lines += [f"    r{i} = regs[{i}]" for i in sorted(used)]
+    lines += [f"    {line}" for line in body]
+    lines += [f"    regs[{i}] = r{i}" for i in sorted(written)]
+    lines += ["    emu.d_out = d",
+              f"    {exit_line}"]
+
+    namespace = {}
+    exec(compile("\n".join(lines), f"<bitty block @{start}>", "exec"), namespace)
+    return namespace["block"], pc - start
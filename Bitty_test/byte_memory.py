@@ -0,0 +1,298 @@
+"""
+byte_memory.py - Compact and sparse memory models for the emulators
+
+ByteMemory stores 32-bit words in one contiguous buffer (array('I'), four
+bytes per word) instead of a list of Python ints (~36 bytes per word). It is
+a drop-in replacement for the word-indexed memory lists used by
+RISCV32EMEmulator and BittyEmulator. Indexing, assignment, len(), slicing,
+iteration and copy.deepcopy() behave like they do on the lists.
+
+PagedMemory is a sparse alternative for programs that use addresses across
+the whole 32-bit range (stack, heap) without wrapping or aliasing. It also
+maintains a fingerprint of its contents on every store (see mix_word()) and
+the set of pages stored to, so differing_addresses() only visits those.
+"""
+from array import array
+
+
+class ByteMemory(array):
+    def __new__(cls, words=0):
+        """
+        Args:
+            words: Number of zeroed words, or an iterable of 32-bit word values
+        """
+        if isinstance(words, int):
+            return super().__new__(cls, "I", bytes(4 * words))
+        return super().__new__(cls, "I", words)
+
+    def __copy__(self):
+        return ByteMemory(self)
+
+    def __deepcopy__(self, memo):
+        return ByteMemory(self)
+
+    def __reduce__(self):
+        return ByteMemory, (self.tolist(),)
+
+    @property
+    def nbytes(self):
+        return len(self) * self.itemsize
+
+
+_M64 = 0xFFFFFFFFFFFFFFFF
+
+
+def mix_word(address, value):
+    """
+    64-bit mix of one (address, word) pair, 0 for a zero word.
+
+    A memory fingerprint is the XOR of mix_word() over all addresses, so a
+    store updates it with fingerprint ^= mix_word(a, old) ^ mix_word(a, new)
+    and untouched (zero) memory contributes nothing.
+    """
+    if not value:
+        return 0
+    x = (((address & 0xFFFFFFFF) << 32) | (value & 0xFFFFFFFF)) + 0x9E3779B97F4A7C15
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _M64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _M64
+    return x ^ (x >> 31)
+
+
+def memory_fingerprint(memory):
+    """XOR of mix_word() over a memory; O(1) for PagedMemory, O(len) otherwise."""
+    if isinstance(memory, PagedMemory):
+        return memory.fingerprint
+    fingerprint = 0
+    for address, value in enumerate(memory):
+        if value:
+            fingerprint ^= mix_word(address, value)
+    return fingerprint
+
+
+PAGE_SHIFT = 10                 # 1024 words = 4 KiB per page
+PAGE_WORDS = 1 << PAGE_SHIFT
+PAGE_MASK = PAGE_WORDS - 1
+
+
+class PagedMemory:
+    """
+    Sparse word-indexed memory covering the full 32-bit address space.
+
+    Pages of PAGE_WORDS words (ByteMemory, 4 KiB) are allocated on the first
+    store into them; loads from untouched pages read 0 without allocating.
+    len() is 2**32, so the emulators' range checks and modulo wrapping never
+    trigger and every address refers to its own word. The most recently used
+    page is cached so that consecutive accesses skip the dict lookup.
+
+    snapshot() shares pages copy-on-write: a page is copied the first time it
+    is stored to after a snapshot, so snapshots and restore() cost time and
+    memory in proportion to the pages that change.
+
+    `fingerprint` is the XOR of mix_word() over all words, updated on every
+    store. dirty_pages() are the pages stored to since construction; the
+    initial `words` do not count.
+    """
+
+    def __init__(self, words=(), size=1 << 32):
+        """
+        Args:
+            words: Initial word values, stored from address 0
+            size: Number of addressable words
+        """
+        self._pages = {}
+        self._owned = set()     # pages not shared with any snapshot
+        self._size = size
+        self.fingerprint = 0
+        self._dirty = set()
+        self._reset_caches()
+        for address, value in enumerate(words):
+            self[address] = value
+        # memories built from the same words share an origin, so they can be
+        # compared through their dirty pages alone
+        self._origin = (size, self.fingerprint)
+        self._dirty = set()
+        self._reset_caches()
+
+    def _reset_caches(self):
+        self._last_number = None
+        self._last_page = None
+        self._write_number = None
+        self._write_page = None
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, address):
+        if isinstance(address, slice):
+            return [self[i] for i in range(*address.indices(self._size))]
+        # checked on every access: the last page can extend past the size
+        if not 0 <= address < self._size:
+            raise IndexError("memory address out of range")
+        number = address >> PAGE_SHIFT
+        if number == self._last_number:
+            return self._last_page[address & PAGE_MASK]
+        page = self._pages.get(number)
+        if page is None:
+            return 0
+        self._last_number = number
+        self._last_page = page
+        return page[address & PAGE_MASK]
+
+    def __setitem__(self, address, value):
+        if not 0 <= address < self._size:
+            raise IndexError("memory address out of range")
+        number = address >> PAGE_SHIFT
+        if number == self._write_number:
+            page = self._write_page
+            old = page[address & PAGE_MASK]
+            if old != value:
+                self.fingerprint ^= mix_word(address, old) ^ mix_word(address, value)
+                page[address & PAGE_MASK] = value
+            return
+        page = self._pages.get(number)
+        if number not in self._owned:
+            if page is None:
+                page = ByteMemory(PAGE_WORDS)
+            else:
+                page = ByteMemory(page)     # copy on write
+            self._pages[number] = page
+            self._owned.add(number)
+            if number == self._last_number:
+                self._last_page = page
+        self._dirty.add(number)
+        self._write_number = number
+        self._write_page = page
+        old = page[address & PAGE_MASK]
+        if old != value:
+            self.fingerprint ^= mix_word(address, old) ^ mix_word(address, value)
+            page[address & PAGE_MASK] = value
+
+    def snapshot(self):
+        """Return a PagedMemory holding the current contents; pages are shared, not copied."""
+        snapshot = PagedMemory(size=self._size)
+        snapshot._pages = dict(self._pages)
+        snapshot.fingerprint = self.fingerprint
+        snapshot._origin = self._origin
+        snapshot._dirty = set(self._dirty)
+        self._owned = set()
+        self._reset_caches()
+        return snapshot
+
+    def restore(self, snapshot):
+        """Make this memory's contents equal to `snapshot`, sharing its pages."""
+        self._pages = dict(snapshot._pages)
+        self._owned = set()
+        self._size = snapshot._size
+        self.fingerprint = snapshot.fingerprint
+        self._origin = snapshot._origin
+        self._dirty = set(snapshot._dirty)
+        self._reset_caches()
+        # the pages are now shared both ways, so stores through the snapshot
+        # must copy them too
+        snapshot._owned = set()
+        snapshot._reset_caches()
+
+    def pages(self):
+        """Return {page number: page} for the allocated pages."""
+        return self._pages
+
+    def dirty_pages(self):
+        """Return the numbers of the pages stored to since construction."""
+        return self._dirty
+
+    @property
+    def nbytes(self):
+        return len(self._pages) * PAGE_WORDS * 4
+
+
+def snapshot_memory(memory):
+    """
+    Capture the contents of an emulator memory.
+
+    PagedMemory is snapshotted copy-on-write; lists and ByteMemory are copied.
+    The result can be indexed like the memory itself and passed to
+    restore_memory().
+    """
+    if isinstance(memory, PagedMemory):
+        return memory.snapshot()
+    return memory[:]
+
+
+def restore_memory(memory, snapshot):
+    """Restore `memory` in place from snapshot_memory(), keeping the object shared by the emulators."""
+    if isinstance(memory, PagedMemory):
+        memory.restore(snapshot)
+    else:
+        memory[:] = snapshot
+
+
+_ZERO_PAGE = ByteMemory(PAGE_WORDS)
+
+_numpy_module = None
+
+
+def _numpy():
+    """NumPy if it is installed (imported on first use), otherwise None."""
+    global _numpy_module
+    if _numpy_module is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy_module = numpy
+    return _numpy_module or None
+
+
+def _word_vector(np, memory, end):
+    """The first `end` words of a list or ByteMemory as a uint32 array (no copy for ByteMemory)."""
+    if isinstance(memory, array) and memory.itemsize == 4:
+        return np.frombuffer(memory, dtype=np.uint32, count=end)
+    return (np.asarray(memory[:end], dtype=np.int64) & 0xFFFFFFFF).astype(np.uint32)
+
+
+def differing_addresses(first, second, end=None):
+    """
+    Ascending addresses below `end` where two memories hold different words.
+
+    For two PagedMemory objects that were built from the same words (or are
+    snapshots of one another) only their dirty pages are compared, and whole
+    pages are compared in C before any word is looked at. Other PagedMemory
+    pairs compare their allocated pages; any other memories are compared as a
+    whole. With NumPy installed the word comparisons are vectorized
+    (np.flatnonzero over uint32 views), otherwise they are Python loops.
+    """
+    if end is None:
+        end = min(len(first), len(second))
+    np = _numpy()
+    if not (isinstance(first, PagedMemory) and isinstance(second, PagedMemory)):
+        if np is not None:
+            try:
+                return np.flatnonzero(_word_vector(np, first, end) != _word_vector(np, second, end)).tolist()
+            except OverflowError:   # list words beyond 64 bits
+                pass
+        return [address for address in range(end)
+                if first[address] & 0xFFFFFFFF != second[address] & 0xFFFFFFFF]
+
+    if first._origin == second._origin:
+        numbers = first._dirty | second._dirty
+    else:
+        numbers = first._pages.keys() | second._pages.keys()
+    addresses = []
+    for number in sorted(numbers):
+        base = number << PAGE_SHIFT
+        if base >= end:
+            break
+        page_a = first._pages.get(number, _ZERO_PAGE)
+        page_b = second._pages.get(number, _ZERO_PAGE)
+        if page_a is page_b or page_a == page_b:
+            continue
+        count = min(PAGE_WORDS, end - base)
+        if np is not None:
+            offsets = np.flatnonzero(np.frombuffer(page_a, dtype=np.uint32, count=count)
+                                     != np.frombuffer(page_b, dtype=np.uint32, count=count))
+            addresses.extend((offsets + base).tolist())
+            continue
+        for offset in range(count):
+            if page_a[offset] != page_b[offset]:
+                addresses.append(base + offset)
+    return addresses
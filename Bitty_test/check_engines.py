@@ -0,0 +1,324 @@
+"""
+check_engines.py - Differential checks of the fast execution engines
+
+Every engine that does not go through the emulators' reference interpreters
+is run on random programs and initial states and compared with them:
+
+    Bitty   run_program() blocks (bitty_blocks.py), run_until() and
+            BittyBatch (bitty_batch.py) against BittyEmulator.evaluate()
+    RISC-V  run() from pre-decoded records, run(jit=True) superblocks
+            (riscv_superblocks.py) and RiscvBatch (riscv_batch.py) against
+            RISCV32EMEmulator.decode_and_execute()
+
+The references run with TRACE verbosity, i.e. through the original
+instruction decoders (their output is discarded). Registers, memory, PC,
+d_out and instruction counts must all agree. The batch checks need NumPy
+and are skipped without it.
+
+Usage: python check_engines.py [trials] [seed]
+"""
+import contextlib
+import io
+import random
+import sys
+
+from BittyEmulator import STOP_BREAKPOINT, BittyEmulator
+from RISCV32EMEmulator import RISCV32EMEmulator
+from verbosity import QUIET, TRACE
+
+TRIALS = 150
+MAX_INSTRUCTIONS = 300
+BITTY_MEMORY_WORDS = 32
+RISCV_MEMORY_WORDS = 48
+BATCH_MACHINES = 8
+
+
+# ---------------------------------------------------------------------------
+# Random programs and states
+# ---------------------------------------------------------------------------
+
+def random_bitty_program(rng, length):
+    """Random 16-bit words with extra branches, stpc and in-range memory operands."""
+    program = []
+    for pc in range(length):
+        kind = rng.random()
+        if kind < 0.08:     # branch to somewhere in (or just outside) the program
+            offset = rng.randint(-pc, length - pc) * 2
+            program.append(((offset & 0xFFF) << 4) | (rng.randrange(3) << 2) | 2)
+        elif kind < 0.10:   # stpc
+            program.append((rng.randrange(16) << 12) | (rng.randrange(2) << 4) | (3 << 2) | 2)
+        elif kind < 0.30:   # load/store through r0..r3, which hold small addresses
+            program.append((rng.getrandbits(16) & 0xF0FC) | (rng.randrange(4) << 8) | 3)
+        else:
+            word = rng.getrandbits(16)
+            if word & 3 == 2:   # keep the branch density above
+                word ^= 1
+            program.append(word)
+    return program
+
+
+def random_bitty_state(rng, memory_words):
+    registers = [rng.choice([i * 10, rng.getrandbits(32), rng.randrange(memory_words + 3), 0x80000000, 0xFFFFFFFF])
+                 for i in range(16)]
+    for address_register in range(4):
+        registers[address_register] = rng.randrange(memory_words + 3)
+    memory = [rng.getrandbits(32) for _ in range(memory_words)]
+    return registers, memory
+
+
+def _rtype(funct7, rs2, rs1, funct3, rd, opcode=0b0110011):
+    return (funct7 << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+
+def _itype(imm, rs1, funct3, rd, opcode):
+    return ((imm & 0xFFF) << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | opcode
+
+
+def _stype(imm, rs2, rs1, funct3):
+    imm &= 0xFFF
+    return ((imm >> 5) << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | ((imm & 0x1F) << 7) | 0b0100011
+
+
+def _btype(imm, rs2, rs1, funct3):
+    imm &= 0x1FFF
+    return ((((imm >> 12) & 1) << 31) | (((imm >> 5) & 0x3F) << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12)
+            | (((imm >> 1) & 0xF) << 8) | (((imm >> 11) & 1) << 7) | 0b1100011)
+
+
+def random_riscv_program(rng, length):
+    """Random RV32EM words: ALU, M extension, shifts, loads, stores, LUI/AUIPC, jumps and branches."""
+    def reg():
+        return rng.randrange(16)
+
+    program = []
+    for _ in range(length):
+        kind = rng.randrange(11)
+        if kind == 0:
+            funct7, funct3 = rng.choice([(0, 0), (0x20, 0), (0, 1), (0, 2), (0, 3), (0, 4), (0, 5), (0x20, 5),
+                                         (0, 6), (0, 7)])
+            program.append(_rtype(funct7, reg(), reg(), funct3, reg()))
+        elif kind == 1:
+            program.append(_rtype(1, reg(), reg(), rng.randrange(8), reg()))
+        elif kind == 2:
+            program.append(_itype(rng.randrange(0x1000), reg(), rng.choice([0, 2, 3, 4, 6, 7]), reg(), 0b0010011))
+        elif kind == 3:
+            shift = rng.choice([0, 0x400]) | rng.randrange(32)
+            program.append(_itype(shift, reg(), rng.choice([1, 5]), reg(), 0b0010011))
+        elif kind == 4:
+            program.append(_itype(rng.randrange(-40, 40), reg(), rng.choice([0, 1, 2, 4, 5]), reg(), 0b0000011))
+        elif kind == 5:
+            program.append(_stype(rng.randrange(-40, 40), reg(), reg(), rng.randrange(3)))
+        elif kind == 6:
+            program.append((rng.randrange(1 << 20) << 12) | (reg() << 7) | rng.choice([0b0110111, 0b0010111]))
+        elif kind == 7:
+            program.append(_itype(rng.randrange(0x1000), reg(), 0, reg(), 0b1100111))
+        elif kind == 8:
+            program.append((rng.getrandbits(20) << 12) | (reg() << 7) | 0b1101111)
+        else:
+            program.append(_itype(rng.randrange(0x1000), reg(), 0, reg(), 0b0010011))
+    for _ in range(length // 6):
+        source, target = rng.randrange(length), rng.randrange(length)
+        program[source] = _btype((target - source) * 4, reg(), reg(), rng.choice([0, 1, 4, 5, 6, 7]))
+    return program
+
+
+def random_riscv_state(rng, memory_words):
+    registers = [0] + [rng.choice([rng.getrandbits(32), rng.randrange(memory_words + 12), 0x80000000, 0xFFFFFFFF,
+                                   0, 1]) for _ in range(15)]
+    memory = [rng.getrandbits(32) for _ in range(memory_words)]
+    return registers, memory
+
+
+# ---------------------------------------------------------------------------
+# Reference runs
+# ---------------------------------------------------------------------------
+
+def _quietly(function, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return function(*args)
+
+
+def _bitty(program, registers, memory, verbosity):
+    emulator = _quietly(BittyEmulator, len(memory), list(memory), verbosity)
+    emulator.registers = list(registers)
+    emulator.instruction_array = list(program)
+    return emulator
+
+
+def _riscv(program, registers, memory, verbosity):
+    emulator = _quietly(RISCV32EMEmulator, list(memory), verbosity)
+    emulator.registers = list(registers)
+    emulator.instruction_array = list(program)
+    emulator.pc = 0
+    return emulator
+
+
+def _bitty_state(emulator, executed):
+    return ([value & 0xFFFFFFFF for value in emulator.registers], emulator.d_out & 0xFFFFFFFF, emulator.pc,
+            list(emulator.data_memory), executed)
+
+
+def _riscv_state(emulator, executed):
+    return ([value & 0xFFFFFFFF for value in emulator.registers], emulator.pc, list(emulator.memory_array), executed)
+
+
+def step_bitty(emulator, max_instructions):
+    """Step from the current PC through evaluate() until the program ends; return the instruction count."""
+    program = emulator.instruction_array
+    executed = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        while 0 <= emulator.pc < len(program) and executed < max_instructions:
+            emulator.pc = emulator.evaluate(program[emulator.pc])
+            executed += 1
+    return executed
+
+
+def step_riscv(emulator, max_instructions):
+    """Step from the current PC through decode_and_execute() until the program ends; return the instruction count."""
+    program = emulator.instruction_array
+    executed = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        while 0 <= emulator.pc < len(program) and executed < max_instructions:
+            emulator.pc = emulator.decode_and_execute(emulator.fetch_instruction())
+            executed += 1
+    return executed
+
+
+# ---------------------------------------------------------------------------
+# Checks: each returns a list of mismatch descriptions
+# ---------------------------------------------------------------------------
+
+def check_bitty_blocks(rng, trials):
+    """run_program() twice (the second run uses compiled blocks) against evaluate()."""
+    mismatches = []
+    for trial in range(trials):
+        program = random_bitty_program(rng, rng.randrange(1, 80))
+        registers, memory = random_bitty_state(rng, BITTY_MEMORY_WORDS)
+        budget = rng.choice([1, 7, 50, MAX_INSTRUCTIONS])
+        reference = _bitty(program, registers, memory, TRACE)
+        emulator = _bitty(program, registers, memory, QUIET)
+        # run_program() restarts at PC 0 and keeps the registers and memory
+        for run in ("first", "second"):
+            reference.pc = 0
+            executed = step_bitty(reference, budget)
+            count = _quietly(emulator.run_program, budget)
+            if _bitty_state(emulator, count) != _bitty_state(reference, executed):
+                mismatches.append(f"trial {trial}: {run} run_program({budget})")
+                break
+    return mismatches
+
+
+def check_bitty_run_until(rng, trials):
+    """Repeated run_until() calls against evaluate() stepping with the same breakpoints."""
+    mismatches = []
+    for trial in range(trials):
+        program = random_bitty_program(rng, rng.randrange(1, 80))
+        registers, memory = random_bitty_state(rng, BITTY_MEMORY_WORDS)
+        breakpoints = set(rng.sample(range(len(program)), min(len(program), rng.randrange(4))))
+        reference = _bitty(program, registers, memory, TRACE)
+        emulator = _bitty(program, registers, memory, QUIET)
+        for call in range(6):
+            budget = rng.choice([5, 50, 500])
+            steps = 0
+            while steps < budget:
+                steps += step_bitty(reference, 1)
+                if reference.pc in breakpoints or not 0 <= reference.pc < len(program):
+                    break
+            reason, executed = emulator.run_until(breakpoints, budget)
+            if executed != steps or _bitty_state(emulator, 0) != _bitty_state(reference, 0) or \
+                    (reason == STOP_BREAKPOINT) != (0 <= reference.pc < len(program) and reference.pc in breakpoints):
+                mismatches.append(f"trial {trial}: run_until call {call}")
+                break
+            if not 0 <= reference.pc < len(program):
+                break
+    return mismatches
+
+
+def check_bitty_batch(rng, trials):
+    """BittyBatch on BATCH_MACHINES initial states against evaluate() on each of them."""
+    from bitty_batch import BittyBatch
+    mismatches = []
+    for trial in range(trials):
+        program = random_bitty_program(rng, rng.randrange(1, 40))
+        states = [random_bitty_state(rng, BITTY_MEMORY_WORDS) for _ in range(BATCH_MACHINES)]
+        batch = BittyBatch(program, [registers for registers, _ in states], [memory for _, memory in states])
+        batch.run(MAX_INSTRUCTIONS)
+        for machine, (registers, memory) in enumerate(states):
+            reference = _bitty(program, registers, memory, TRACE)
+            executed = step_bitty(reference, MAX_INSTRUCTIONS)
+            state = (batch.registers[machine].tolist(), int(batch.d_out[machine]), int(batch.pc[machine]),
+                     batch.memory[machine].tolist(), int(batch.executed[machine]))
+            if state != _bitty_state(reference, executed):
+                mismatches.append(f"trial {trial}: machine {machine}")
+    return mismatches
+
+
+def check_riscv_predecoded(rng, trials):
+    """run() from pre-decoded records and run(jit=True), each run twice, against decode_and_execute()."""
+    mismatches = []
+    for trial in range(trials):
+        program = random_riscv_program(rng, rng.randrange(5, 40))
+        registers, memory = random_riscv_state(rng, RISCV_MEMORY_WORDS)
+        budget = rng.choice([1, 5, 40, MAX_INSTRUCTIONS])
+        reference = _riscv(program, registers, memory, TRACE)
+        emulators = [(jit, _riscv(program, registers, memory, QUIET)) for jit in (False, True)]
+        # the second run starts again at PC 0 from the first run's state;
+        # superblocks are compiled once their entry PCs are hot
+        for run in ("first", "second"):
+            reference.pc = 0
+            expected = _riscv_state(reference, step_riscv(reference, budget))
+            for jit, emulator in emulators:
+                emulator.pc = 0
+                if _riscv_state(emulator, emulator.run(budget, jit=jit)) != expected:
+                    mismatches.append(f"trial {trial}: {run} run({budget}, jit={jit})")
+    return mismatches
+
+
+def check_riscv_batch(rng, trials):
+    """RiscvBatch on BATCH_MACHINES initial states against decode_and_execute() on each of them."""
+    from riscv_batch import RiscvBatch
+    mismatches = []
+    for trial in range(trials):
+        program = random_riscv_program(rng, rng.randrange(5, 40))
+        states = [random_riscv_state(rng, RISCV_MEMORY_WORDS) for _ in range(BATCH_MACHINES)]
+        batch = RiscvBatch(program, [registers for registers, _ in states], [memory for _, memory in states])
+        batch.run(MAX_INSTRUCTIONS)
+        for machine, (registers, memory) in enumerate(states):
+            reference = _riscv(program, registers, memory, TRACE)
+            executed = step_riscv(reference, MAX_INSTRUCTIONS)
+            state = (batch.registers[machine].tolist(), int(batch.pc[machine]), batch.memory[machine].tolist(),
+                     int(batch.executed[machine]))
+            if state != _riscv_state(reference, executed):
+                mismatches.append(f"trial {trial}: machine {machine}")
+    return mismatches
+
+
+CHECKS = [check_bitty_blocks, check_bitty_run_until, check_bitty_batch, check_riscv_predecoded, check_riscv_batch]
+NUMPY_CHECKS = (check_bitty_batch, check_riscv_batch)
+
+
+def main():
+    trials = int(sys.argv[1]) if len(sys.argv) > 1 else TRIALS
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    try:
+        import numpy  # noqa: F401
+        have_numpy = True
+    except ImportError:
+        have_numpy = False
+
+    failed = 0
+    for check in CHECKS:
+        if check in NUMPY_CHECKS and not have_numpy:
+            print(f"skip {check.__name__} (NumPy is not installed)")
+            continue
+        mismatches = check(random.Random(seed), trials)
+        if mismatches:
+            failed += 1
+            print(f"FAIL {check.__name__}: {len(mismatches)} mismatches, first: {mismatches[0]}")
+        else:
+            print(f"ok   {check.__name__}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
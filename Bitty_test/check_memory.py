@@ -0,0 +1,56 @@
+"""
+check_memory.py - Regression checks for the memory models in byte_memory.py
+
+Each check_* function raises AssertionError on a failure.
+
+Usage: python check_memory.py
+"""
+import sys
+
+from byte_memory import PagedMemory
+
+
+def check_restore_detaches_snapshot():
+    # a store through the snapshot after restore() must not reach the memory
+    memory = PagedMemory([0] * 10)
+    snapshot = memory.snapshot()
+    snapshot[5] = 1
+    memory.restore(snapshot)
+    snapshot[6] = 2
+    assert memory[5] == 1 and memory[6] == 0, "store through a restored snapshot changed the memory"
+    memory[7] = 3
+    assert snapshot[7] == 0, "store through the memory changed the snapshot"
+
+
+def check_range_inside_last_page():
+    # the size need not be a multiple of PAGE_WORDS; addresses past it are
+    # out of range even inside an allocated page
+    memory = PagedMemory([1, 2, 3], size=64)
+    for address in (64, 100, -1):
+        for access in (lambda: memory[address], lambda: memory.__setitem__(address, 5)):
+            try:
+                access()
+            except IndexError:
+                continue
+            raise AssertionError(f"address {address} of a 64-word memory did not raise IndexError")
+    assert memory[63] == 0 and memory[2] == 3
+
+
+CHECKS = [check_restore_detaches_snapshot, check_range_inside_last_page]
+
+
+def main():
+    failed = 0
+    for check in CHECKS:
+        try:
+            check()
+        except AssertionError as e:
+            failed += 1
+            print(f"FAIL {check.__name__}: {e}")
+        else:
+            print(f"ok   {check.__name__}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+divergence_bisect.py - Find the first RISC-V instruction where the emulators diverge
+
+EmulatorComparison.run_riscv() compares all registers and memory after every
+RISC-V instruction and logs each step. This mode runs both emulators quietly,
+compares their state fingerprints (emulator.fingerprint()) only every
+`checkpoint_interval` RISC-V instructions and keeps a snapshot of the last
+checkpoint that matched. When a checkpoint mismatches it replays from that
+snapshot, bisecting on the number of steps, to find the first step whose
+state differs. It then logs the full register/memory diff for that step only.
+
+The bisection assumes that once the two machines diverge they stay diverged.
+
+Usage: python divergence_bisect.py [checkpoint_interval]
+"""
+import sys
+
+from BittyEmulator import BittyEmulator
+from EmulatorComparison import (compare_memory, compare_registers, load_instructions_from_file,
+                                read_ints_from_file, write_to_file)
+from log_writer import close_logs
+from pc_index import PcIndex
+from RISCV32EMEmulator import RISCV32EMEmulator
+from shared_memory import generate_shared_memory
+from verbosity import QUIET
+
+
+def coordinated_step(riscv, bitty, map_pc, max_bitty_steps=1000):
+    """
+    Execute one RISC-V instruction, then run Bitty to the mapped PC.
+
+    When the new RISC-V PC has no mapping (the program has finished), Bitty
+    runs until it leaves its own program.
+    """
+    riscv.pc = riscv.decode_and_execute(riscv.fetch_instruction())
+    target_pc = map_pc[riscv.pc] if riscv.pc < len(map_pc) else None
+    program = bitty.instruction_array
+    count = 0
+    while count < max_bitty_steps and 0 <= bitty.pc < len(program) and bitty.pc != target_pc:
+        bitty.pc = bitty.evaluate(program[bitty.pc])
+        count += 1
+    return count
+
+
+def states_match(riscv, bitty):
+    return riscv.fingerprint() == bitty.fingerprint()
+
+
+def find_divergence(riscv, bitty, map_pc, index, max_instructions=1000, checkpoint_interval=64):
+    """
+    Run both emulators until they diverge or the RISC-V program ends.
+
+    Args:
+        riscv, bitty: Emulators with their programs and memories loaded
+        map_pc: RISC-V PC -> Bitty PC mapping (pc_map_output.txt)
+        index: PcIndex of the same mapping, for the reported "bitty_range"
+        max_instructions: RISC-V instruction budget
+        checkpoint_interval: RISC-V instructions between fingerprint checks
+
+    Returns:
+        None if no divergence was found, otherwise a dict with the diverging
+        "step", the RISC-V "riscv_pc" that was executed and its "bitty_range";
+        the emulators are left in the state right after that step.
+    """
+    if not states_match(riscv, bitty):
+        return {"step": 0, "riscv_pc": None, "bitty_range": None}
+
+    good_step = 0
+    good = (riscv.snapshot(), bitty.snapshot())
+    step = 0
+    while step < max_instructions and 0 <= riscv.pc < len(riscv.instruction_array):
+        coordinated_step(riscv, bitty, map_pc)
+        step += 1
+        finished = not 0 <= riscv.pc < len(riscv.instruction_array)
+        if step % checkpoint_interval and not finished and step < max_instructions:
+            continue
+        if states_match(riscv, bitty):
+            good_step = step
+            good = (riscv.snapshot(), bitty.snapshot())
+            continue
+
+        # first mismatching step is in (good_step, step]
+        low, high = good_step, step
+        while high - low > 1:
+            middle = (low + high) // 2
+            riscv.restore(good[0])
+            bitty.restore(good[1])
+            for _ in range(middle - low):
+                coordinated_step(riscv, bitty, map_pc)
+            if states_match(riscv, bitty):
+                low = middle
+                good = (riscv.snapshot(), bitty.snapshot())
+            else:
+                high = middle
+
+        riscv.restore(good[0])
+        bitty.restore(good[1])
+        for _ in range(high - low - 1):
+            coordinated_step(riscv, bitty, map_pc)
+        riscv_pc = riscv.pc
+        coordinated_step(riscv, bitty, map_pc)
+        return {"step": high,
+                "riscv_pc": riscv_pc,
+                "bitty_range": index.bitty_range(riscv_pc) if riscv_pc < len(index) else None}
+    return None
+
+
+def main():
+    checkpoint_interval = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+
+    write_to_file("=== Emulator Divergence Bisection ===", mode="w")
+    memory_size = 1024
+    mem_seed = 42
+    mem_riscv = generate_shared_memory(size=memory_size, seed=mem_seed, paged=True)
+    mem_bitty_data = generate_shared_memory(size=memory_size, seed=mem_seed, paged=True)
+
+    riscv = RISCV32EMEmulator(memory_array=mem_riscv, verbosity=QUIET)
+    bitty = BittyEmulator(data_memory_size=memory_size, memory=mem_bitty_data, verbosity=QUIET)
+    map_pc = read_ints_from_file("pc_map_output.txt")
+    riscv.instruction_array = load_instructions_from_file("riscv_instructions.txt")
+    riscv.pc = 0
+    bitty.instruction_array = load_instructions_from_file("bitty_binary.txt")
+    write_to_file(f"Loaded {len(riscv.instruction_array)} RISC-V / {len(bitty.instruction_array)} Bitty "
+                  f"instructions, {len(map_pc)} PC mappings; checkpoint every {checkpoint_interval} steps")
+
+    index = PcIndex.from_map(map_pc, len(bitty.instruction_array))
+    divergence = find_divergence(riscv, bitty, map_pc, index, checkpoint_interval=checkpoint_interval)
+    if divergence is None:
+        write_to_file("No divergence found")
+        close_logs()
+        print("No divergence found")
+        return
+
+    if divergence["riscv_pc"] is None:
+        message = "Emulators differ before the first instruction"
+    else:
+        message = (f"First divergence at RISC-V step {divergence['step']}: "
+                   f"RISC-V PC={divergence['riscv_pc']}, Bitty PCs {divergence['bitty_range']}")
+    write_to_file(message)
+    print(message)
+    # attribute the Bitty PC where the step ended to its RISC-V instruction
+    if 0 <= bitty.pc < index.bitty_length:
+        riscv_pc, offset = index.locate(bitty.pc)
+        write_to_file(f"Bitty stopped at PC={bitty.pc}: instruction {offset} of the "
+                      f"{index.lowering_length(riscv_pc)}-instruction lowering of RISC-V PC={riscv_pc}")
+    else:
+        write_to_file(f"Bitty stopped at PC={bitty.pc}, outside its program")
+    compare_registers(riscv, bitty)
+    compare_memory(riscv.memory_array, bitty.data_memory)
+    close_logs()
+
+
+if __name__ == "__main__":
+    main()
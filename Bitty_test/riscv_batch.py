@@ -0,0 +1,290 @@
+"""
+riscv_batch.py - Lockstep execution of many RV32EM machines with NumPy
+
+RiscvBatch runs one RV32EM program on N machines at once, the golden-model
+counterpart of bitty_batch.BittyBatch. The machine state is held in arrays
+with the same names and layout as BittyBatch, so the results of the two
+engines can be compared directly:
+
+    registers   (N, 16) uint32
+    pc          (N,)    int64
+    memory      (N, M)  uint32 words
+
+The program is decoded with predecode_instruction(), and every handler has
+a vector counterpart here with the same semantics as decode_and_execute()
+with tracing off (the same split as riscv_superblocks.py). Register bound
+checks, x0 writes and unknown encodings are resolved at decode time, so x0
+is never written. MUL/MULH* use 64-bit intermediates and DIV/REM keep the
+model's floor-division results.
+"""
+import numpy as np
+
+from RISCV32EMEmulator import predecode_instruction
+
+MASK = np.uint32(0xFFFFFFFF)
+
+
+def _signed(values):
+    return values.view(np.int32)
+
+
+def _wide_signed(values):
+    return _signed(values).astype(np.int64)
+
+
+def _shift_right_arith(a, shift):
+    return (_signed(a) >> np.asarray(shift & 0x1F).astype(np.int32)).view(np.uint32)
+
+
+def _div(a, b):
+    s1, s2 = _wide_signed(a), _wide_signed(b)
+    quotient = s1 // np.where(s2 == 0, 1, s2)     # -2**31 // -1 == 2**31 wraps to s1
+    return np.where(s2 == 0, 0xFFFFFFFF, quotient).astype(np.uint32)
+
+
+def _rem(a, b):
+    s1, s2 = _wide_signed(a), _wide_signed(b)
+    return np.where(s2 == 0, s1, s1 % np.where(s2 == 0, 1, s2)).astype(np.uint32)
+
+
+def _divu(a, b):
+    return np.where(b == 0, MASK, a // np.where(b == 0, 1, b)).astype(np.uint32)
+
+
+def _remu(a, b):
+    return np.where(b == 0, a, a % np.where(b == 0, 1, b)).astype(np.uint32)
+
+
+# R-type and M extension on uint32 vectors: (rs1 values, rs2 values) -> rd values
+_REGISTER_OPS = {
+    "add":    lambda a, b: a + b,
+    "sub":    lambda a, b: a - b,
+    "sll":    lambda a, b: a << (b & np.uint32(0x1F)),
+    "slt":    lambda a, b: _signed(a) < _signed(b),
+    "sltu":   lambda a, b: a < b,
+    "xor":    lambda a, b: a ^ b,
+    "srl":    lambda a, b: a >> (b & np.uint32(0x1F)),
+    "sra":    _shift_right_arith,
+    "or":     lambda a, b: a | b,
+    "and":    lambda a, b: a & b,
+    "mul":    lambda a, b: (a.astype(np.uint64) * b.astype(np.uint64)).astype(np.uint32),
+    "mulh":   lambda a, b: ((_wide_signed(a) * _wide_signed(b)) >> 32).astype(np.uint32),
+    "mulhsu": lambda a, b: ((_wide_signed(a) * b.astype(np.int64)) >> 32).astype(np.uint32),
+    "mulhu":  lambda a, b: ((a.astype(np.uint64) * b.astype(np.uint64)) >> np.uint64(32)).astype(np.uint32),
+    "div":    _div,
+    "divu":   _divu,
+    "rem":    _rem,
+    "remu":   _remu,
+}
+
+# I-type arithmetic: (rs1 values, decoded immediate) -> rd values
+_IMMEDIATE_OPS = {
+    "addi":  lambda a, imm: a + np.uint32(imm),
+    "slli":  lambda a, sh: a << np.uint32(sh),
+    "slti":  lambda a, imm_s: _signed(a) < imm_s,
+    "sltiu": lambda a, imm: a < imm,
+    "xori":  lambda a, imm: a ^ np.uint32(imm),
+    "srli":  lambda a, sh: a >> np.uint32(sh),
+    "srai":  _shift_right_arith,
+    "ori":   lambda a, imm: a | np.uint32(imm),
+    "andi":  lambda a, imm: a & np.uint32(imm),
+}
+
+# branches: (rs1 values, rs2 values) -> taken
+_BRANCH_CONDITIONS = {
+    "beq":  lambda a, b: a == b,
+    "bne":  lambda a, b: a != b,
+    "blt":  lambda a, b: _signed(a) < _signed(b),
+    "bge":  lambda a, b: _signed(a) >= _signed(b),
+    "bltu": lambda a, b: a < b,
+    "bgeu": lambda a, b: a >= b,
+}
+
+
+# ---------------------------------------------------------------------------
+# Vector handlers: handler(batch, rows, pc, a, b, c) executes the instruction
+# at `pc` on the machines `rows` (an index array, or slice(None) for all of
+# them) and sets their next PC.
+# ---------------------------------------------------------------------------
+
+def _vec_nop(batch, rows, pc, a, b, c):
+    batch.pc[rows] = pc + 1
+
+
+def _register_handler(operation):
+    def handler(batch, rows, pc, rd, rs1, rs2):
+        regs = batch._registers
+        regs[rd][rows] = operation(regs[rs1][rows], regs[rs2][rows])
+        batch.pc[rows] = pc + 1
+    return handler
+
+
+def _immediate_handler(operation):
+    def handler(batch, rows, pc, rd, rs1, imm):
+        regs = batch._registers
+        regs[rd][rows] = operation(regs[rs1][rows], imm)
+        batch.pc[rows] = pc + 1
+    return handler
+
+
+def _load_handler(name):
+    def handler(batch, rows, pc, rd, rs1, imm):
+        regs = batch._registers
+        batch_rows = batch._machines[rows]
+        address = (regs[rs1][rows] + np.uint32(imm & 0xFFFFFFFF)) % np.uint32(batch.memory.shape[1])
+        if name in ("lh", "lhu"):
+            address -= address & np.uint32(1)
+        value = batch.memory[batch_rows, address]
+        if name == "lb":
+            value = value & np.uint32(0xFF)
+            value = np.where(value & np.uint32(0x80), value | np.uint32(0xFFFFFF00), value)
+        elif name == "lh":
+            value = value & np.uint32(0xFFFF)
+            value = np.where(value & np.uint32(0x8000), value | np.uint32(0xFFFF0000), value)
+        elif name == "lbu":
+            value = value & np.uint32(0xFF)
+        elif name == "lhu":
+            value = value & np.uint32(0xFFFF)
+        regs[rd][rows] = value
+        batch.pc[rows] = pc + 1
+    return handler
+
+
+def _store_handler(name):
+    width_mask, alignment = {"sb": (0xFF, 1), "sh": (0xFFFF, 2), "sw": (0xFFFFFFFF, 4)}[name]
+    keep = np.uint32(~width_mask & 0xFFFFFFFF)
+    width_mask = np.uint32(width_mask)
+
+    def handler(batch, rows, pc, rs1, rs2, imm):
+        regs = batch._registers
+        batch.pc[rows] = pc + 1
+        batch_rows = batch._machines[rows]
+        address = regs[rs1][rows] + np.uint32(imm & 0xFFFFFFFF)
+        valid = address < batch.memory.shape[1]
+        if alignment > 1:
+            valid &= address % np.uint32(alignment) == 0
+        batch_rows, address = batch_rows[valid], address[valid]
+        memory = batch.memory
+        memory[batch_rows, address] = (memory[batch_rows, address] & keep) | (regs[rs2][batch_rows] & width_mask)
+    return handler
+
+
+def _branch_handler(condition):
+    def handler(batch, rows, pc, rs1, rs2, offset):
+        regs = batch._registers
+        target = pc + offset
+        if target < 0:
+            target = len(batch.program) - abs(target) % len(batch.program)
+        batch.pc[rows] = np.where(condition(regs[rs1][rows], regs[rs2][rows]), target, pc + 1)
+    return handler
+
+
+def _vec_lui(batch, rows, pc, rd, imm, _):
+    batch._registers[rd][rows] = imm
+    batch.pc[rows] = pc + 1
+
+
+def _vec_auipc(batch, rows, pc, rd, imm, _):
+    batch._registers[rd][rows] = (pc + imm) & 0xFFFFFFFF
+    batch.pc[rows] = pc + 1
+
+
+def _vec_jal(batch, rows, pc, rd, target, _):
+    if rd:
+        batch._registers[rd][rows] = (pc + 1) & 0xFFFFFFFF
+    batch.pc[rows] = target
+
+
+def _vec_jalr(batch, rows, pc, rd, rs1, imm):
+    regs = batch._registers
+    target = ((regs[rs1][rows] + np.uint32(imm & 0xFFFFFFFF)) & np.uint32(0xFFFFFFFE)) % len(batch.program)
+    if rd:
+        regs[rd][rows] = (pc + 1) & 0xFFFFFFFF
+    batch.pc[rows] = target
+
+
+_VECTOR_HANDLERS = {"nop": _vec_nop, "lui": _vec_lui, "auipc": _vec_auipc,
+                    "jal": _vec_jal, "jalr": _vec_jalr}
+_VECTOR_HANDLERS.update((name, _register_handler(op)) for name, op in _REGISTER_OPS.items())
+_VECTOR_HANDLERS.update((name, _immediate_handler(op)) for name, op in _IMMEDIATE_OPS.items())
+_VECTOR_HANDLERS.update((name, _load_handler(name)) for name in ("lb", "lh", "lw", "lbu", "lhu"))
+_VECTOR_HANDLERS.update((name, _store_handler(name)) for name in ("sb", "sh", "sw"))
+_VECTOR_HANDLERS.update((name, _branch_handler(cond)) for name, cond in _BRANCH_CONDITIONS.items())
+
+
+class RiscvBatch:
+    def __init__(self, program, registers, memory, pc=0):
+        """
+        Args:
+            program: List of RV32EM instruction words, shared by all machines
+            registers: (N, 16) initial register values
+            memory: (N, M) initial memory words
+            pc: Initial PC, a scalar or one per machine
+        """
+        registers = np.asarray(registers, dtype=np.uint32)
+        self.memory = np.array(memory, dtype=np.uint32)
+        if registers.ndim != 2 or registers.shape[1] != 16:
+            raise ValueError("registers must have shape (N, 16)")
+        machines = registers.shape[0]
+        if self.memory.ndim != 2 or self.memory.shape[0] != machines:
+            raise ValueError("memory must have shape (N, M)")
+        self._registers = np.ascontiguousarray(registers.T)
+        self.registers = self._registers.T
+        self._machines = np.arange(machines)
+        self.pc = np.zeros(machines, dtype=np.int64) + np.asarray(pc, dtype=np.int64)
+        self.executed = np.zeros(machines, dtype=np.int64)
+        self.program = list(program)
+        self._decoded = []
+        for instruction in self.program:
+            handler, a, b, c = predecode_instruction(instruction)
+            self._decoded.append((_VECTOR_HANDLERS[handler.__name__[len("_exec_"):]], a, b, c))
+
+    def __len__(self):
+        return self.registers.shape[0]
+
+    def running(self):
+        """Indices of the machines whose PC is inside the program."""
+        return np.flatnonzero((self.pc >= 0) & (self.pc < len(self.program)))
+
+    def step(self):
+        """Execute one instruction on every running machine; return how many ran."""
+        inside = (self.pc >= 0) & (self.pc < len(self.program))
+        if inside.all():
+            rows = slice(None)
+            ran = len(self)
+        else:
+            rows = np.flatnonzero(inside)
+            ran = rows.size
+            if not ran:
+                return 0
+        pcs = self.pc[rows]
+        first = pcs[0]
+        if (pcs == first).all():
+            handler, a, b, c = self._decoded[first]
+            handler(self, rows, int(first), a, b, c)
+        else:
+            order = np.argsort(pcs, kind="stable")
+            pcs = pcs[order]
+            starts = np.flatnonzero(pcs[1:] != pcs[:-1]) + 1
+            machines = self._machines[rows][order]
+            for pc, group in zip(pcs[np.r_[0, starts]].tolist(), np.split(machines, starts)):
+                handler, a, b, c = self._decoded[pc]
+                handler(self, group, pc, a, b, c)
+        self.executed[rows] += 1
+        return ran
+
+    def run(self, max_instructions=1000):
+        """
+        Step until every machine has left the program or executed
+        max_instructions instructions, like RISCV32EMEmulator.run().
+
+        Returns:
+            Total number of machine-instructions executed
+        """
+        total = 0
+        for _ in range(max_instructions):
+            ran = self.step()
+            if not ran:
+                break
+            total += ran
+        return total
@@ -0,0 +1,225 @@
+"""
+riscv_superblocks.py - Superblock compiler for RISCV32EMEmulator
+
+A superblock is a straight-line run of RV32E instructions that continues
+through conditional branches on their not-taken path. A taken branch leaves
+through a side exit. The superblock ends at JAL/JALR, at the end of the
+program, or after MAX_SUPERBLOCK_LENGTH instructions. Each superblock is
+generated as Python source, compiled with compile() and called as
+
+    next_pc, executed = superblock(emulator)
+
+Registers live in locals and are written back only at an exit. The generated
+code has the same semantics as the pre-decoded handlers in
+RISCV32EMEmulator.py; it is used by RISCV32EMEmulator.run(jit=True).
+"""
+from RISCV32EMEmulator import predecode_instruction
+
+MAX_SUPERBLOCK_LENGTH = 256
+
+MASK = "0xFFFFFFFF"
+
+
+def _signed(reg):
+    """Expression for the signed 32-bit view of a register local."""
+    return f"({reg} if {reg} < 0x80000000 else {reg} - 0x100000000)"
+
+
+def _shift_right_arith(reg, shift):
+    return (f"((({reg} >> {shift}) | (((1 << {shift}) - 1) << (32 - {shift}))) & {MASK}"
+            f" if {reg} & 0x80000000 else ({reg} >> {shift}) & {MASK})")
+
+
+# R-type and M extension: (rd, rs1, rs2)
+_REGISTER_OPS = {
+    "add":    "r{a} = (r{b} + r{c}) & 0xFFFFFFFF",
+    "sub":    "r{a} = (r{b} - r{c}) & 0xFFFFFFFF",
+    "sll":    "r{a} = (r{b} << (r{c} & 0x1F)) & 0xFFFFFFFF",
+    "slt":    "r{a} = 1 if {sb} < {sc} else 0",
+    "sltu":   "r{a} = 1 if (r{b} & 0xFFFFFFFF) < (r{c} & 0xFFFFFFFF) else 0",
+    "xor":    "r{a} = r{b} ^ r{c}",
+    "srl":    "r{a} = (r{b} >> (r{c} & 0x1F)) & 0xFFFFFFFF",
+    "or":     "r{a} = r{b} | r{c}",
+    "and":    "r{a} = r{b} & r{c}",
+    "mul":    "r{a} = ({sb} * {sc}) & 0xFFFFFFFF",
+    "mulh":   "r{a} = (({sb} * {sc}) >> 32) & 0xFFFFFFFF",
+    "mulhsu": "r{a} = (({sb} * r{c}) >> 32) & 0xFFFFFFFF",
+    "mulhu":  "r{a} = ((r{b} * r{c}) >> 32) & 0xFFFFFFFF",
+}
+
+# I-type arithmetic: (rd, rs1, imm)
+_IMMEDIATE_OPS = {
+    "addi":  "r{a} = (r{b} + {c}) & 0xFFFFFFFF",
+    "slli":  "r{a} = (r{b} << {c}) & 0xFFFFFFFF",
+    "slti":  "r{a} = 1 if {sb} < {c} else 0",
+    "sltiu": "r{a} = 1 if (r{b} & 0xFFFFFFFF) < {c} else 0",
+    "xori":  "r{a} = r{b} ^ {c}",
+    "srli":  "r{a} = (r{b} >> {c}) & 0xFFFFFFFF",
+    "ori":   "r{a} = r{b} | {c}",
+    "andi":  "r{a} = r{b} & {c}",
+}
+
+# branches: (rs1, rs2, offset); the condition for taking the side exit
+_BRANCH_CONDITIONS = {
+    "beq":  "r{a} == r{b}",
+    "bne":  "r{a} != r{b}",
+    "blt":  "{sa} < {sb}",
+    "bge":  "{sa} >= {sb}",
+    "bltu": "(r{a} & 0xFFFFFFFF) < (r{b} & 0xFFFFFFFF)",
+    "bgeu": "(r{a} & 0xFFFFFFFF) >= (r{b} & 0xFFFFFFFF)",
+}
+
+
+def _division_lines(name, rd, rs1, rs2):
+    if name in ("div", "rem"):
+        lines = [f"s1 = {_signed(f'r{rs1}')}", f"s2 = {_signed(f'r{rs2}')}"]
+        if name == "div":
+            lines.append(f"r{rd} = 0xFFFFFFFF if s2 == 0 else (s1 & {MASK} if s1 == -0x80000000 and s2 == -1"
+                         f" else (s1 // s2) & {MASK})")
+        else:
+            lines.append(f"r{rd} = s1 & {MASK} if s2 == 0 else (0 if s1 == -0x80000000 and s2 == -1"
+                         f" else (s1 % s2) & {MASK})")
+        return lines
+    if name == "divu":
+        return [f"r{rd} = 0xFFFFFFFF if r{rs2} == 0 else (r{rs1} // r{rs2}) & {MASK}"]
+    return [f"r{rd} = r{rs1} & {MASK} if r{rs2} == 0 else (r{rs1} % r{rs2}) & {MASK}"]
+
+
+def _load_lines(name, rd, rs1, imm):
+    lines = [f"address = (r{rs1} + {imm}) & {MASK}",
+             "if address >= mem_len: address %= mem_len"]
+    if name in ("lh", "lhu"):
+        lines.append("if address % 2 != 0: address -= 1")
+    if name == "lb":
+        lines += ["val = mem[address] & 0xFF",
+                  f"r{rd} = val | 0xFFFFFF00 if val & 0x80 else val"]
+    elif name == "lh":
+        lines += ["val = mem[address] & 0xFFFF",
+                  f"r{rd} = val | 0xFFFF0000 if val & 0x8000 else val"]
+    elif name == "lw":
+        lines.append(f"r{rd} = mem[address]")
+    elif name == "lbu":
+        lines.append(f"r{rd} = mem[address] & 0xFF")
+    else:
+        lines.append(f"r{rd} = mem[address] & 0xFFFF")
+    return lines
+
+
+def _store_lines(name, rs1, rs2, imm):
+    lines = [f"addr = (r{rs1} + {imm}) & {MASK}"]
+    if name == "sb":
+        lines.append(f"if addr < mem_len: mem[addr] = (mem[addr] & 0xFFFFFF00) | (r{rs2} & 0xFF)")
+    elif name == "sh":
+        lines.append(f"if addr < mem_len and addr % 2 == 0: mem[addr] = (mem[addr] & 0xFFFF0000) | (r{rs2} & 0xFFFF)")
+    else:
+        lines.append(f"if addr < mem_len and addr % 4 == 0: mem[addr] = r{rs2}")
+    return lines
+
+
+def compile_superblock(program, start):
+    """
+    Compile the superblock of `program` that starts at `start`.
+
+    Args:
+        program: List of RV32EM instruction words (instruction_array)
+        start: PC of the first instruction of the superblock
+
+    Returns:
+        Tuple of (function, number of instructions on the fall-through path)
+    """
+    program_len = len(program)
+    body = []
+    used = set()
+    written = set()
+    exits = []     # (line index, next pc, executed) for each side exit
+    end = min(program_len, start + MAX_SUPERBLOCK_LENGTH)
+    pc = start
+    exit_line = None
+
+    while pc < end:
+        handler, a, b, c = predecode_instruction(program[pc])
+        name = handler.__name__[len("_exec_"):]
+        executed = pc - start + 1
+
+        if name == "nop":
+            pass
+        elif name in _REGISTER_OPS:
+            used.update((b, c))
+            written.add(a)
+            body.append(_REGISTER_OPS[name].format(a=a, b=b, c=c, sb=_signed(f"r{b}"), sc=_signed(f"r{c}")))
+        elif name in ("sra", "srai"):
+            used.add(b)
+            written.add(a)
+            if name == "sra":
+                used.add(c)
+                body.append(f"sh = r{c} & 0x1F")
+            body.append(f"r{a} = " + _shift_right_arith(f"r{b}", "sh" if name == "sra" else c))
+        elif name in ("div", "divu", "rem", "remu"):
+            used.update((b, c))
+            written.add(a)
+            body.extend(_division_lines(name, a, b, c))
+        elif name in _IMMEDIATE_OPS:
+            used.add(b)
+            written.add(a)
+            body.append(_IMMEDIATE_OPS[name].format(a=a, b=b, c=c, sb=_signed(f"r{b}")))
+        elif name in ("lb", "lh", "lw", "lbu", "lhu"):
+            used.add(b)
+            written.add(a)
+            body.extend(_load_lines(name, a, b, c))
+        elif name in ("sb", "sh", "sw"):
+            used.update((a, b))
+            body.extend(_store_lines(name, a, b, c))
+        elif name == "lui":
+            written.add(a)
+            body.append(f"r{a} = {b}")
+        elif name == "auipc":
+            written.add(a)
+            body.append(f"r{a} = {(pc + b) & 0xFFFFFFFF}")
+        elif name in _BRANCH_CONDITIONS:
+            used.update((a, b))
+            target = pc + c
+            if target < 0:
+                target = program_len - (abs(target) % program_len)
+            condition = _BRANCH_CONDITIONS[name].format(a=a, b=b, sa=_signed(f"r{a}"), sb=_signed(f"r{b}"))
+            body.append(f"if {condition}:")
+            exits.append((len(body), target, executed))
+            body.append(None)  # side exit, filled in once the written set is known
+        elif name == "jal":
+            if a:
+                written.add(a)
+                body.append(f"r{a} = {(pc + 1) & 0xFFFFFFFF}")
+            exit_line = f"return {b}, {executed}"
+            pc += 1
+            break
+        else:  # jalr
+            used.add(b)
+            body.append(f"target = ((r{b} + {c}) & 0xFFFFFFFE) % {program_len}")
+            if a:
+                written.add(a)
+                body.append(f"r{a} = {(pc + 1) & 0xFFFFFFFF}")
+            exit_line = f"return target, {executed}"
+            pc += 1
+            break
+        pc += 1
+
+    if exit_line is None:
+        exit_line = f"return {pc}, {pc - start}"
+
+    # registers written on any path are loaded on entry so every exit can store them
+    used |= written
+    writeback = "; ".join(f"regs[{i}] = r{i}" for i in sorted(written))
+    for index, target, executed in exits:
+        body[index] = f"    {writeback + '; ' if writeback else ''}return {target}, {executed}"
+
+    lines = ["def superblock(emu):",
+             "    regs = emu.registers",
+             "    mem = emu.memory_array",
+             "    mem_len = len(mem)"]
+    lines += [f"    r{i} = regs[{i}]" for i in sorted(used)]
+    lines += [f"    {line}" for line in body]
+    lines += [f"    regs[{i}] = r{i}" for i in sorted(written)]
+    lines += [f"    {exit_line}"]
+
+    namespace = {}
+    exec(compile("\n".join(lines), f"<rv32e superblock @{start}>", "exec"), namespace)
+    return namespace["superblock"], pc - start
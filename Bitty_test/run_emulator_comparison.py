@@ -1,5 +1,11 @@
 """
 run_emulator_comparison.py - Script to run the emulator comparison with proper error handling
+
+Usage: python run_emulator_comparison.py [output_file] [binary_trace_file] [sync_policy]
+(an output_file ending in .gz, .bz2 or .xz is written compressed; with a
+binary_trace_file the per-step trace goes there instead of output_file, '-'
+for none; sync_policy is instruction, block, end or a number of instructions,
+see EmulatorComparison.SYNC_POLICY)
 """
 import os
 import sys
@@ -42,10 +48,16 @@ def main():
     # All required files exist, run the comparison
     print("\nRunning emulator comparison...")
     try:
-        from EmulatorComparison import main as run_comparison
-        run_comparison()
+        import EmulatorComparison
+        if len(sys.argv) > 1:
+            EmulatorComparison.OUTPUT_FILE = sys.argv[1]
+        if len(sys.argv) > 2 and sys.argv[2] != "-":
+            EmulatorComparison.TRACE_FILE = sys.argv[2]
+        if len(sys.argv) > 3:
+            EmulatorComparison.SYNC_POLICY = sys.argv[3]
+        EmulatorComparison.main()
         print("\nComparison completed successfully!")
-        print("Results saved to 'comparison_output.txt'")
+        print(f"Results saved to '{EmulatorComparison.OUTPUT_FILE}'")
         return 0
     except Exception as e:
         print(f"\nError during comparison: {e}")
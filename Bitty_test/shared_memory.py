@@ -1,17 +1,20 @@
 """
 shared_memory.py - Generate shared memory arrays for emulator comparison
 """
+from byte_memory import ByteMemory, PagedMemory
 
-def generate_shared_memory(size=1024, seed=42):
+def generate_shared_memory(size=1024, seed=42, compact=False, paged=False):
     """
     Generate a memory array with consistent initial values for both emulators.
     
     Args:
         size: Size of the memory array to generate
         seed: Random seed for reproducibility
+        compact: Return a ByteMemory instead of a list
+        paged: Return a PagedMemory of `size` words instead of a list
         
     Returns:
-        A list representing memory with initialized values
+        A list (or ByteMemory/PagedMemory) representing memory with initialized values
     """
     import random
     random.seed(seed)
@@ -31,4 +34,8 @@ def generate_shared_memory(size=1024, seed=42):
             # Other words get semi-random values
             memory.append(random.randint(0, 0xFFFFFFFF))
     
+    if paged:
+        return PagedMemory(memory, size=size)
+    if compact:
+        return ByteMemory(memory)
     return memory
\ No newline at end of file
@@ -0,0 +1,10 @@
+"""
+verbosity.py - Output levels for the translator and the emulators
+
+The level is chosen when the object is constructed. In QUIET mode the hot
+paths skip every per-instruction message, so no strings are formatted and
+nothing is printed.
+"""
+
+QUIET = 0  # no per-instruction output
+TRACE = 1  # per-instruction trace, the output the tools have always printed
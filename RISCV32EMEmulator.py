@@ -1,8 +1,12 @@
 # RISCV32EMEmulator.py
+from verbosity import TRACE
 
 class RISCV32EMEmulator:
     STATIC_PC_VALUE = 0x00000000  # Static PC value for RV32E
-    def __init__(self, memory_array):
+    def __init__(self, memory_array, verbosity=TRACE):
+        # QUIET skips all per-instruction output (see verbosity.py)
+        self.verbosity = verbosity
+        self.trace = verbosity >= TRACE
         # RISC-V has 32 registers (x0–x31), but RV32E uses only x0–x15
         self.registers = [i * 10 for i in range(16)]
         self.registers[0] = 0          # x0 is always zero
@@ -15,7 +19,8 @@ class RISCV32EMEmulator:
             with open("instructions_for_em.txt", "r") as infile:
                 for line in infile:
                     instr = int(line.strip(), 16)
-                    print(f"Instruction read and stored: {instr:08x}")
+                    if self.trace:
+                        print(f"Instruction read and stored: {instr:08x}")
                     self.instruction_array.append(instr)
         except FileNotFoundError:
             print("Error opening file")
@@ -24,13 +29,16 @@ class RISCV32EMEmulator:
         if 0 <= self.pc < len(self.instruction_array):
             return self.instruction_array[self.pc]
         else:
-            print(f"PC out of range: {self.pc}")
+            if self.trace:
+                print(f"PC out of range: {self.pc}")
             return 0  # treat as NOP
 
     def decode_and_execute(self, instruction):
+        trace = self.trace
         self.STATIC_PC_VALUE = self.pc + 1
         opcode = instruction & 0x7F
-        print(f"Instruction @ PC={self.pc}: {instruction:08X}")
+        if trace:
+            print(f"Instruction @ PC={self.pc}: {instruction:08X}")
 
         # --- 1) M‑extension instructions (mul/div/rem) ---
         # opcode == 0110011 and funct7 == 0000001
@@ -42,7 +50,8 @@ class RISCV32EMEmulator:
 
             # RV32E register bounds
             if rd > 15 or rs1 > 15 or rs2 > 15:
-                print("Error: Register number exceeds 15 in RV32E mode")
+                if trace:
+                    print("Error: Register number exceeds 15 in RV32E mode")
                 return self.pc + 1
             if rd == 0:
                 return self.pc + 1
@@ -56,19 +65,23 @@ class RISCV32EMEmulator:
 
             if   funct3 == 0x0:  # MUL
                 result = (s1 * s2) & 0xFFFFFFFF
-                print(f"MUL x{rd}, x{rs1}, x{rs2}: {s1} * {s2} = {result:08X}")
+                if trace:
+                    print(f"MUL x{rd}, x{rs1}, x{rs2}: {s1} * {s2} = {result:08X}")
             elif funct3 == 0x1:  # MULH (high signed × signed)
                 full = s1 * s2
                 result = (full >> 32) & 0xFFFFFFFF
-                print(f"MULH x{rd}, x{rs1}, x{rs2}: high({s1}*{s2}) = {result:08X}")
+                if trace:
+                    print(f"MULH x{rd}, x{rs1}, x{rs2}: high({s1}*{s2}) = {result:08X}")
             elif funct3 == 0x2:  # MULHSU (high signed × unsigned)
                 full = s1 * v2
                 result = (full >> 32) & 0xFFFFFFFF
-                print(f"MULHSU x{rd}, x{rs1}, x{rs2}: high({s1}*{v2}) = {result:08X}")
+                if trace:
+                    print(f"MULHSU x{rd}, x{rs1}, x{rs2}: high({s1}*{v2}) = {result:08X}")
             elif funct3 == 0x3:  # MULHU (high unsigned × unsigned)
                 full = v1 * v2
                 result = (full >> 32) & 0xFFFFFFFF
-                print(f"MULHU x{rd}, x{rs1}, x{rs2}: high({v1}*{v2}) = {result:08X}")
+                if trace:
+                    print(f"MULHU x{rd}, x{rs1}, x{rs2}: high({v1}*{v2}) = {result:08X}")
             elif funct3 == 0x4:  # DIV (signed)
                 if s2 == 0:
                     result = 0xFFFFFFFF  # per spec: -1
@@ -76,13 +89,15 @@ class RISCV32EMEmulator:
                     result = s1 & 0xFFFFFFFF
                 else:
                     result = int(s1 // s2) & 0xFFFFFFFF
-                print(f"DIV x{rd}, x{rs1}, x{rs2}: {s1}//{s2} = {result:08X}")
+                if trace:
+                    print(f"DIV x{rd}, x{rs1}, x{rs2}: {s1}//{s2} = {result:08X}")
             elif funct3 == 0x5:  # DIVU (unsigned)
                 if v2 == 0:
                     result = 0xFFFFFFFF
                 else:
                     result = (v1 // v2) & 0xFFFFFFFF
-                print(f"DIVU x{rd}, x{rs1}, x{rs2}: {v1}//{v2} = {result:08X}")
+                if trace:
+                    print(f"DIVU x{rd}, x{rs1}, x{rs2}: {v1}//{v2} = {result:08X}")
             elif funct3 == 0x6:  # REM (signed remainder)
                 if s2 == 0:
                     result = s1 & 0xFFFFFFFF
@@ -90,15 +105,18 @@ class RISCV32EMEmulator:
                     result = 0
                 else:
                     result = int(s1 % s2) & 0xFFFFFFFF
-                print(f"REM x{rd}, x{rs1}, x{rs2}: {s1}%{s2} = {result:08X}")
+                if trace:
+                    print(f"REM x{rd}, x{rs1}, x{rs2}: {s1}%{s2} = {result:08X}")
             elif funct3 == 0x7:  # REMU (unsigned remainder)
                 if v2 == 0:
                     result = v1 & 0xFFFFFFFF
                 else:
                     result = (v1 % v2) & 0xFFFFFFFF
-                print(f"REMU x{rd}, x{rs1}, x{rs2}: {v1}%{v2} = {result:08X}")
+                if trace:
+                    print(f"REMU x{rd}, x{rs1}, x{rs2}: {v1}%{v2} = {result:08X}")
             else:
-                print(f"Unknown M‑extension funct3: {funct3}")
+                if trace:
+                    print(f"Unknown M‑extension funct3: {funct3}")
                 return self.pc + 1
 
             self.registers[rd] = result
@@ -113,7 +131,8 @@ class RISCV32EMEmulator:
             funct7 = (instruction >> 25) & 0x7F
 
             if rd > 15 or rs1 > 15 or rs2 > 15:
-                print("Error: Register number exceeds 15 in RV32E mode")
+                if trace:
+                    print("Error: Register number exceeds 15 in RV32E mode")
                 return self.pc + 1
 
             # x0 stays zero
@@ -123,17 +142,21 @@ class RISCV32EMEmulator:
             if funct3 == 0x0:
                 if funct7 == 0x00:  # ADD
                     result = (self.registers[rs1] + self.registers[rs2]) & 0xFFFFFFFF
-                    print(f"ADD x{rd}, x{rs1}, x{rs2}: {result}")
+                    if trace:
+                        print(f"ADD x{rd}, x{rs1}, x{rs2}: {result}")
                 elif funct7 == 0x20:  # SUB
                     result = (self.registers[rs1] - self.registers[rs2]) & 0xFFFFFFFF
-                    print(f"SUB x{rd}, x{rs1}, x{rs2}: {result}")
+                    if trace:
+                        print(f"SUB x{rd}, x{rs1}, x{rs2}: {result}")
                 else:
-                    print(f"Unknown funct7 for ADD/SUB: {funct7}")
+                    if trace:
+                        print(f"Unknown funct7 for ADD/SUB: {funct7}")
                     return self.pc + 1
             elif funct3 == 0x1:  # SLL
                 sh = self.registers[rs2] & 0x1F
                 result = (self.registers[rs1] << sh) & 0xFFFFFFFF
-                print(f"SLL x{rd}, x{rs1}, x{rs2}: <<{sh} = {result}")
+                if trace:
+                    print(f"SLL x{rd}, x{rs1}, x{rs2}: <<{sh} = {result}")
             elif funct3 == 0x2:  # SLT
                 # signed compare
                 a = self.registers[rs1]
@@ -141,18 +164,22 @@ class RISCV32EMEmulator:
                 sa = a if a < 0x80000000 else a - 0x100000000
                 sb = b if b < 0x80000000 else b - 0x100000000
                 result = 1 if sa < sb else 0
-                print(f"SLT x{rd}, x{rs1}, x{rs2}: {sa}<{sb} = {result}")
+                if trace:
+                    print(f"SLT x{rd}, x{rs1}, x{rs2}: {sa}<{sb} = {result}")
             elif funct3 == 0x3:  # SLTU
                 result = 1 if (self.registers[rs1] & 0xFFFFFFFF) < (self.registers[rs2] & 0xFFFFFFFF) else 0
-                print(f"SLTU x{rd}, x{rs1}, x{rs2}: = {result}")
+                if trace:
+                    print(f"SLTU x{rd}, x{rs1}, x{rs2}: = {result}")
             elif funct3 == 0x4:  # XOR
                 result = self.registers[rs1] ^ self.registers[rs2]
-                print(f"XOR x{rd}, x{rs1}, x{rs2}: = {result}")
+                if trace:
+                    print(f"XOR x{rd}, x{rs1}, x{rs2}: = {result}")
             elif funct3 == 0x5:
                 if funct7 == 0x00:  # SRL
                     sh = self.registers[rs2] & 0x1F
                     result = (self.registers[rs1] >> sh) & 0xFFFFFFFF
-                    print(f"SRL x{rd}, x{rs1}, x{rs2}: >>{sh} = {result}")
+                    if trace:
+                        print(f"SRL x{rd}, x{rs1}, x{rs2}: >>{sh} = {result}")
                 elif funct7 == 0x20:  # SRA
                     sh = self.registers[rs2] & 0x1F
                     val = self.registers[rs1]
@@ -161,18 +188,23 @@ class RISCV32EMEmulator:
                         result = ((val >> sh) | mask) & 0xFFFFFFFF
                     else:
                         result = (val >> sh) & 0xFFFFFFFF
-                    print(f"SRA x{rd}, x{rs1}, x{rs2}: >>a{sh} = {result}")
+                    if trace:
+                        print(f"SRA x{rd}, x{rs1}, x{rs2}: >>a{sh} = {result}")
                 else:
-                    print(f"Unknown funct7 for SRL/SRA: {funct7}")
+                    if trace:
+                        print(f"Unknown funct7 for SRL/SRA: {funct7}")
                     return self.pc + 1
             elif funct3 == 0x6:  # OR
                 result = self.registers[rs1] | self.registers[rs2]
-                print(f"OR x{rd}, x{rs1}, x{rs2}: = {result}")
+                if trace:
+                    print(f"OR x{rd}, x{rs1}, x{rs2}: = {result}")
             elif funct3 == 0x7:  # AND
                 result = self.registers[rs1] & self.registers[rs2]
-                print(f"AND x{rd}, x{rs1}, x{rs2}: = {result}")
+                if trace:
+                    print(f"AND x{rd}, x{rs1}, x{rs2}: = {result}")
             else:
-                print(f"Unknown funct3 for R‑type: {funct3}")
+                if trace:
+                    print(f"Unknown funct3 for R‑type: {funct3}")
                 return self.pc + 1
 
             self.registers[rd] = result
@@ -189,7 +221,8 @@ class RISCV32EMEmulator:
                 imm |= 0xFFFFF000
 
             if rd > 15 or rs1 > 15:
-                print("Error: Register number exceeds 15 in RV32E mode")
+                if trace:
+                    print("Error: Register number exceeds 15 in RV32E mode")
                 return self.pc + 1
 
             # --- arithmetic immediates ---
@@ -198,30 +231,36 @@ class RISCV32EMEmulator:
                     return self.pc + 1
                 if   funct3 == 0x0:  # ADDI
                     result = (self.registers[rs1] + imm) & 0xFFFFFFFF
-                    print(f"ADDI x{rd}, x{rs1}, {imm} = {result}")
+                    if trace:
+                        print(f"ADDI x{rd}, x{rs1}, {imm} = {result}")
                 elif funct3 == 0x1:  # SLLI
                     sh = imm & 0x1F
                     result = (self.registers[rs1] << sh) & 0xFFFFFFFF
-                    print(f"SLLI x{rd}, x{rs1}, {sh} = {result}")
+                    if trace:
+                        print(f"SLLI x{rd}, x{rs1}, {sh} = {result}")
                 elif funct3 == 0x2:  # SLTI
                     # similar signed logic...
                     sa = self.registers[rs1]
                     sa = sa if sa < 0x80000000 else sa - 0x100000000
                     imm_s = imm if imm < 0x800 else imm - 0x1000
                     result = 1 if sa < imm_s else 0
-                    print(f"SLTI x{rd}, x{rs1}, {imm_s} = {result}")
+                    if trace:
+                        print(f"SLTI x{rd}, x{rs1}, {imm_s} = {result}")
                 elif funct3 == 0x3:  # SLTIU
                     result = 1 if (self.registers[rs1] & 0xFFFFFFFF) < (imm & 0xFFFFFFFF) else 0
-                    print(f"SLTIU x{rd}, x{rs1}, {imm} = {result}")
+                    if trace:
+                        print(f"SLTIU x{rd}, x{rs1}, {imm} = {result}")
                 elif funct3 == 0x4:  # XORI
                     result = self.registers[rs1] ^ imm
-                    print(f"XORI x{rd}, x{rs1}, {imm} = {result}")
+                    if trace:
+                        print(f"XORI x{rd}, x{rs1}, {imm} = {result}")
                 elif funct3 == 0x5:  # SRLI/SRAI
                     sh = imm & 0x1F
                     t = (imm >> 5) & 0x7F
                     if t == 0x00:
                         result = (self.registers[rs1] >> sh) & 0xFFFFFFFF
-                        print(f"SRLI x{rd}, x{rs1}, {sh} = {result}")
+                        if trace:
+                            print(f"SRLI x{rd}, x{rs1}, {sh} = {result}")
                     elif t == 0x20:
                         val = self.registers[rs1]
                         if val & 0x80000000:
@@ -229,18 +268,23 @@ class RISCV32EMEmulator:
                             result = ((val >> sh) | mask) & 0xFFFFFFFF
                         else:
                             result = (val >> sh) & 0xFFFFFFFF
-                        print(f"SRAI x{rd}, x{rs1}, {sh} = {result}")
+                        if trace:
+                            print(f"SRAI x{rd}, x{rs1}, {sh} = {result}")
                     else:
-                        print(f"Unknown shift type: {t}")
+                        if trace:
+                            print(f"Unknown shift type: {t}")
                         return self.pc + 1
                 elif funct3 == 0x6:  # ORI
                     result = self.registers[rs1] | imm
-                    print(f"ORI x{rd}, x{rs1}, {imm} = {result}")
+                    if trace:
+                        print(f"ORI x{rd}, x{rs1}, {imm} = {result}")
                 elif funct3 == 0x7:  # ANDI
                     result = self.registers[rs1] & imm
-                    print(f"ANDI x{rd}, x{rs1}, {imm} = {result}")
+                    if trace:
+                        print(f"ANDI x{rd}, x{rs1}, {imm} = {result}")
                 else:
-                    print(f"Unknown funct3 for I‑type: {funct3}")
+                    if trace:
+                        print(f"Unknown funct3 for I‑type: {funct3}")
                     return self.pc + 1
 
                 if rd != 0:
@@ -250,7 +294,8 @@ class RISCV32EMEmulator:
             else:  # opcode == 0000011
                 address = (self.registers[rs1] + imm) & 0xFFFFFFFF
                 if address >= len(self.memory_array):
-                    print(f"Memory access out of bounds: {address}")
+                    if trace:
+                        print(f"Memory access out of bounds: {address}")
                     address %= len(self.memory_array)
 
                 if rd == 0:
@@ -260,28 +305,34 @@ class RISCV32EMEmulator:
                     val = self.memory_array[address] & 0xFF
                     if val & 0x80: val |= 0xFFFFFF00
                     self.registers[rd] = val
-                    print(f"LB x{rd}, {imm}(x{rs1}) = {val:08X}")
+                    if trace:
+                        print(f"LB x{rd}, {imm}(x{rs1}) = {val:08X}")
                 elif funct3 == 0x1: # LH
                     if address % 2 != 0: address -= 1
                     val = self.memory_array[address] & 0xFFFF
                     if val & 0x8000: val |= 0xFFFF0000
                     self.registers[rd] = val
-                    print(f"LH x{rd}, {imm}(x{rs1}) = {val:08X}")
+                    if trace:
+                        print(f"LH x{rd}, {imm}(x{rs1}) = {val:08X}")
                 elif funct3 == 0x2: # LW
                     val = self.memory_array[address]
                     self.registers[rd] = val
-                    print(f"LW x{rd}, {imm}(x{rs1}) = {val:08X}")
+                    if trace:
+                        print(f"LW x{rd}, {imm}(x{rs1}) = {val:08X}")
                 elif funct3 == 0x4: # LBU
                     val = self.memory_array[address] & 0xFF
                     self.registers[rd] = val
-                    print(f"LBU x{rd}, {imm}(x{rs1}) = {val:08X}")
+                    if trace:
+                        print(f"LBU x{rd}, {imm}(x{rs1}) = {val:08X}")
                 elif funct3 == 0x5: # LHU
                     if address % 2 != 0: address -= 1
                     val = self.memory_array[address] & 0xFFFF
                     self.registers[rd] = val
-                    print(f"LHU x{rd}, {imm}(x{rs1}) = {val:08X}")
+                    if trace:
+                        print(f"LHU x{rd}, {imm}(x{rs1}) = {val:08X}")
                 else:
-                    print(f"Unknown funct3 for load: {funct3}")
+                    if trace:
+                        print(f"Unknown funct3 for load: {funct3}")
                     return self.pc + 1
 
             return self.pc + 1
@@ -297,18 +348,21 @@ class RISCV32EMEmulator:
             if imm & 0x800: imm |= 0xFFFFF000
 
             if rs1 > 15 or rs2 > 15:
-                print("Error: Register number exceeds 15 in RV32E mode")
+                if trace:
+                    print("Error: Register number exceeds 15 in RV32E mode")
                 return self.pc + 1
 
             addr = (self.registers[rs1] + imm) & 0xFFFFFFFF
             if addr >= len(self.memory_array):
-                print(f"Memory access out of bounds: {addr}")
+                if trace:
+                    print(f"Memory access out of bounds: {addr}")
                 return self.pc + 1
 
             if funct3 == 0x0:   # SB
                 b = self.registers[rs2] & 0xFF
                 self.memory_array[addr] = (self.memory_array[addr] & 0xFFFFFF00) | b
-                print(f"SB x{rs2}, {imm}(x{rs1})")
+                if trace:
+                    print(f"SB x{rs2}, {imm}(x{rs1})")
             elif funct3 == 0x1: # SH
                 #JUST FOR TESTING
                 # if addr % 2 != 0:
@@ -316,7 +370,8 @@ class RISCV32EMEmulator:
                 #     return self.pc + 1
                 h = self.registers[rs2] & 0xFFFF
                 self.memory_array[addr] = (self.memory_array[addr] & 0xFFFF0000) | h
-                print(f"SH x{rs2}, {imm}(x{rs1})")
+                if trace:
+                    print(f"SH x{rs2}, {imm}(x{rs1})")
             elif funct3 == 0x2: # SW
                 #JUST FOR TESTING
                 # if addr % 4 != 0:
@@ -324,9 +379,11 @@ class RISCV32EMEmulator:
                 #     return self.pc + 1
                 w = self.registers[rs2]
                 self.memory_array[addr] = w
-                print(f"SW x{rs2}, {imm}(x{rs1})")
+                if trace:
+                    print(f"SW x{rs2}, {imm}(x{rs1})")
             else:
-                print(f"Unknown funct3 for store: {funct3}")
+                if trace:
+                    print(f"Unknown funct3 for store: {funct3}")
                 return self.pc + 1
 
             return self.pc + 1
@@ -344,7 +401,8 @@ class RISCV32EMEmulator:
             if imm & 0x1000: imm |= 0xFFFFE000
 
             if rs1 > 15 or rs2 > 15:
-                print("Error: Register number exceeds 15 in RV32E mode")
+                if trace:
+                    print("Error: Register number exceeds 15 in RV32E mode")
                 return self.pc + 1
 
             a = self.registers[rs1]
@@ -367,12 +425,14 @@ class RISCV32EMEmulator:
             elif funct3 == 0x7: # BGEU
                 take = (a & 0xFFFFFFFF) >= (b & 0xFFFFFFFF)
             else:
-                print(f"Unknown branch funct3: {funct3}")
+                if trace:
+                    print(f"Unknown branch funct3: {funct3}")
                 return self.pc + 1
             
             imm = imm // 4
 
-            print(f"{'TAKE' if take else 'NO'} BRANCH {funct3} imm={imm}")
+            if trace:
+                print(f"{'TAKE' if take else 'NO'} BRANCH {funct3} imm={imm}")
             #TEMPORARY CHANGE
             #return self.pc + (imm >> 1) if take else self.pc + 1
             return self.pc + 1
@@ -382,17 +442,20 @@ class RISCV32EMEmulator:
             rd  = (instruction >> 7) & 0x1F
             imm = instruction & 0xFFFFF000
             if rd > 15:
-                print("Error: Register number exceeds 15 in RV32E mode")
+                if trace:
+                    print("Error: Register number exceeds 15 in RV32E mode")
                 return self.pc + 1
             if rd == 0:
                 return self.pc + 1
 
             if opcode == 0b0110111:  # LUI
                 self.registers[rd] = imm
-                print(f"LUI x{rd}, 0x{imm>>12:X}")
+                if trace:
+                    print(f"LUI x{rd}, 0x{imm>>12:X}")
             else:                    # AUIPC
                 self.registers[rd] = (self.STATIC_PC_VALUE + imm) & 0xFFFFFFFF
-                print(f"AUIPC x{rd}, 0x{imm>>12:X}")
+                if trace:
+                    print(f"AUIPC x{rd}, 0x{imm>>12:X}")
 
             return self.pc + 1
 
@@ -410,7 +473,8 @@ class RISCV32EMEmulator:
             if rd <= 15 and rd != 0:
                 self.registers[rd] = (self.pc + 1) & 0xFFFFFFFF
             next_pc = (self.pc + (imm >> 1)) & 0xFFFFFFFF
-            print(f"JAL x{rd}, imm={imm} -> PC={next_pc}")
+            if trace:
+                print(f"JAL x{rd}, imm={imm} -> PC={next_pc}")
             self.STATIC_PC_VALUE = next_pc
             return next_pc
 
@@ -423,18 +487,21 @@ class RISCV32EMEmulator:
             if imm & 0x800: imm |= 0xFFFFF000
 
             if funct3 != 0x0 or rd > 15 or rs1 > 15:
-                print(f"Unknown or out‑of‑range JALR")
+                if trace:
+                    print(f"Unknown or out‑of‑range JALR")
                 return self.pc + 1
 
             ret = (self.pc + 1) & 0xFFFFFFFF
             next_pc = (self.registers[rs1] + imm) & 0xFFFFFFFE
             if rd != 0:
                 self.registers[rd] = ret
-            print(f"JALR x{rd}, x{rs1}, {imm}: -> PC={next_pc}")
+            if trace:
+                print(f"JALR x{rd}, x{rs1}, {imm}: -> PC={next_pc}")
             self.STATIC_PC_VALUE = next_pc
             return next_pc
 
         else:
-            print(f"Unknown opcode: {opcode:02b}")
+            if trace:
+                print(f"Unknown opcode: {opcode:02b}")
             self.STATIC_PC_VALUE = self.pc + 1
             return self.pc + 1
@@ -0,0 +1,96 @@
+"""
+benchmark_verbosity.py - Instructions per second of the translator and both
+emulators in each verbosity mode
+
+Usage: python benchmark_verbosity.py [riscv_program.txt] [repeats]
+
+Trace output is sent to os.devnull while timing, so the numbers measure the
+cost of formatting and printing, not of the terminal.
+"""
+import contextlib
+import os
+import sys
+import time
+
+from BittyEmulator import BittyEmulator
+from RISCV32EMEmulator import RISCV32EMEmulator
+from shared_memory import generate_shared_memory
+from translator import RiscVConverter
+from verbosity import QUIET, TRACE
+
+MODES = (("QUIET", QUIET), ("TRACE", TRACE))
+
+
+def load_instructions_from_file(filename):
+    """Read RISC-V words (0b.../0x..., underscores allowed), one per line."""
+    instructions = []
+    with open(filename, "r") as f:
+        for line in f:
+            s = line.strip()
+            if not s or s.startswith("#"):
+                continue
+            instructions.append(int(s.replace("_", ""), 0) & 0xFFFFFFFF)
+    return instructions
+
+
+def bench_translator(words, repeats, verbosity):
+    """Per-instruction translation through RiscVConverter.translator()."""
+    count = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        converter = RiscVConverter(verbosity=verbosity)
+        for word in words:
+            converter.translator(word)
+        count += len(words)
+    return count, time.perf_counter() - start
+
+
+def bench_riscv(words, repeats, verbosity):
+    """Each instruction executed in order through decode_and_execute()."""
+    riscv = RISCV32EMEmulator(memory_array=generate_shared_memory(), verbosity=verbosity)
+    count = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for pc, word in enumerate(words):
+            riscv.pc = pc
+            riscv.decode_and_execute(word)
+        count += len(words)
+    return count, time.perf_counter() - start
+
+
+def bench_bitty(bitty_words, repeats, verbosity):
+    """The translated program run through evaluate_instructions_array()."""
+    bitty = BittyEmulator(memory=generate_shared_memory(), verbosity=verbosity)
+    count = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        bitty.evaluate_instructions_array(bitty_words, 0)
+        count += len(bitty_words)
+    return count, time.perf_counter() - start
+
+
+def main():
+    program_file = sys.argv[1] if len(sys.argv) > 1 else "riscv_instructions.txt"
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    words = load_instructions_from_file(program_file)
+    bitty_words = RiscVConverter(verbosity=QUIET).translate_batch(words)
+
+    benchmarks = (
+        ("translator", lambda v: bench_translator(words, repeats, v)),
+        ("RISCV32EMEmulator", lambda v: bench_riscv(words, repeats, v)),
+        ("BittyEmulator", lambda v: bench_bitty(bitty_words, repeats, v)),
+    )
+
+    print(f"{program_file}: {len(words)} RISC-V / {len(bitty_words)} Bitty instructions, {repeats} repeats")
+    print(f"{'Component':<20}{'Mode':<8}{'Instrs':>10}{'Seconds':>10}{'Instr/s':>14}")
+    print("-" * 62)
+    for name, bench in benchmarks:
+        for mode_name, verbosity in MODES:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                count, elapsed = bench(verbosity)
+            print(f"{name:<20}{mode_name:<8}{count:>10}{elapsed:>10.3f}{count / elapsed:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
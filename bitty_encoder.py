@@ -0,0 +1,82 @@
+"""
+bitty_encoder.py - Table-driven, vectorized encoder for Bitty assembly
+
+Bit-identical to RiscVConverter.bitty_to_binary(), but encodes a whole
+instruction stream with a handful of NumPy operations instead of one Python
+call per assembly tuple.
+"""
+import numpy as np
+
+from translator import RiscVConverter
+
+# opcode-id <-> mnemonic, in the order of RiscVConverter.bitty_alu_instr
+MNEMONICS = tuple(RiscVConverter.bitty_alu_instr)
+OPCODE_IDS = {mnemonic: op_id for op_id, mnemonic in enumerate(MNEMONICS)}
+
+# One row per instruction: (opcode-id, rx, ry/imm); None operands are stored as 0
+RECORD_DTYPE = np.dtype([("op", np.uint8), ("rx", np.int32), ("ry", np.int32)])
+
+
+def _field_layout(operation, fmt):
+    """
+    Return (fixed bits, rx mask, rx shift, ry mask, ry shift) for one mnemonic.
+
+    This is the per-format bit placement of bitty_to_binary(), worked out once
+    per mnemonic instead of once per instruction.
+    """
+    if fmt == 0:  # rx [15:12], ry [11:8], alu [5:2], format 00
+        return (operation & 0xF) << 2, 0xF, 12, 0xF, 8
+    if fmt == 1:  # rx [15:12], imm [11:6], alu [5:2], format 01
+        return ((operation & 0xF) << 2) | 0b01, 0xF, 12, 0x3F, 6
+    if fmt == 2:
+        if operation < 3:  # imm [15:4], cond [3:2], format 10
+            return (operation << 2) | 0b10, 0xFFF, 4, 0, 0
+        # gtpc/stpc: rx at bit 5
+        return (operation << 2) | 0b10, 0xF, 5, 0, 0
+    # load/store: rx [15:12], ry [11:8], L/S [2], format 11
+    return ((operation & 0x1) << 2) | 0b11, 0xF, 12, 0xF, 8
+
+
+_LAYOUTS = [_field_layout(*RiscVConverter.bitty_alu_instr[m]) for m in MNEMONICS]
+FIXED_BITS = np.array([layout[0] for layout in _LAYOUTS], dtype=np.int64)
+RX_MASK    = np.array([layout[1] for layout in _LAYOUTS], dtype=np.int64)
+RX_SHIFT   = np.array([layout[2] for layout in _LAYOUTS], dtype=np.int64)
+RY_MASK    = np.array([layout[3] for layout in _LAYOUTS], dtype=np.int64)
+RY_SHIFT   = np.array([layout[4] for layout in _LAYOUTS], dtype=np.int64)
+
+
+def to_records(assembly):
+    """
+    Pack Bitty assembly tuples into a structured array.
+
+    Args:
+        assembly: Sequence of (mnemonic, rx, ry) tuples as produced by the translator
+
+    Returns:
+        NumPy array of RECORD_DTYPE
+    """
+    count = len(assembly)
+    records = np.empty(count, dtype=RECORD_DTYPE)
+    try:
+        records["op"] = np.fromiter([OPCODE_IDS[instr[0]] for instr in assembly], np.uint8, count)
+    except KeyError as e:
+        raise KeyError(f"Opcode {e.args[0]} not found in bitty_alu_instr mapping.") from None
+    records["rx"] = np.fromiter([instr[1] for instr in assembly], np.int32, count)
+    records["ry"] = np.fromiter([instr[2] or 0 for instr in assembly], np.int32, count)
+    return records
+
+
+def encode_records(records):
+    """Encode a RECORD_DTYPE array into 16-bit Bitty instructions (uint16 array)."""
+    op = records["op"]
+    rx = records["rx"].astype(np.int64)
+    ry = records["ry"].astype(np.int64)
+    words = FIXED_BITS[op]
+    words |= (rx & RX_MASK[op]) << RX_SHIFT[op]
+    words |= (ry & RY_MASK[op]) << RY_SHIFT[op]
+    return words.astype(np.uint16)
+
+
+def encode_assembly(assembly):
+    """Encode a list of Bitty assembly tuples into a uint16 array."""
+    return encode_records(to_records(assembly))
@@ -0,0 +1,143 @@
+"""
+log_writer.py - Buffered comparison log with one open file handle
+
+The comparison scripts write their report one line at a time. LogWriter keeps
+the output file open for the whole run, collects lines in memory and hands
+them in batches to a background thread that does the actual file I/O, so
+formatting and emulation overlap with writing.
+
+A filename ending in .gz, .bz2 or .xz is written compressed with the
+matching standard library module; any other name is written as plain text
+that is byte-identical to writing each line with open(filename, "a").
+
+write_log() keeps one LogWriter per filename open across calls, so existing
+write_to_file(message, filename, mode) helpers can use it unchanged.
+"""
+import atexit
+import bz2
+import gzip
+import lzma
+import queue
+import threading
+
+BATCH_LINES = 512               # lines collected before a batch is handed over
+BUFFER_SIZE = 1 << 20           # file buffer of the writer thread
+
+_COMPRESSED_OPENERS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
+
+
+def _open_output(filename, mode):
+    for suffix, opener in _COMPRESSED_OPENERS.items():
+        if filename.endswith(suffix):
+            return opener(filename, mode + "t")
+    return open(filename, mode, buffering=BUFFER_SIZE)
+
+
+class LogWriter:
+    def __init__(self, filename, mode="w", background=True):
+        """
+        Args:
+            filename: Output path; .gz/.bz2/.xz selects compressed output
+            mode: 'w' to truncate, 'a' to append
+            background: Write from a separate thread instead of the caller's
+        """
+        self.filename = filename
+        self._file = _open_output(filename, mode)
+        self._lines = []
+        self._error = None
+        self._queue = None
+        self._thread = None
+        if background:
+            self._queue = queue.SimpleQueue()
+            self._thread = threading.Thread(target=self._drain, name=f"LogWriter({filename})", daemon=True)
+            self._thread.start()
+
+    def _drain(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            if isinstance(batch, threading.Event):     # flush() marker
+                batch.set()
+            elif self._error is None:
+                try:
+                    self._file.writelines(batch)
+                except Exception as e:     # e.g. '✓' in a non-UTF-8 locale
+                    # keep draining, so flush() markers are still set; the
+                    # error is raised by the next write(), flush() or close()
+                    self._error = e
+
+    def _hand_over(self):
+        if self._error is not None:
+            raise self._error
+        batch, self._lines = self._lines, []
+        if self._queue is None:
+            self._file.writelines(batch)
+        else:
+            self._queue.put(batch)
+
+    def write(self, message):
+        """Append one line (a newline is added, as write_to_file() always did)."""
+        self._lines.append(message + "\n")
+        if len(self._lines) >= BATCH_LINES:
+            self._hand_over()
+
+    def flush(self):
+        """Write out everything written so far."""
+        if self._lines:
+            self._hand_over()
+        if self._queue is not None:
+            written = threading.Event()
+            self._queue.put(written)
+            written.wait()
+        if self._error is not None:
+            raise self._error
+        self._file.flush()
+
+    def close(self):
+        if self._file.closed:
+            return
+        try:
+            if self._lines:
+                self._hand_over()
+        finally:
+            if self._queue is not None:
+                self._queue.put(None)
+                self._thread.join()
+            self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_open_logs = {}
+
+
+def write_log(message, filename, mode="a"):
+    """
+    Write one line to `filename` through a LogWriter that stays open.
+
+    mode 'w' starts the file over (closing a writer already open for it);
+    mode 'a' reuses the open writer, or opens the file for appending.
+    """
+    log = _open_logs.get(filename)
+    if mode == "w" or log is None:
+        if log is not None:
+            log.close()
+        log = _open_logs[filename] = LogWriter(filename, mode)
+    log.write(message)
+
+
+def close_logs():
+    """Flush and close every writer opened by write_log()."""
+    while _open_logs:
+        _, log = _open_logs.popitem()
+        log.close()
+
+
+atexit.register(close_logs)
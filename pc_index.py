@@ -0,0 +1,91 @@
+"""
+pc_index.py - RISC-V PC <-> Bitty PC lookups through one sorted boundary array
+
+The translator lowers RISC-V instruction i to the Bitty PCs
+[boundaries[i], boundaries[i + 1]). The boundary array holds one entry per
+RISC-V instruction plus the total Bitty length, so it is a few bytes per
+RISC-V instruction however long the lowerings are (array('I'), no per-Bitty
+dictionary). RISC-V -> Bitty lookups index it directly and Bitty -> RISC-V
+lookups bisect it, O(log n).
+
+The translator writes the array next to pc_map_output.txt as
+pc_boundaries.txt, one integer per line (see RiscVConverter.print_map()).
+"""
+from array import array
+from bisect import bisect_right
+
+BOUNDARIES_FILE = "pc_boundaries.txt"
+
+
+class PcIndex:
+    def __init__(self, boundaries):
+        """
+        Args:
+            boundaries: Non-decreasing Bitty PCs: the first Bitty PC of every
+                        RISC-V instruction, followed by the Bitty program length
+        """
+        self.boundaries = array('I', boundaries)
+        if not self.boundaries:
+            raise ValueError("boundaries needs at least the Bitty program length")
+        for i in range(1, len(self.boundaries)):
+            if self.boundaries[i] < self.boundaries[i - 1]:
+                raise ValueError(f"boundaries are not sorted at RISC-V PC {i}")
+
+    @classmethod
+    def from_map(cls, map_pc, bitty_length):
+        """
+        Build the index from a RISC-V PC -> first Bitty PC mapping.
+
+        Args:
+            map_pc: dict or list indexed by RISC-V PC 0..n-1 (RiscVConverter.map_pc,
+                    or the list read from pc_map_output.txt)
+            bitty_length: Number of Bitty instructions in the translation
+        """
+        boundaries = array('I', (map_pc[riscv_pc] for riscv_pc in range(len(map_pc))))
+        boundaries.append(bitty_length)
+        return cls(boundaries)
+
+    @classmethod
+    def read(cls, filename=BOUNDARIES_FILE):
+        with open(filename, "r") as f:
+            return cls(int(line) for line in f if line.strip())
+
+    def write(self, filename=BOUNDARIES_FILE):
+        with open(filename, "w") as f:
+            f.writelines(f"{bitty_pc}\n" for bitty_pc in self.boundaries)
+
+    def __len__(self):
+        """Number of RISC-V instructions."""
+        return len(self.boundaries) - 1
+
+    @property
+    def bitty_length(self):
+        return self.boundaries[-1]
+
+    def bitty_range(self, riscv_pc):
+        """The Bitty PCs [start, end) of the lowering of riscv_pc."""
+        if not 0 <= riscv_pc < len(self):
+            raise IndexError(f"RISC-V PC {riscv_pc} is outside the translation")
+        return self.boundaries[riscv_pc], self.boundaries[riscv_pc + 1]
+
+    def bitty_pc(self, riscv_pc):
+        """First Bitty PC of riscv_pc, like map_pc[riscv_pc]."""
+        return self.bitty_range(riscv_pc)[0]
+
+    def lowering_length(self, riscv_pc):
+        """Number of Bitty instructions riscv_pc was lowered to."""
+        start, end = self.bitty_range(riscv_pc)
+        return end - start
+
+    def riscv_pc(self, bitty_pc):
+        """The RISC-V PC whose lowering contains bitty_pc."""
+        if not 0 <= bitty_pc < self.bitty_length:
+            raise IndexError(f"Bitty PC {bitty_pc} is outside the translation")
+        # empty lowerings share their start with the next instruction; the
+        # last of equal boundaries is the one that owns bitty_pc
+        return bisect_right(self.boundaries, bitty_pc) - 1
+
+    def locate(self, bitty_pc):
+        """Tuple of (RISC-V PC, offset of bitty_pc within its lowering)."""
+        riscv_pc = self.riscv_pc(bitty_pc)
+        return riscv_pc, bitty_pc - self.boundaries[riscv_pc]
@@ -3,6 +3,7 @@ from BittyEmulator import BittyEmulator
 from RISCV32EMEmulator import RISCV32EMEmulator
 from shared_memory import generate_shared_memory  # Import shared memory generator
 from run_parralel import RiscVConverter
+from log_writer import close_logs, write_log
 
 def load_instructions_from_file(filename, base=0):
     """
@@ -28,10 +29,9 @@ def load_instructions_from_file(filename, base=0):
 
 def write_to_file(message, filename="comparison_output.txt", mode="a"):
     """
-    Write a message to the output file.
+    Write a message to the output file, kept open between calls (log_writer.py).
     """
-    with open(filename, mode) as file:
-        file.write(message + "\n")
+    write_log(message, filename, mode)
 
 
 def run_riscv(riscv, instructions, max_instructions=1000):
@@ -101,6 +101,7 @@ def main():
 
     write_to_file("\n=== Comparison Complete ===")
     write_to_file(f"RISC-V ran {rv_count} instrs; Bitty ran {bt_count} instrs")
+    close_logs()
 
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@ from BittyEmulator import BittyEmulator
 from RISCV32EMEmulator import RISCV32EMEmulator
 from translator import RiscVConverter
 from shared_memory import generate_shared_memory  # Import shared memory generator
+from log_writer import close_logs, write_log
 
 class EmulatorComparison:
     def __init__(self, max_instr=100, output_file="comparison_output.txt"):
@@ -10,7 +11,7 @@ class EmulatorComparison:
         self.output_file = output_file
 
         # Shared memory for both emulators
-        self.memory = generate_shared_memory()
+        self.memory = generate_shared_memory(compact=True)
 
         # Initialize emulators
         self.bitty = BittyEmulator(memory=self.memory)
@@ -20,6 +21,13 @@ class EmulatorComparison:
         # Expose translator's map_pc via run_parallel reference
         self.run_parallel = self.translator.map_pc
 
+        # Code cache: (RISC-V PC, instruction word) -> encoded Bitty sequence.
+        # A re-executed instruction (a loop body) reuses its translation
+        # instead of translating it and growing the translator's lists again.
+        self.code_cache = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
         # 1:1 register mapping (RV x0–x15 to Bitty regs)
         self.register_map = {i: i for i in range(16)}
 
@@ -42,13 +50,30 @@ class EmulatorComparison:
         return instructions
 
     def write_to_file(self, message):
-        with open(self.output_file, "a") as f:
-            f.write(message + "\n")
+        write_log(message, self.output_file)
+
+    def translate_cached(self, riscv_pc, instr):
+        """
+        Bitty binary for the instruction `instr` at `riscv_pc`, translated on
+        the first visit only. Failed translations are not cached.
+        """
+        key = (riscv_pc, instr)
+        bitty_bins = self.code_cache.get(key)
+        if bitty_bins is not None:
+            self.cache_hits += 1
+            return bitty_bins
+        self.cache_misses += 1
+        try:
+            bitty_bins = tuple(self.translator.translator(instr))
+        except Exception as e:
+            self.write_to_file(f"Error in translation: {e}")
+            return ()
+        self.code_cache[key] = bitty_bins
+        return bitty_bins
 
     def run(self):
         # Clear output file
-        with open(self.output_file, "w") as f:
-            f.write("=== Starting Emulator Comparison ===\n")
+        write_log("=== Starting Emulator Comparison ===", self.output_file, mode="w")
 
         # Load instructions
         self.riscv.instruction_array = self.load_instructions_from_file(
@@ -65,17 +90,14 @@ class EmulatorComparison:
         ):
             self.write_to_file(f"\n=== RISC-V Instr {riscv_count} @ PC {self.riscv.pc} ===")
 
+            riscv_pc = self.riscv.pc
             instr = self.riscv.fetch_instruction()
             self.write_to_file(f"Instruction: 0x{instr:08X}")
             self.riscv.pc = self.riscv.decode_and_execute(instr)
             riscv_count += 1
 
-            # Translate and execute in Bitty
-            try:
-                bitty_bins = self.translator.translator(instr)
-            except Exception as e:
-                self.write_to_file(f"Error in translation: {e}")
-                bitty_bins = []
+            # Translate (or reuse the cached translation) and execute in Bitty
+            bitty_bins = self.translate_cached(riscv_pc, instr)
 
             self.write_to_file(f"--- Executing {len(bitty_bins)} Bitty Instrs ---")
             for idx, b in enumerate(bitty_bins):
@@ -106,12 +128,15 @@ class EmulatorComparison:
         self.write_to_file("\n=== Comparison Complete ===")
         self.write_to_file(f"RISC-V instrs: {riscv_count}, Bitty instrs: {bitty_count}")
         self.write_to_file(f"Final STATIC_PC_VALUE: {BittyEmulator.STATIC_PC_VALUE}")
-
-        # Dump translator internals via class methods (avoid passing 'self')
-        RiscVConverter.print_map()
-        RiscVConverter.change_branch_offsets()
-        RiscVConverter.print_assembly()
-        RiscVConverter.print_binary()
+        self.write_to_file(f"Code cache: {len(self.code_cache)} translations, "
+                           f"{self.cache_hits} hits, {self.cache_misses} misses")
+        close_logs()
+
+        # Dump translator internals from this comparison's translation context
+        self.translator.print_map()
+        self.translator.change_branch_offsets()
+        self.translator.print_assembly()
+        self.translator.print_binary()
 
 
 if __name__ == "__main__":
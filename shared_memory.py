@@ -1,10 +1,15 @@
 # shared_memory.py
 import random
 
+from byte_memory import ByteMemory
+
 _shared_memory = None
 
-def generate_shared_memory(size=2048):
+def generate_shared_memory(size=2048, compact=False):
+    # compact=True returns a new ByteMemory holding the shared initial values
     global _shared_memory
     if _shared_memory is None:
         _shared_memory = [random.randint(0, 0xFFF) for _ in range(size)]
+    if compact:
+        return ByteMemory(_shared_memory)
     return _shared_memory
\ No newline at end of file
@@ -1,31 +1,54 @@
+from array import array
+import functools
+
+from pc_index import BOUNDARIES_FILE, PcIndex
+from verbosity import QUIET, TRACE
+
+
+# Number of distinct instruction words whose lowering is kept in memory
+LOWERING_CACHE_SIZE = 4096
+# Below this many instructions NumPy setup costs more than encoding in Python
+VECTOR_ENCODE_MIN = 256
+
+
 class RiscVConverter:
-    # Class variable to track the program counter
-    RISCV_PC = 0
-    Bitty_PC = 0
-    map_pc = {} #RiscV PC to Bitty PC mapping
-    branch_pc = {} #Branch instrcutions PC -> PC + offset mapping
-    instr_of_bitty_assembly = [] #List of instructions to be executed -> each element is tuple of three elements
-    instr_of_bitty_binary = []
-
-    def change_branch_offsets():
-        for branch_bitty_pc, pc in RiscVConverter.branch_pc.items():
+    # Each converter instance is one translation context: it owns the program
+    # counters, the PC mappings and the emitted instructions, so several
+    # programs can be translated side by side (threads, process pools, ...).
+    def __init__(self, verbosity=TRACE):
+        # QUIET skips all per-instruction output (see verbosity.py)
+        self.verbosity = verbosity
+        self.trace = verbosity >= TRACE
+        self.reset()
+
+    def reset(self):
+        self.RISCV_PC = 0
+        self.Bitty_PC = 0
+        self.map_pc = {} #RiscV PC to Bitty PC mapping
+        self.branch_pc = {} #Branch instrcutions PC -> PC + offset mapping
+        self.instr_of_bitty_assembly = [] #List of instructions to be executed -> each element is tuple of three elements
+        self.instr_of_bitty_binary = []
+
+    def change_branch_offsets(self):
+        for branch_bitty_pc, pc in self.branch_pc.items():
             #(BittyPC - branch_pc) * 2
-            new_offset = (RiscVConverter.map_pc[pc] - branch_bitty_pc) * 2
-            branch, _, placeholder = RiscVConverter.instr_of_bitty_assembly[branch_bitty_pc]
+            new_offset = (self.map_pc[pc] - branch_bitty_pc) * 2
+            branch, _, placeholder = self.instr_of_bitty_assembly[branch_bitty_pc]
             new_instr = (branch, new_offset, placeholder)
             new_binary = RiscVConverter.bitty_to_binary(new_instr)
-            print("Branch instruction:", branch, "New offset:", new_offset, )
+            if self.trace:
+                print("Branch instruction:", branch, "New offset:", new_offset, )
             #add new instrucitons to the list of instructions
-            RiscVConverter.instr_of_bitty_assembly[branch_bitty_pc] = new_instr
-            RiscVConverter.instr_of_bitty_binary[branch_bitty_pc] = new_binary
+            self.instr_of_bitty_assembly[branch_bitty_pc] = new_instr
+            self.instr_of_bitty_binary[branch_bitty_pc] = new_binary
     
-    def print_assembly():
-        for i, instr in enumerate(RiscVConverter.instr_of_bitty_assembly):
+    def print_assembly(self):
+        for i, instr in enumerate(self.instr_of_bitty_assembly):
             print(f"Instruction {i}: {instr}")
     
-    def print_binary():
+    def print_binary(self):
         with open("bitty_binary.txt", "w") as f:
-            for i, instr in enumerate(RiscVConverter.instr_of_bitty_binary):
+            for i, instr in enumerate(self.instr_of_bitty_binary):
                 f.write(f"0b{instr:016b}\n")
 
 
@@ -171,7 +194,7 @@ class RiscVConverter:
     
 
     @staticmethod
-    def lego(instruction):
+    def lego(instruction, trace=False):
         opcode = instruction         & 0b1111111
         rd     = (instruction >> 7)  & 0b11111     # bits [11:7]
         rs1    = (instruction >> 15) & 0b11111    # bits [19:15]
@@ -183,22 +206,25 @@ class RiscVConverter:
             return instr_type, (RiscVConverter.r_type(funct3, funct7), rd, rs1, rs2)
         #I type instruction decoding
         elif instr_type == "I":
-            print("I type instruction in lego")
+            if trace:
+                print("I type instruction in lego")
             funct3 = (instruction >> 12) & 0b111
             funct7 = (instruction >> 25) & 0b1111111
-            print("Lego:",
-                format(funct3, '03b'),
-                format(funct7, '07b'),
-                format(rd, '05b'),
-                format(rs1, '05b'),
-                format(rs2, '05b'))
+            if trace:
+                print("Lego:",
+                    format(funct3, '03b'),
+                    format(funct7, '07b'),
+                    format(rd, '05b'),
+                    format(rs1, '05b'),
+                    format(rs2, '05b'))
             if opcode == 0b0010011 and funct3 in RiscVConverter.i_instr: # ALU immediate instructions
                 immediate = (instruction >> 20) & 0b111111111111
                 return instr_type, (RiscVConverter.i_instr[funct3], rd, rs1, immediate)
             elif opcode == 0b0010011 and (funct3, funct7) in RiscVConverter.i_shift_instr: # Load instructions
                 shamt =  (instruction >> 20) & 0b111111
-                print("I type instruction in lego shift")
-                print(funct7, funct3, rd, rs1, shamt)
+                if trace:
+                    print("I type instruction in lego shift")
+                    print(funct7, funct3, rd, rs1, shamt)
                 return instr_type, (RiscVConverter.i_shift_instr[(funct7, funct3)], rd, rs1, shamt)
             elif opcode == 0b0000011 and funct3 in RiscVConverter.l_instr: # Load instructions
                 immediate = (instruction >> 20) & 0b111111111111
@@ -207,7 +233,8 @@ class RiscVConverter:
                 immediate = (instruction >> 20) & 0b111111111111
                 return instr_type, ("jalr", rd, rs1, immediate)
             else:
-                print("Unknown instruction type")
+                if trace:
+                    print("Unknown instruction type")
         #-------------------------------------
         #----- S type instruction decoding ---
         #-------------------------------------
@@ -271,11 +298,54 @@ class RiscVConverter:
 
         return "unknown"
 
+    def riscV_to_bitty(self, instruction):
+        trace = self.trace
+        if trace:
+            # uncached, so the decoder trace is printed for every instruction
+            lowered = RiscVConverter.lower_instruction(instruction, trace=True)
+        else:
+            lowered = RiscVConverter.lower_cached(instruction)
+        if lowered is None:
+            return "unknown"
+        result, branches = lowered
+        result = list(result)
+
+        #to save the current pc value of branch instruction to use it for recalculation
+        for slot, offset in branches:
+            pc_key   = self.Bitty_PC + slot
+            pc_target = self.RISCV_PC + offset
+            if trace:
+                print("Branch PC:", pc_key + 1, "offset:", pc_target)
+            self.branch_pc[pc_key] = pc_target
+
+        self.map_pc[self.RISCV_PC] = self.Bitty_PC
+        self.RISCV_PC += 1
+        self.Bitty_PC += len(result)
+        if trace:
+            print(result)
+        #add assembly instructions to the list of instructions
+        self.instr_of_bitty_assembly.extend(result)
+        return result
+
     @staticmethod
-    def riscV_to_bitty(instruction):
-        instr_type, instr = RiscVConverter.lego(instruction)
+    def lower_instruction(instruction, trace=False):
+        """
+        Lower one RISC-V instruction word to Bitty assembly.
+
+        The lowering does not depend on where the instruction sits in the
+        program: branch targets are left as the raw RISC-V immediates and
+        reported separately so the caller can patch them.
+
+        Returns:
+            Tuple of (list of Bitty assembly tuples, list of (slot, offset)
+            branch fix-ups), or None if the instruction is not supported.
+            slot is the index of the branch in the list and offset is the
+            target distance in RISC-V instructions.
+        """
+        instr_type, instr = RiscVConverter.lego(instruction, trace)
         rd_is_R0 = False
         result = []
+        branches = []
         opcode_binary = instruction & 0b1111111
 
 
@@ -435,7 +505,7 @@ class RiscVConverter:
                         result.append(("sub", rd, rd)) #rd == R0
 
                 else:
-                    return "unknown"
+                    return None
             if rd_is_R0:
                 result.append(("sub", rs2, rs2))
                 result.append(("add", rs2, rd))
@@ -468,7 +538,8 @@ class RiscVConverter:
 
             if (opcode in RiscVConverter.bitty_alu_instr 
                  or opcode == "slti" or opcode == "sltiu"):
-                print("opcode in RiscVConverter.bitty_alu_instr:", opcode)
+                if trace:
+                    print("opcode in RiscVConverter.bitty_alu_instr:", opcode)
                 result.append(("addi", rd, imm_upper)) #addi rd, imm[11:6]
                 result.append(("shli", rd, 3))
                 result.append(("addi", rd, imm_mid)) #addi rd, imm[5:3]
@@ -553,7 +624,7 @@ class RiscVConverter:
                 elif opcode == 'lw':
                     result.append(('ld', rd, rs1))
                 else:
-                    return "unknown"
+                    return None
             if rd_is_R0 == True:
                 result.append(("sub", rs1, rs1))
                 result.append(("add", rs1, rd))
@@ -577,9 +648,10 @@ class RiscVConverter:
                 result.append(("shli",  0, 16))
                 result.append(("shrsi", 0, 16))
             elif opcode == 'sw':
-                print("everything is up to date")
+                if trace:
+                    print("everything is up to date")
             else:
-                return "unknown"
+                return None
             #need to be implemented everywhere
             result.append(("st",    0, rs1)) #mem[rs1] = rs2
             result.append(("sub",   0, 0)) #make R0 = 0
@@ -609,20 +681,14 @@ class RiscVConverter:
                     result.append(("cmp", rs1, rs2))
 
                 result.append(("big", immediate, None)) #0 and 1 will be masked to 0
-                pc_key   = RiscVConverter.Bitty_PC + len(result) - 1
-                pc_target = RiscVConverter.RISCV_PC + (immediate // 4)
-                print("Branch PC:", pc_key + 1, "offset:", pc_target)
-                RiscVConverter.branch_pc[pc_key] = pc_target
+                branches.append((len(result) - 1, immediate // 4))
                 
                 result.append(("bie", immediate, None)) #0 and 1 will be masked to 0
             elif opcode == "bne":
                 result.append(("cmps", rs1, rs2))
 
                 result.append(("bil", immediate, None))
-                pc_key   = RiscVConverter.Bitty_PC + len(result) - 1
-                pc_target = RiscVConverter.RISCV_PC + (immediate // 4)
-                print("Branch PC:", pc_key + 1, "offset:", pc_target)
-                RiscVConverter.branch_pc[pc_key] = pc_target
+                branches.append((len(result) - 1, immediate // 4))
 
                 result.append(("big", immediate, None))
             elif opcode == "blt" or opcode == "bltu":
@@ -635,12 +701,9 @@ class RiscVConverter:
                 result.append(("bil", immediate, None))
 
 
-            #to save the current pc value of branch instruction to use it for recalculation
-            pc_key   = RiscVConverter.Bitty_PC + len(result) - 1
+            #to save the branch slot so its offset can be recalculated later
             # now immediate is signed, so offset calculation will be correct for backwards branches
-            pc_target = RiscVConverter.RISCV_PC + (immediate // 4)
-            print("Branch PC:", pc_key + 1, "offset:", pc_target)
-            RiscVConverter.branch_pc[pc_key] = pc_target
+            branches.append((len(result) - 1, immediate // 4))
 
         #U type instruction binary to Bitty assembly conversion
         elif instr_type == "U":
@@ -709,13 +772,33 @@ class RiscVConverter:
                 # Extract the 12-bit immediate value from the instruction
                 immediate = int(instr[3]) & 0xFFF    
 
-        RiscVConverter.map_pc[RiscVConverter.RISCV_PC] = RiscVConverter.Bitty_PC
-        RiscVConverter.RISCV_PC += 1
-        RiscVConverter.Bitty_PC += len(result)
-        print(result)
-        #add assembly instructions to the list of instructions
-        RiscVConverter.instr_of_bitty_assembly.extend(result)
-        return result
+        return result, branches
+
+    @staticmethod
+    @functools.lru_cache(maxsize=LOWERING_CACHE_SIZE)
+    def lower_cached(instruction):
+        """
+        Memoized lower_instruction(), keyed by the 32-bit instruction word.
+
+        Lowerings are position independent, so one cached entry serves every
+        occurrence of the word; only the branch fix-ups it returns are
+        resolved per position by the caller. The entry is returned as tuples
+        so that callers cannot modify the shared copy.
+        """
+        lowered = RiscVConverter.lower_instruction(instruction)
+        if lowered is None:
+            return None
+        result, branches = lowered
+        return tuple(result), tuple(branches)
+
+    @staticmethod
+    def lowering_cache_info():
+        """Hit/miss counters and size of the lowering cache (functools CacheInfo)."""
+        return RiscVConverter.lower_cached.cache_info()
+
+    @staticmethod
+    def clear_lowering_cache():
+        RiscVConverter.lower_cached.cache_clear()
 
     @staticmethod
     def bitty_to_binary(instr):
@@ -804,26 +887,113 @@ class RiscVConverter:
         return instruction
     
     @staticmethod
-    def translator(init_instr):
+    def encode_assembly(assembly):
+        """
+        Encode a list of Bitty assembly tuples into a packed array('H').
+
+        Uses the vectorized encoder in bitty_encoder.py when NumPy is
+        available, and bitty_to_binary() per instruction otherwise.
+        """
+        if len(assembly) >= VECTOR_ENCODE_MIN:
+            try:
+                from bitty_encoder import encode_assembly as encode_vectorized
+            except ImportError:  # NumPy not installed
+                pass
+            else:
+                return array('H', encode_vectorized(assembly).tobytes())
+        return array('H', map(RiscVConverter.bitty_to_binary, assembly))
+
+    def translator(self, init_instr):
         # Increment the program counter each time this method is called
 
-        instructions = RiscVConverter.riscV_to_bitty(init_instr)
-        print("Bitty to binary START")
+        instructions = self.riscV_to_bitty(init_instr)
+        if self.trace:
+            print("Bitty to binary START")
         final_instructions = []
         for instr in instructions:
             instruction = RiscVConverter.bitty_to_binary(instr)
             final_instructions.append(instruction)
             #append the instruction to the list of instructionsS
-            RiscVConverter.instr_of_bitty_binary.append(instruction)
+            self.instr_of_bitty_binary.append(instruction)
         
         return final_instructions
         
     
-    def print_map(out_filename="pc_map_output.txt"):
+    def print_map(self, out_filename="pc_map_output.txt", boundaries_filename=BOUNDARIES_FILE):
         with open(out_filename, "w") as f:
 
-            for pc, bitty_pc in RiscVConverter.map_pc.items():
+            for pc, bitty_pc in self.map_pc.items():
                 line = f"{bitty_pc}"
                 print(line)
                 f.write(line + "\n")
-
+        # the same mapping closed by the Bitty length, for lookups in both directions
+        self.pc_index().write(boundaries_filename)
+
+    def pc_index(self):
+        """PcIndex over the instructions translated so far (see pc_index.py)."""
+        return PcIndex.from_map(self.map_pc, self.Bitty_PC)
+
+
+    def translate_batch(self, words):
+        """
+        Translate a whole RISC-V program in one pass and return the packed binary.
+
+        Every word is lowered once and branch slots go on a backpatch list,
+        which is resolved in one pass before the whole output is encoded.
+
+        Args:
+            words: Iterable of 32-bit RISC-V instruction words, in program order
+
+        Returns:
+            array('H') of 16-bit Bitty instructions
+        """
+        self.reset()
+        assembly = self.instr_of_bitty_assembly
+        map_pc = self.map_pc
+        backpatch = []
+        lower = RiscVConverter.lower_cached
+
+        for riscv_pc, word in enumerate(words):
+            lowered = lower(word)
+            if lowered is None:
+                raise ValueError(f"Cannot translate instruction 0x{word:08X} at RISC-V PC {riscv_pc}")
+            result, branches = lowered
+            bitty_pc = len(assembly)
+            map_pc[riscv_pc] = bitty_pc
+            for slot, offset in branches:
+                backpatch.append((bitty_pc + slot, riscv_pc + offset))
+            assembly.extend(result)
+
+        for bitty_pc, target in backpatch:
+            #(BittyPC - branch_pc) * 2
+            branch, _, placeholder = assembly[bitty_pc]
+            assembly[bitty_pc] = (branch, (map_pc[target] - bitty_pc) * 2, placeholder)
+        binary = RiscVConverter.encode_assembly(assembly)
+
+        self.branch_pc = dict(backpatch)
+        self.instr_of_bitty_binary = binary
+        self.RISCV_PC = len(map_pc)
+        self.Bitty_PC = len(assembly)
+        return binary
+
+    def translate_program(self, words):
+        """
+        Translate a whole RISC-V program in this context.
+
+        Args:
+            words: Iterable of 32-bit RISC-V instruction words, in program order
+
+        Returns:
+            Tuple of (Bitty binary array('H'), Bitty assembly list, RISC-V PC -> Bitty PC map)
+        """
+        binary = self.translate_batch(words)
+        return binary, self.instr_of_bitty_assembly, self.map_pc
+
+def translate_program(words):
+    """
+    Translate a RISC-V program in a fresh RiscVConverter context.
+
+    Being a plain module-level function it can be handed directly to a
+    thread or process pool; every call gets its own translation state.
+    """
+    return RiscVConverter(verbosity=QUIET).translate_program(words)